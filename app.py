@@ -2,32 +2,37 @@ import streamlit as st
 import json
 import pandas as pd
 import logging
-from datetime import datetime
-from src.query_engine.query_generator import MongoDBQueryGenerator
+from datetime import datetime, timedelta
 from src.query_engine.query_executor import execute_mongodb_query
+from src.query_engine.pipeline_optimizer import optimize_query
+from src.query_engine.result_store import ResultStore, ResultTooLargeError, FILTER_OPERATORS
+from src.query_engine.query_history import QueryHistory
+from src.query_engine.job_queue import QueryJobQueue, JobLimitError, QUEUED, RUNNING, DONE, FAILED
 import config
 import src.analytics.analytics_dashboard as ad
-from pymongo import MongoClient
-import matplotlib.pyplot as plt
-import squarify
+from src.analytics.time_rollups import GRANULARITIES
+from src.analytics.analytics_cache import AnalyticsCache, refresh_materializations
+from src.analytics.patient_record import PatientRecordAssembler, RECORD_SECTIONS, DEFAULT_SECTIONS
+from src.analytics.patient_cache import PatientRecordCache
+from src.analytics.patient_search import PatientSearchIndex
+from src.analytics.cohort_index import CohortIndex, CohortExpressionError
+from src.export.result_export import ResultExporter, EXPORT_FORMATS, available_formats, result_hash
+from src.monitoring.structured_logging import setup_logging, begin_request, finish_request, stage, log_payload
+from src.database.connection_manager import get_database, get_pool_stats, WORKLOAD_INTERACTIVE, WORKLOAD_ANALYTICS
 import re
-import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ---- Logger Configuration ----
-logger = logging.getLogger('QueryDelCuoreApp')
-logger.setLevel(logging.DEBUG)
-
-log_dir = "logs"
-log_file_path = os.path.join(log_dir, "app_activity.log")
-os.makedirs(log_dir, exist_ok=True)
-
-fh = logging.FileHandler(log_file_path, encoding='utf-8')
-fh.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-
-if not logger.handlers:
-    logger.addHandler(fh)
+# JSON lines written by a background thread (no-op on reruns once configured)
+logger = setup_logging(
+    'QueryDelCuoreApp',
+    config.LOG_FILE_PATH,
+    level=getattr(logging, config.LOG_LEVEL),
+    max_bytes=config.LOG_MAX_BYTES,
+    interval_seconds=config.LOG_ROTATE_SECONDS,
+    backup_count=config.LOG_BACKUP_COUNT
+)
 
 # ---- Streamlit Page Configuration ----
 st.set_page_config(
@@ -53,24 +58,185 @@ if config.MONGO_URI is None:
 
 # ------ Streamlit App Tools ------
 
+# Heavy dependencies are imported by the mode that needs them, on first use: the embedding
+# model, ChromaDB and Gemini only by the assistant, Altair/squarify only by the charts
+# (see src/evaluation/import_time_benchmark.py)
 @st.cache_resource
 def get_query_generator():
+    from src.query_engine.query_generator import MongoDBQueryGenerator
     return MongoDBQueryGenerator(config.embedding_model, config.gemini_model, config.chroma_client, config.DB_SCHEMA, config.MAX_RETRIES)
 
-query_generator = get_query_generator()
-
 @st.cache_resource
-def init_db_connection():
+def init_db_connection(workload=WORKLOAD_INTERACTIVE):
     try:
-        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
-        client.server_info()
-        return client[config.MONGO_DB_NAME]
+        return get_database(workload)
     except Exception as e:
         st.error(f"Errore di connessione al database: {e}")
         logger.error(f"Errore di connessione al database: {e}", exc_info=True)
         return None
 
 db = init_db_connection()
+analytics_db = init_db_connection(WORKLOAD_ANALYTICS)
+
+@st.cache_resource
+def get_analytics_cache(_analytics_db):
+    """One analytics cache, with its refresh thread, shared by every session."""
+    cache = AnalyticsCache(
+        _analytics_db, refresh_interval=config.ANALYTICS_CACHE_REFRESH_SECONDS,
+        materialize=True, rebuild_after=config.SUMMARY_FULL_REBUILD_SECONDS
+    )
+    cache.start()
+    return cache
+
+@st.cache_resource
+def get_patient_cache(_db):
+    """Clinical records shared by every session, with background prefetch of related patients."""
+    return PatientRecordCache(
+        PatientRecordAssembler(_db),
+        max_size=config.PATIENT_CACHE_MAX_SIZE,
+        ttl_seconds=config.PATIENT_CACHE_TTL_SECONDS,
+        prefetch_count=config.PATIENT_PREFETCH_COUNT
+    )
+
+@st.cache_resource
+def get_patient_search_index(_db):
+    """Typeahead index over ANAGRAFICA, loaded once per server."""
+    search_index = PatientSearchIndex(_db)
+    search_index.load()
+    return search_index
+
+@st.cache_resource
+def get_cohort_index(_analytics_db):
+    """Patient bitmaps per clinical attribute, built once per server."""
+    cohort_index = CohortIndex(_analytics_db)
+    cohort_index.refresh()
+    return cohort_index
+
+@st.cache_resource
+def get_result_store():
+    """Full query results of every session, spilled to disk above the memory threshold."""
+    return ResultStore(
+        memory_threshold=config.RESULT_STORE_MEMORY_THRESHOLD_BYTES,
+        session_quota=config.RESULT_STORE_SESSION_QUOTA_BYTES,
+        global_quota=config.RESULT_STORE_GLOBAL_QUOTA_BYTES,
+        idle_seconds=config.RESULT_STORE_IDLE_SECONDS
+    )
+
+@st.cache_resource
+def get_job_queue():
+    """Worker pool of the queries executed in background, shared by every session."""
+    return QueryJobQueue(
+        get_result_store(),
+        max_workers=config.JOB_QUEUE_WORKERS,
+        per_user_limit=config.JOB_QUEUE_PER_USER_LIMIT,
+        retention_seconds=config.JOB_RETENTION_SECONDS,
+        max_time_ms=config.JOB_MAX_TIME_MS
+    )
+
+@st.cache_resource
+def get_query_history():
+    """Executed queries of every session, searchable and executable again without the LLM."""
+    return QueryHistory(config.QUERY_HISTORY_PATH)
+
+@st.cache_resource
+def get_result_exporter():
+    """Export files of the query results, shared (by result hash) across sessions."""
+    return ResultExporter()
+
+def show_freshness(refreshed_at):
+    st.caption(f"Dati aggiornati al {refreshed_at.strftime('%d/%m/%Y %H:%M:%S')}")
+
+def current_user():
+    """E-mail of the logged-in user when Streamlit authentication is configured, otherwise None."""
+    try:
+        return st.user.get("email")
+    except Exception:
+        return None
+
+def reset_last_result():
+    """Release the result shown by the persistent section before a new one is produced."""
+    if st.session_state.result_id is not None:
+        get_result_store().discard(st.session_state.result_id)
+    st.session_state.result_id = None
+    st.session_state.df_hash = None
+    st.session_state.show_last_query_results = False
+
+def history_recorder(query_history, instruction, generated_query, executed_query, context_docs, user):
+    """Callback recording a background job in the query history when it ends (runs in the worker thread)."""
+    def on_finish(job):
+        query_history.record(
+            instruction, generated_query, executed_query_json=executed_query, context_docs=context_docs,
+            latency_ms=round((job["finished_at"] - job["submitted_at"]).total_seconds() * 1000, 1),
+            row_count=job["rows"], success=job["state"] == DONE, error=job["error"], user=user
+        )
+    return on_finish
+
+@st.fragment(run_every=config.JOB_POLL_SECONDS)
+def render_background_jobs(session_id):
+    """Queries of this session running in background, polled without rerunning the page."""
+    jobs = get_job_queue().jobs(session_id=session_id)
+    if not jobs:
+        return
+    notified = st.session_state.setdefault("notified_jobs", set())
+    st.markdown("#### Query in background")
+    for job in jobs[:10]:
+        text_col, button_col = st.columns([5, 1])
+        label = job["instruction"] or f"Job {job['id']}"
+        if job["state"] in (QUEUED, RUNNING):
+            status_text = "In coda" if job["state"] == QUEUED else f"In esecuzione: {job['rows_read']} documenti letti"
+            text_col.markdown(f"**{label}**  \n{status_text}")
+            if button_col.button("Annulla", key=f"job_cancel_{job['id']}"):
+                get_job_queue().cancel(job["id"])
+        elif job["state"] == DONE:
+            elapsed = (job["finished_at"] - job["started_at"]).total_seconds()
+            if job["id"] not in notified:
+                notified.add(job["id"])
+                st.toast(f"Query completata: {job['rows']} righe")
+            text_col.markdown(f"**{label}**  \nCompletata: {job['rows']} righe in {elapsed:.1f} s")
+            if job["result_id"] and get_result_store().info(job["result_id"]) is None:
+                # Replaced by another result, or evicted by the session quota
+                button_col.caption("Rilasciato")
+            elif job["result_id"] and button_col.button("Mostra", key=f"job_show_{job['id']}"):
+                if st.session_state.result_id != job["result_id"]:
+                    # The replaced result would otherwise stay charged to the session quota
+                    reset_last_result()
+                st.session_state.result_id = job["result_id"]
+                st.session_state.df_hash = None
+                st.session_state.show_last_query_results = True
+                st.rerun(scope="app")
+        elif job["state"] == FAILED:
+            text_col.markdown(f"**{label}**  \nErrore: {job['error']}")
+        else:
+            text_col.markdown(f"**{label}**  \nAnnullata")
+
+def rerun_history_entry(entry_id):
+    """Execute a query of the history again, without calling the LLM, and show it as a new answer."""
+    reset_last_result()
+    begin_request()
+    with st.spinner("Esecuzione della query..."), stage("esecuzione"):
+        entry, query_result = get_query_history().rerun(entry_id, db, db_schema=config.DB_SCHEMA, user=current_user())
+    if entry is None:
+        finish_request(logger, history_id=entry_id, found=False)
+        st.error("Query non trovata nella cronologia.")
+        return
+
+    logger.info("Query rieseguita dalla cronologia", extra={"history_id": entry_id, "success": query_result["success"]})
+    st.session_state.messages.append({"role": "user", "content": f"{entry['instruction']}\n\n_(rieseguita dalla cronologia, senza generazione)_"})
+    if query_result["success"] and query_result["data"]:
+        try:
+            with stage("memorizzazione"):
+                st.session_state.result_id = get_result_store().put(st.session_state.result_session.session_id, pd.DataFrame(query_result["data"]))
+            st.session_state.show_last_query_results = True
+            assistant_content = "**Query rieseguita dalla cronologia.**"
+        except ResultTooLargeError as e_size:
+            assistant_content = f"**Risultato non memorizzato:** {e_size}. Restringi la query."
+    elif query_result["success"]:
+        assistant_content = "Nessun risultato trovato."
+    else:
+        assistant_content = f"**Errore Esecuzione:**\n{query_result['error']}"
+    st.session_state.messages.append({"role": "assistant", "content": assistant_content})
+    finish_request(logger, history_id=entry_id, has_results=st.session_state.show_last_query_results)
+    st.rerun()
 
 #  Function to extract document names from RAG context
 def extract_doc_names_from_rag_context(rag_context):
@@ -93,14 +259,138 @@ def extract_doc_names_from_rag_context(rag_context):
     except Exception as e:
         return ["Errore estrazione nomi documenti"]
 
+# ---- Query result grid ----
+@st.fragment
+def render_result_grid(result_id, columns):
+    """Paginated, sortable and filterable view of a stored result.
+
+    Every interaction reruns only this fragment, and only the rows of the
+    current page are read from the result store and sent to the browser.
+    """
+    result_store = get_result_store()
+    no_sort = "(ordine originale)"
+
+    sort_col1, sort_col2, size_col = st.columns([3, 2, 2])
+    sort_by = sort_col1.selectbox("Ordina per", [no_sort] + columns, key=f"grid_sort_{result_id}")
+    descending = sort_col2.radio("Direzione", ["Crescente", "Decrescente"], horizontal=True, key=f"grid_dir_{result_id}") == "Decrescente"
+    page_size = size_col.selectbox("Righe per pagina", [20, 50, 100, 200], key=f"grid_size_{result_id}")
+
+    filter_col1, filter_col2, filter_col3 = st.columns([3, 2, 2])
+    filter_column = filter_col1.selectbox("Filtra colonna", columns, key=f"grid_filter_column_{result_id}")
+    filter_operator = filter_col2.selectbox("Condizione", FILTER_OPERATORS, key=f"grid_filter_operator_{result_id}")
+    filter_value = filter_col3.text_input("Valore", key=f"grid_filter_value_{result_id}")
+    filters = [(filter_column, filter_operator, filter_value)] if filter_value.strip() else None
+
+    page_key = f"grid_page_{result_id}"
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 1
+    page_number = st.session_state[page_key]
+    try:
+        page = result_store.page(
+            result_id,
+            offset=(page_number - 1) * page_size,
+            limit=page_size,
+            sort_by=None if sort_by == no_sort else sort_by,
+            descending=descending,
+            filters=filters
+        )
+    except ValueError as e:
+        st.error(str(e))
+        return
+    if page is None:
+        st.info("Il risultato dell'ultima query non è più disponibile: esegui di nuovo la richiesta.")
+        return
+
+    page_df, total_rows = page
+    page_count = max(1, -(-total_rows // page_size))
+    if page_number > page_count:
+        # The filter left fewer pages than the one shown
+        page_number = st.session_state[page_key] = page_count
+        page_df, total_rows = result_store.page(
+            result_id, offset=(page_number - 1) * page_size, limit=page_size,
+            sort_by=None if sort_by == no_sort else sort_by, descending=descending, filters=filters
+        )
+
+    first_row = (page_number - 1) * page_size + 1 if total_rows else 0
+    st.write(f"Righe {first_row}-{first_row + len(page_df) - 1 if total_rows else 0} di {total_rows}:")
+    st.dataframe(page_df, hide_index=True)
+    st.number_input(f"Pagina (di {page_count})", min_value=1, max_value=page_count, step=1, key=page_key)
+
+# ---- Analytics panels ----
+@st.cache_resource
+def get_chart_cache():
+    """Vega-Lite specs of the analytics charts, shared (by data hash) across sessions and reruns."""
+    from src.analytics.charts import ChartCache
+    return ChartCache()
+
+def render_distribuzione_sesso(data_df):
+    st.subheader("Distribuzione Pazienti per Sesso")
+    st.dataframe(data_df)
+    if 'Sesso' in data_df.columns and 'Numero Pazienti' in data_df.columns:
+        st.bar_chart(data_df.set_index('Sesso'))
+
+def render_distribuzione_comune_di_nascita(data_df):
+    st.subheader("Distribuzione Pazienti per Comune di nascita")
+    st.dataframe(data_df)
+    if "Comune di nascita" in data_df.columns and "Numero Pazienti" in data_df.columns:
+        st.bar_chart(data_df.set_index("Comune di nascita"))
+
+def render_heart_failure_by_year(data_df):
+    st.subheader("Numero di Casi di Heart Failure per Anno")
+    st.dataframe(data_df)
+
+    if "Anno" in data_df.columns and "Numero Casi" in data_df.columns:
+        spec = get_chart_cache().spec("line", data_df, "Anno", "Numero Casi", "Andamento Annuale dei Casi di Scompenso cardiaco", color="purple")
+        st.vega_lite_chart(spec, use_container_width=True)
+    else:
+        st.warning("Le colonne 'Anno' o 'Numero Casi' non sono state trovate nei dati. Verifica la query MongoDB e le intestazioni.")
+
+def render_principali_cause_decesso(data_df):
+    st.subheader("Principali Motivi di decesso")
+    st.dataframe(data_df)
+    if "Motivo del decesso" in data_df.columns and "Numero Pazienti deceduti" in data_df.columns:
+        spec = get_chart_cache().spec("barh", data_df, "Motivo del decesso", "Numero Pazienti deceduti", "Principali Motivi di decesso", color="skyblue")
+        st.vega_lite_chart(spec, use_container_width=True)
+
+def render_pazienti_per_evento(data_df):
+    st.subheader("Numero Pazienti per evento")
+    st.dataframe(data_df)
+    if "Tipo evento" in data_df.columns and "Numero Pazienti" in data_df.columns:
+        spec = get_chart_cache().spec("barh", data_df, "Tipo evento", "Numero Pazienti", "Numero pazienti per evento", color="green")
+        st.vega_lite_chart(spec, use_container_width=True)
+
+def render_lesioni_coronarografiche(data_df):
+    st.subheader("Conteggio Coronarografie per Tipo di Lesione (Treemap)")
+
+    if "Tipo Lesione" in data_df.columns and "Numero Coronarografie" in data_df.columns:
+        spec = get_chart_cache().spec("treemap", data_df, "Tipo Lesione", "Numero Coronarografie", "Numero Coronarografie per Tipo di Lesione")
+        st.vega_lite_chart(spec, use_container_width=True)
+    else:
+        st.warning("Errore interno: Le colonne 'Tipo Lesione' o 'Numero Coronarografie' non sono state create correttamente.")
+
+# Selectbox label -> (analytics cache entry, render function)
+ANALYTICS_PANELS = {
+    "Distribuzione Pazienti per Sesso": ("distribuzione_sesso", render_distribuzione_sesso),
+    "Casi di Scompensi cardiaci per anno": ("heart_failure_by_year", render_heart_failure_by_year),
+    "Distribuzione Pazienti per Comune di nascita": ("distribuzione_comune_di_nascita", render_distribuzione_comune_di_nascita),
+    "Principali Motivi di decesso": ("principali_cause_decesso", render_principali_cause_decesso),
+    "Numero Pazienti per Evento": ("pazienti_per_evento", render_pazienti_per_evento),
+    "Lesioni coronografiche": ("lesioni_coronarografiche", render_lesioni_coronarografiche),
+}
+
 # ----------------------------- Streamlit Interface ----------------------------------------------------
 st.title("LLM2Query")
 
 # --- Session State for correctness ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
-if "df_to_display" not in st.session_state:
-    st.session_state.df_to_display = None
+if "result_session" not in st.session_state:
+    # Releases the stored results of this session when Streamlit discards its state
+    st.session_state.result_session = get_result_store().open_session()
+if "result_id" not in st.session_state:
+    st.session_state.result_id = None
+if "df_hash" not in st.session_state:
+    st.session_state.df_hash = None
 if "show_last_query_results" not in st.session_state:
     st.session_state.show_last_query_results = False
 
@@ -109,13 +399,36 @@ st.sidebar.image("assets/query_cuore_logo.jpg", width=250)
 st.sidebar.title("Menu Navigazione")
 app_mode = st.sidebar.selectbox(
     "Seleziona la modalità",
-    ["Assistente", "Analitiche", "Cartella Clinica Paziente"]
+    ["Assistente", "Analitiche", "Panoramica", "Cartella Clinica Paziente"]
 )
 
+with st.sidebar.expander("Statistiche connessioni"):
+    st.json(get_pool_stats())
+
 # --- Assistant mode ---
 if app_mode == "Assistente":
     st.sidebar.info("Chiedi qualsiasi cosa riguardo il tuo database. L'assistente cercherà di interpretare i tuoi bisogni e di fornirti un risultato adeguato.")
+    run_in_background = st.sidebar.toggle(
+        "Esegui le query in background",
+        help="La chat resta disponibile mentre la query è in esecuzione; i risultati compaiono nel pannello \"Query in background\"."
+    )
     st.header("Assistente")
+    query_generator = get_query_generator()
+
+    # Past queries, executed again without calling the LLM
+    with st.expander("Cronologia query"):
+        history_text = st.text_input("Cerca nelle richieste precedenti", key="history_search")
+        history_entries = get_query_history().search(history_text, limit=10, source="llm", successful_only=True)
+        if not history_entries:
+            st.caption("Nessuna query trovata.")
+        for entry in history_entries:
+            entry_col, button_col = st.columns([5, 1])
+            entry_col.markdown(
+                f"**{entry['instruction']}**  \n"
+                f"{entry['created_at'].replace('T', ' ')} · {entry['row_count'] or 0} righe · {entry['latency_ms'] or 0:.0f} ms"
+            )
+            if button_col.button("Riesegui", key=f"history_rerun_{entry['id']}", disabled=db is None):
+                rerun_history_entry(entry["id"])
 
     # Visualize all messages in session state
     for msg_idx, message in enumerate(st.session_state.messages):
@@ -125,27 +438,32 @@ if app_mode == "Assistente":
     if prompt := st.chat_input("Chiedimi qualcosa..."):
         st.chat_message("user").markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
-        logger.info(f"Nuovo prompt dall'utente: {prompt}")
+        begin_request()
+        logger.info("Nuovo prompt dall'utente", extra={"prompt": prompt})
 
         # Reset status for new results to be displayed by the persistent section
-        st.session_state.df_to_display = None
-        st.session_state.show_last_query_results = False
+        reset_last_result()
 
         parts_for_history_and_immediate_display = []
+        # Recorded in the query history once the interaction is over, unless a background job records it
+        doc_names, history_executed, history_rows, history_success, history_error = [], None, None, False, None
+        record_history = True
 
-        with st.spinner("Sto generando la query..."):
+        with st.spinner("Sto generando la query..."), stage("generazione"):
             generated_query, error_message, context = query_generator.generate_query(prompt)
 
         if context:
             doc_names = extract_doc_names_from_rag_context(context)
-            logger.info(f"Documenti utilizzati dal contesto RAG: {', '.join(doc_names)}")
+            logger.info("Documenti utilizzati dal contesto RAG", extra={"documents": doc_names})
+            log_payload(logger, "Contesto RAG", context, sample_rate=config.LOG_DEBUG_SAMPLE_RATE)
 
         if error_message:
             error_display_text = f"Si è verificato un errore persistente nella generazione della query:\n```text\n{error_message}\n```"
             parts_for_history_and_immediate_display.append(error_display_text)
-            logger.error(f"Errore generazione query: {error_message}")
+            logger.error("Errore generazione query", extra={"error": error_message})
+            history_error = error_message
         elif generated_query:
-            logger.info(f"Query JSON generata: {generated_query}")
+            log_payload(logger, "Query JSON generata", generated_query, sample_rate=config.LOG_DEBUG_SAMPLE_RATE)
             query_json_for_history = f"**Query JSON generata con successo.** (Dettagli registrati nel file di log)."
             parts_for_history_and_immediate_display.append(query_json_for_history)
             try:
@@ -153,23 +471,50 @@ if app_mode == "Assistente":
                 if query_dict.get("error_type") == "irrelevant_request":
                     msg_irrelevant = query_dict.get("message", "Richiesta non pertinente.")
                     parts_for_history_and_immediate_display.append(f"\n**Nota:** {msg_irrelevant}")
+                    history_error = msg_irrelevant
                 else:
-                    if db is not None:
-                        with st.spinner("Esecuzione della query..."):
-                            logger.info(f"Esecuzione query: {json.dumps(query_dict)}")
-                            query_result = execute_mongodb_query(db, query_dict)
-
+                    if config.ENABLE_PIPELINE_OPTIMIZER:
+                        query_dict, applied_rules = optimize_query(query_dict)
+                        if applied_rules:
+                            logger.info("Ottimizzazioni applicate alla pipeline", extra={"rules": applied_rules})
+
+                    if db is not None and run_in_background:
+                        session_id = st.session_state.result_session.session_id
+                        try:
+                            job_id = get_job_queue().submit(
+                                db, query_dict, user=current_user() or session_id, session_id=session_id,
+                                instruction=prompt, db_schema=config.DB_SCHEMA,
+                                on_finish=history_recorder(get_query_history(), prompt, generated_query, query_dict, doc_names, current_user())
+                            )
+                            record_history = False
+                            logger.info("Query inviata in background", extra={"job_id": job_id, "query": query_dict})
+                            parts_for_history_and_immediate_display.append(f"\n**Query inviata in background** (job `{job_id}`): i risultati compariranno nel pannello \"Query in background\".")
+                        except JobLimitError as e_limit:
+                            parts_for_history_and_immediate_display.append(f"\n**Query non avviata:** {e_limit}")
+                            history_error = str(e_limit)
+                    elif db is not None:
+                        history_executed = query_dict
+                        with st.spinner("Esecuzione della query..."), stage("esecuzione"):
+                            # The "query" field is what src/query_engine/index_advisor.py reads back
+                            logger.info("Esecuzione query", extra={"query": query_dict})
+                            query_result = execute_mongodb_query(db, query_dict, instruction=prompt, db_schema=config.DB_SCHEMA)
+                            if query_result['injected_projection']:
+                                logger.info("Proiezione aggiunta alla query", extra={"projection": query_result['injected_projection']})
+
+                        history_success, history_error = query_result['success'], query_result['error']
                         if query_result['success']:
-                            logger.info("Esecuzione query riuscita.")
+                            history_rows = len(query_result['data'] or [])
+                            logger.info("Esecuzione query riuscita.", extra={"rows": history_rows})
                             if query_result['data']:
                                 try:
-                                    df_full = pd.DataFrame(query_result['data'])
-                                    st.session_state.df_to_display = df_full # Salva per la sezione persistente
+                                    with stage("memorizzazione"):
+                                        df_full = pd.DataFrame(query_result['data'])
+                                        # Saved for the persistent section
+                                        st.session_state.result_id = get_result_store().put(st.session_state.result_session.session_id, df_full)
                                     st.session_state.show_last_query_results = True
 
-                                    display_limit = 20
-                                    displayed_rows = min(display_limit, len(df_full))
-
+                                except ResultTooLargeError as e_size:
+                                    parts_for_history_and_immediate_display.append(f"\n**Risultato non memorizzato:** {e_size}. Restringi la query.")
                                 except Exception as e_df:
                                     err_format_msg = f"\n**Errore formattazione tabella:** {e_df}\n**Risultati (JSON):**\n```json\n{json.dumps(query_result['data'], indent=2, ensure_ascii=False)}\n```"
                                     parts_for_history_and_immediate_display.append(err_format_msg)
@@ -177,13 +522,17 @@ if app_mode == "Assistente":
                                 parts_for_history_and_immediate_display.append("\nNessun risultato trovato.")
                                 logger.info("Query eseguita, nessun risultato.")
                         else: # Query execution failed
+                            logger.error("Esecuzione query fallita", extra={"error": query_result['error']})
                             parts_for_history_and_immediate_display.append(f"\n**Errore Esecuzione:**\n{query_result['error']}")
                     else: # DB instance is None
                         parts_for_history_and_immediate_display.append("\n**Errore Esecuzione:** Connessione al database non disponibile.")
+                        history_error = "Connessione al database non disponibile."
             except json.JSONDecodeError as e:
                 parts_for_history_and_immediate_display.append(f"\n**Errore Parsing JSON (LLM Output):** {e}\nLLM Output:\n{generated_query}")
+                history_error = f"JSON non valido: {e}"
             except Exception as e:
                 parts_for_history_and_immediate_display.append(f"\n**Errore Imprevisto:** {e}")
+                history_error = str(e)
 
         # Show the assistant's message in the chat and save it in the history
         if parts_for_history_and_immediate_display:
@@ -192,36 +541,75 @@ if app_mode == "Assistente":
                 st.markdown(assistant_response_content, unsafe_allow_html=True)
             st.session_state.messages.append({"role": "assistant", "content": assistant_response_content})
 
+        request_summary = finish_request(logger, has_results=st.session_state.show_last_query_results)
+        if record_history:
+            try:
+                # The generator's output as returned (None if the generation failed) and, separately, the executed query
+                get_query_history().record(
+                    prompt, generated_query or None, executed_query_json=history_executed, context_docs=doc_names,
+                    latency_ms=request_summary["duration_ms"], row_count=history_rows, success=history_success,
+                    error=history_error, user=current_user()
+                )
+            except Exception as e:
+                logger.error(f"Errore salvataggio cronologia query: {e}")
+
         # If we have results or context to show in the persistent section, we force a rerun
         # to make it appear immediately below the chat.
         if st.session_state.show_last_query_results:
             st.rerun()
 
+    render_background_jobs(st.session_state.result_session.session_id)
+
     # ---- PERSISTENT DISPLAY SECTION
     # This section is ALWAYS executed AFTER the 'if prompt' block (if there was input)
     # and after the message loop, then at each rerun.
 
-    if st.session_state.show_last_query_results and st.session_state.df_to_display is not None:
+    if st.session_state.show_last_query_results and st.session_state.result_id is not None:
         st.markdown("---")
 
-        df_display = st.session_state.df_to_display
-        if not df_display.empty:
-            display_limit = 20
-            displayed_rows = min(display_limit, len(df_display))
-
-            st.write(f"Visualizzazione delle prime {displayed_rows} righe su {len(df_display)} totali:")
-            st.dataframe(df_display.head(display_limit))
-
-            csv_data = df_display.to_csv(index=False).encode('utf-8')
-            unique_download_key = f"download_csv_{datetime.now().timestamp()}"
-
-            st.download_button(
-                label="📥 Scarica risultati completi (CSV)",
-                data=csv_data,
-                file_name=f"risultati_query_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                key=unique_download_key
-            )
+        result_store = get_result_store()
+        result_info = result_store.info(st.session_state.result_id)
+        if result_info is None:
+            st.info("Il risultato dell'ultima query non è più disponibile: esegui di nuovo la richiesta.")
+        elif result_info["rows"] > 0:
+            render_result_grid(st.session_state.result_id, result_info["columns"])
+
+            # The file is written only when requested, and reused for the same result and format
+            export_col1, export_col2 = st.columns([1, 3])
+            with export_col1:
+                export_format = st.selectbox(
+                    "Formato",
+                    available_formats(),
+                    format_func=lambda fmt: EXPORT_FORMATS[fmt]["label"],
+                    key="export_format"
+                )
+            with export_col2:
+                st.write("")
+                if st.button("Prepara file", key="prepare_export"):
+                    try:
+                        with st.spinner("Preparazione del file in corso..."):
+                            df_display = result_store.get(st.session_state.result_id)
+                            if df_display is None:
+                                raise ValueError("il risultato non è più disponibile")
+                            if st.session_state.df_hash is None:
+                                st.session_state.df_hash = result_hash(df_display)
+                            get_result_exporter().export(df_display, export_format, st.session_state.df_hash)
+                    except Exception as e:
+                        st.error(f"Esportazione non riuscita: {e}")
+                        logger.error(f"Errore esportazione risultati ({export_format}): {e}")
+
+            export_path = None
+            if st.session_state.df_hash is not None:
+                export_path = get_result_exporter().cached_path(st.session_state.df_hash, export_format)
+            if export_path:
+                with open(export_path, "rb") as export_file:
+                    st.download_button(
+                        label=f"📥 Scarica risultati completi ({EXPORT_FORMATS[export_format]['label']})",
+                        data=export_file,
+                        file_name=f"risultati_query_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}",
+                        mime=EXPORT_FORMATS[export_format]["mime"],
+                        key=f"download_{st.session_state.df_hash}_{export_format}"
+                    )
         else:
             st.info("L'ultima query è stata eseguita con successo ma non ha prodotto dati.")
 
@@ -230,185 +618,128 @@ elif app_mode == "Analitiche":
     st.sidebar.info("Visualizza le analitiche del tuo database. Le analitiche sono predefinite e non richiedono input da parte dell'utente.")
     st.header("Analitiche Cliniche")
 
-    if db is None:
+    if analytics_db is None:
         st.error("Impossibile connettersi al database. Controlla la configurazione.")
     else:
-        analytics_options = [
-            "--- Seleziona un'analitica ---",
-            "Distribuzione Pazienti per Sesso",
-            "Casi di Scompensi cardiaci per anno",
-            "Distribuzione Pazienti per Comune di nascita",
-            "Principali Motivi di decesso",
-            "Numero Pazienti per Evento",
-            "Lesioni coronografiche"
-        ]
+        analytics_options = ["--- Seleziona un'analitica ---"] + list(ANALYTICS_PANELS) + ["Andamento temporale", "Costruttore di coorti"]
 
         chosen_analytics = st.selectbox("Seleziona un'analitica", analytics_options)
-
-        if chosen_analytics == "Distribuzione Pazienti per Sesso":
-            data_df, error = ad.get_distibuzione_sesso(db)
+        analytics_cache = get_analytics_cache(analytics_db)
+
+        if st.sidebar.button("Aggiorna riepiloghi analitiche"):
+            with st.spinner("Aggiornamento dei riepiloghi in corso..."):
+                refresh_results = refresh_materializations(analytics_db)
+                analytics_cache.refresh_all()
+            if refresh_results is None:
+                st.sidebar.info("Un altro processo sta già aggiornando i riepiloghi: riprova tra poco.")
+            for refresh_result in refresh_results or []:
+                refreshed_name = refresh_result.get('summary') or refresh_result.get('series')
+                logger.info(f"Refresh riepilogo {refreshed_name}: {refresh_result['mode']}")
+                if refresh_result['mode'] == "error":
+                    st.sidebar.error(f"{refreshed_name}: {refresh_result['error']}")
+
+        if chosen_analytics in ANALYTICS_PANELS:
+            cache_name, render_panel = ANALYTICS_PANELS[chosen_analytics]
+            data_df, error, refreshed_at = analytics_cache.get(cache_name)
+            show_freshness(refreshed_at)
             if error:
                 st.error(error)
             elif not data_df.empty:
-                st.subheader("Distribuzione Pazienti per Sesso")
-                st.dataframe(data_df)
-                if 'Sesso' in data_df.columns and 'Numero Pazienti' in data_df.columns:
-                    st.bar_chart(data_df.set_index('Sesso'))
-            else: st.info("Nessun dato disponibile per questa analisi.")
-
-        elif chosen_analytics == "Distribuzione Pazienti per Comune di nascita":
-            data_df, error = ad.get_distribuzione_comune_di_nascita(db)
-            if error:
-                st.error(error)
-            elif not data_df.empty:
-                st.subheader("Distribuzione Pazienti per Comune di nascita")
-                st.dataframe(data_df)
-                if "Comune di nascita" in data_df.columns and "Numero Pazienti" in data_df.columns:
-                    st.bar_chart(data_df.set_index("Comune di nascita"))
+                render_panel(data_df)
             else:
-                st.info("Nessun dato disponibile per questa analisi")
+                st.info("Nessun dato disponibile per questa analisi.")
 
-        elif chosen_analytics == "Casi di Scompensi cardiaci per anno":
-            data_df, error = ad.get_heart_failure_by_year(db)
-            if error:
-                st.error(error)
-            elif not data_df.empty:
-                st.subheader("Numero di Casi di Heart Failure per Anno")
-                st.dataframe(data_df)
-
-                if "Anno" in data_df.columns and "Numero Casi" in data_df.columns:
-                    fig, ax = plt.subplots(figsize=(12,6))
-                    ax.plot(data_df["Anno"], data_df["Numero Casi"], marker='o', linestyle='-', color='purple')
-
-                    ax.set_xlabel("Anno", fontsize=12)
-                    ax.set_ylabel("Numero Casi", fontsize=12)
-                    ax.set_title("Andamente Annuale dei Casi di Scompenso cardiaco", fontsize=14)
-                    ax.grid(True, linestyle='--', alpha=0.7)
-
-                    ax.set_xticks(data_df["Anno"].astype(int))
-                    ax.tick_params(axis='x', rotation=45)
-
-                    plt.tight_layout()
-                    st.pyplot(fig)
-                else:
-                    st.warning("Le colonne 'Anno' o 'Numero Casi' non sono state trovate nei dati. Verifica la query MongoDB e le intestazioni.")
-            else:
-                st.info("Nessun dato disponibile per l'analisi dei casi di Heart Failure per anno.")
-
-
-        elif chosen_analytics == "Principali Motivi di decesso":
-            data_df, error = ad.get_principali_cause_decesso(db)
-            if error:
-                st.error(error)
-            elif not data_df.empty:
-                st.subheader("Principali Motivi di decesso")
-                st.dataframe(data_df)
-                if "Motivo del decesso" in data_df.columns and "Numero Pazienti deceduti" in data_df.columns:
-
-                    fig, ax = plt.subplots(figsize=(10,6))
-                    ax.barh(data_df["Motivo del decesso"], data_df["Numero Pazienti deceduti"], color="skyblue")
-                    ax.invert_yaxis()
-
-                    ax.set_xlabel("Numero Pazienti deceduti")
-                    ax.set_ylabel("Motivo del decesso")
-                    ax.set_title("Principali Motivi di decesso")
+        elif chosen_analytics == "Andamento temporale":
+            trend_series = {"Eventi per tipo": "eventi", "Casi di Scompenso cardiaco": "heart_failure"}
+            granularity_labels = dict(zip(GRANULARITIES, ["Giorno", "Mese", "Anno"]))
 
-                    plt.tight_layout()
-                    st.pyplot(fig)
+            col1, col2 = st.columns(2)
+            with col1:
+                chosen_series = st.selectbox("Serie", list(trend_series))
+                chosen_granularity = st.radio("Granularità", GRANULARITIES, index=1, format_func=granularity_labels.get, horizontal=True)
+            with col2:
+                date_range = st.date_input("Intervallo (opzionale)", value=())
 
-            else:
-                st.info("Nessun dato disponibile per questa analisi")
+            start_date, end_date = None, None
+            if len(date_range) == 2:
+                start_date = datetime.combine(date_range[0], datetime.min.time())
+                end_date = datetime.combine(date_range[1], datetime.min.time()) + timedelta(days=1)
 
-        elif chosen_analytics == "Numero Pazienti per Evento":
-            data_df, error = ad.get_pazienti_per_evento(db)
+            data_df, error = ad.get_andamento_temporale(analytics_db, trend_series[chosen_series], chosen_granularity, start_date, end_date)
             if error:
                 st.error(error)
             elif not data_df.empty:
-                st.subheader("Numero Pazienti per evento")
+                st.subheader(f"{chosen_series} per {granularity_labels[chosen_granularity].lower()}")
+                st.line_chart(data_df)
                 st.dataframe(data_df)
-                if "Tipo evento" in data_df.columns and "Numero Pazienti" in data_df.columns:
-
-                    fig, ax = plt.subplots(figsize=(10,6))
-                    ax.barh(data_df["Tipo evento"], data_df["Numero Pazienti"], color="green")
-                    ax.invert_yaxis()
-
-                    ax.set_xlabel("Numero Pazienti")
-                    ax.set_ylabel("Tipo evento")
-                    ax.set_title("Numero pazienti per evento")
-
-                    plt.tight_layout()
-                    st.pyplot(fig)
-
             else:
-                st.info("Nessun dato disponibile per questa analisi")
-
-        elif chosen_analytics == "Lesioni coronografiche":
-            csv_file_path = os.path.join("src", "evaluation", "gold_results", "results_query_n18.csv")
-            logger.info(f"Tentativo caricamento CSV Lesioni da: {csv_file_path}")
-            try:
-                temp_df = pd.read_csv(csv_file_path)
-                error = None
-
-                # Data transformation for treemap
-                if not temp_df.empty:
-
-                    lesion_columns = ['LESIONI_TC', 'LESIONI_IVA', 'LESIONI_CX', 'LESIONI_DX']
+                st.info("Nessun dato disponibile per l'intervallo selezionato.")
 
+        elif chosen_analytics == "Costruttore di coorti":
+            with st.spinner("Caricamento dell'indice delle coorti..."):
+                cohort_index = get_cohort_index(analytics_db)
+                cohort_index.refresh_if_stale(config.COHORT_INDEX_REFRESH_SECONDS, config.COHORT_INDEX_REBUILD_SECONDS)
 
-                    if all(col in temp_df.columns for col in lesion_columns):
-
-                        data_for_treemap = {
-                            "Tipo Lesione": [],
-                            "Numero Pazienti": []
-                        }
-                        for col in lesion_columns:
-                            data_for_treemap["Tipo Lesione"].append(col)
-                            data_for_treemap["Numero Pazienti"].append(temp_df[col].iloc[0])
-
-                        data_df = pd.DataFrame(data_for_treemap)
+            st.caption("Attributi disponibili: " + ", ".join(cohort_index.attributes()))
+            cohort_expression = st.text_input(
+                "Espressione della coorte (AND, OR, NOT e parentesi)",
+                placeholder='DIABETE AND FUMO AND PREVIOUS_PCI AND (RICOVERO OR "EVENTO:RICOVERO")'
+            )
+            if cohort_expression:
+                try:
+                    start_time = time.perf_counter()
+                    cohort_ids = cohort_index.patient_ids(cohort_expression)
+                    elapsed_ms = (time.perf_counter() - start_time) * 1000
+                    st.metric("Pazienti nella coorte", len(cohort_ids))
+                    st.caption(f"Calcolata in {elapsed_ms:.2f} ms su {len(cohort_index)} pazienti")
+                    if cohort_ids:
+                        st.dataframe(pd.DataFrame({"Id Paziente": cohort_ids}))
+                except CohortExpressionError as e:
+                    st.error(str(e))
+
+# ---- Overview Mode ----
+elif app_mode == "Panoramica":
+    st.sidebar.info("Visualizza tutte le analitiche insieme. Le analitiche vengono caricate in parallelo e ogni pannello compare appena è pronto.")
+    st.header("Panoramica Analitiche")
+
+    if analytics_db is None:
+        st.error("Impossibile connettersi al database. Controlla la configurazione.")
+    else:
+        analytics_cache = get_analytics_cache(analytics_db)
+
+        # One placeholder per panel, laid out in a two-column grid, filled as results arrive
+        panel_titles = list(ANALYTICS_PANELS)
+        grid_columns = st.columns(2)
+        placeholders = {title: grid_columns[i % 2].empty() for i, title in enumerate(panel_titles)}
+        for title in panel_titles:
+            placeholders[title].info(f"Caricamento di '{title}'...")
+
+        def load_panel(title):
+            start_time = time.perf_counter()
+            data_df, error, refreshed_at = analytics_cache.get(ANALYTICS_PANELS[title][0])
+            return data_df, error, refreshed_at, time.perf_counter() - start_time
+
+        overview_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(panel_titles)) as executor:
+            futures = {executor.submit(load_panel, title): title for title in panel_titles}
+            for future in as_completed(futures):
+                title = futures[future]
+                with placeholders[title].container():
+                    try:
+                        data_df, error, refreshed_at, elapsed = future.result()
+                    except Exception as e:
+                        st.error(f"Errore durante il caricamento di '{title}': {e}")
+                        continue
+                    st.caption(f"{title}: caricata in {elapsed * 1000:.0f} ms, dati aggiornati al {refreshed_at.strftime('%d/%m/%Y %H:%M:%S')}")
+                    if error:
+                        st.error(error)
+                    elif not data_df.empty:
+                        ANALYTICS_PANELS[title][1](data_df)
                     else:
-                        st.error("Il file CSV non contiene tutte le colonne di lesione attese (LESIONI_TC, LESIONI_IVA, LESIONI_CX, LESIONI_DX).")
-                        data_df = pd.DataFrame()
-                else:
-                    data_df = pd.DataFrame()
-
-
-            except FileNotFoundError:
-                data_df = pd.DataFrame()
-                error = f"Il file '{csv_file_path}' non è stato trovato. Assicurati che il percorso sia corretto."
-            except Exception as e:
-                data_df = pd.DataFrame()
-                error = f"Si è verificato un errore durante il caricamento o la trasformazione del file CSV: {e}"
-
-            if error:
-                st.error(error)
-            elif not data_df.empty:
-                st.subheader("Conteggio Pazienti per Tipo di Lesione (Treemap)")
-
-
-                if "Tipo Lesione" in data_df.columns and "Numero Pazienti" in data_df.columns:
-                    fig, ax = plt.subplots(figsize=(12, 7))
-
-
-                    labels = [f"{row['Tipo Lesione']}\n({row['Numero Pazienti']})"
-                                for index, row in data_df.iterrows()]
-
-                    squarify.plot(sizes=data_df["Numero Pazienti"],
-                                    label=labels,
-                                    alpha=0.8,
-                                    ax=ax,
-                                    pad=True,
-                                    text_kwargs={'fontsize': 10, 'color': 'white'})
-
-                    ax.set_title("Numero Pazienti per Tipo di Lesione", fontsize=16)
-                    plt.axis('off')
-                    plt.tight_layout()
-                    st.pyplot(fig)
-                else:
-                    st.warning("Errore interno: Le colonne 'Tipo Lesione' o 'Numero Pazienti' non sono state create correttamente.")
-            else:
-                st.info("Nessun dato disponibile per le lesioni.")
+                        st.info(f"Nessun dato disponibile per '{title}'.")
+                logger.info(f"Panoramica: pannello '{title}' caricato in {elapsed * 1000:.0f} ms")
 
+        st.sidebar.caption(f"Panoramica caricata in {(time.perf_counter() - overview_start) * 1000:.0f} ms")
 
 elif app_mode == "Cartella Clinica Paziente":
     st.sidebar.info("Qui puoi cercare un paziente per codice fiscale o codice paziente e sezione. Potrai ottenere la cartella clinica digitale del paziente.")
@@ -419,7 +750,7 @@ elif app_mode == "Cartella Clinica Paziente":
     else:
 
         type_of_search = st.radio("Scegli la modalità di ricerca:",
-            ("Codice Fiscale", "Codice Paziente + Sezione")
+            ("Ricerca rapida", "Codice Fiscale", "Codice Paziente + Sezione")
         )
 
         research_data = {}
@@ -434,6 +765,25 @@ elif app_mode == "Cartella Clinica Paziente":
                 else:
                     st.warning("Per favore, inserisci il codice fiscale.")
 
+        elif type_of_search == "Ricerca rapida":
+
+            search_text = st.text_input("Cerca per codice fiscale, cognome e nome o id paziente.")
+            if search_text:
+                search_index = get_patient_search_index(db)
+                search_index.refresh_if_stale(config.PATIENT_SEARCH_REFRESH_SECONDS)
+                matches = search_index.search(search_text, limit=20)
+                if matches:
+                    chosen_patient = st.selectbox(
+                        "Pazienti trovati",
+                        matches,
+                        format_func=lambda p: f"{p['COGNOME']} {p['NOMEPAZ']} - {p['CODICE_FISCALE']} ({p['ID_PAZ']})"
+                    )
+                    if st.button("Apri Cartella"):
+                        research_data = {"type": "patient_id", "value": chosen_patient["ID_PAZ"]}
+                        exec_research = True
+                else:
+                    st.info("Nessun paziente corrisponde alla ricerca.")
+
         elif type_of_search == "Codice Paziente + Sezione":
 
             col1, col2 = st.columns(2)
@@ -453,32 +803,28 @@ elif app_mode == "Cartella Clinica Paziente":
                 else:
                     st.warning("Per favore, inserire codice paziente e sezione.")
 
+        extra_sections = st.multiselect(
+            "Sezioni aggiuntive della cartella",
+            [name for name in RECORD_SECTIONS if name not in DEFAULT_SECTIONS],
+            format_func=lambda name: RECORD_SECTIONS[name]["title"]
+        )
+
         if exec_research:
 
-            # Doing all queries for the clinical record
-            events_list_df, error = ad.get_lista_eventi(db, research_data)
+            # Served from the per-patient cache, or assembled with one aggregation on a miss
+            start_time = datetime.now()
+            patient_record, error, cache_hit = get_patient_cache(db).get(research_data, DEFAULT_SECTIONS + extra_sections)
+            elapsed_ms = (datetime.now() - start_time).total_seconds() * 1000
+            logger.info(f"Cartella clinica {'dalla cache' if cache_hit else 'dal database'} in {elapsed_ms:.1f} ms")
 
             if error:
                 st.error(error)
-            elif not events_list_df.empty:
-                st.subheader("Lista eventi del paziente")
-                st.dataframe(events_list_df)
-
-                # Check if there is an anamnesi event to do other queries
-                if events_list_df["Tipo evento"].isin(['ANAMNESI']).any():
-
-                    # Get patient id to easier queries
-                    patient_id = events_list_df["Id Paziente"].iloc[0]
-
-                    last_anamnesi_date_df, error = ad.get_last_anamnesi_data(db, patient_id)
-                    last_date = last_anamnesi_date_df["Data evento"].iloc[0]
-
-                    values_anamnesi_df, error = ad.get_most_worth_from_anamnesi(db, patient_id, last_date)
-                    st.subheader("Ultima Anamnesi del Paziente")
-                    st.dataframe(values_anamnesi_df)
-
-
+            elif patient_record["eventi"].empty:
+                st.info("Nessun evento trovato per i dati inseriti")
             else:
-                st.info("Nessun dato disponibile per questa analisi")
-
-
+                st.caption(f"Cartella caricata {'dalla cache' if cache_hit else 'dal database'} in {elapsed_ms:.1f} ms")
+                for section_name in DEFAULT_SECTIONS + extra_sections:
+                    section_df = patient_record[section_name]
+                    if not section_df.empty:
+                        st.subheader(RECORD_SECTIONS[section_name]["title"])
+                        st.dataframe(section_df)
@@ -1,31 +1,56 @@
 import json
 import os
-import torch
-from sentence_transformers import SentenceTransformer
-import chromadb
-from chromadb.config import Settings
-import google.generativeai as genai
+import threading
 
 MAX_RETRIES = 1
 
+# Heavy objects (embedding model, ChromaDB client, Gemini model) are created on first
+# access through the module __getattr__ below, so importing config stays cheap for the
+# modes and tools that never use them.
+
 # ------ Embedding Model and Devices -------
 # https://huggingface.co/thenlper/gte-large
-embedding_model = SentenceTransformer("thenlper/gte-large")
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Socket of a running src/embedding/embedding_server.py: when set, this process uses the
+# shared model through a client instead of loading its own copy. The shared secret of the
+# server is read from EMBEDDING_SERVER_AUTHKEY, in the environment or in secret.json
+EMBEDDING_SERVER_SOCKET = os.environ.get("EMBEDDING_SERVER_SOCKET")
+EMBEDDING_SERVER_AUTHKEY_KEY = "EMBEDDING_SERVER_AUTHKEY"
+
+
+def _load_embedding_model():
+    if EMBEDDING_SERVER_SOCKET:
+        from src.embedding.embedding_server import EmbeddingClient
+        authkey = os.environ.get(EMBEDDING_SERVER_AUTHKEY_KEY) or secrets.get(EMBEDDING_SERVER_AUTHKEY_KEY)
+        return {"embedding_model": EmbeddingClient(EMBEDDING_SERVER_SOCKET, authkey=authkey.encode() if authkey else None),
+                "DEVICE": None}
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    embedding_model = SentenceTransformer("thenlper/gte-large")
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    # Move embedding model to the desired device
+    if next(embedding_model.parameters()).is_meta:
+        embedding_model.to_empty(device=device)
+    else:
+        embedding_model.to(device)
+    return {"embedding_model": embedding_model, "DEVICE": device}
 
-# Move embedding model to the desired device
-if next(embedding_model.parameters()).is_meta:
-    embedding_model.to_empty(device=DEVICE)
-else:
-    embedding_model.to(DEVICE)
 
 # ------ ChromaDB Config ------
 CHROMA_PATH = "chroma_data/"
-chroma_client = chromadb.PersistentClient(CHROMA_PATH)
+
+
+def _load_chroma_client():
+    import chromadb
+    return {"chroma_client": chromadb.PersistentClient(CHROMA_PATH)}
+
 
 # ------ Google Gemini API ------
 SECRETS_FILE = "secret.json"
 GOOGLE_API_KEY = None
+secrets = {}
 
 try:
     with open(SECRETS_FILE) as f:
@@ -34,8 +59,6 @@ try:
 
     if not GOOGLE_API_KEY:
         raise KeyError(f"Key 'GOOGLE_API_KEY not found in {SECRETS_FILE}")
-    genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-2.0-flash')
 
 except FileNotFoundError:
     print(f"[GOOGLE API Error]: File {SECRETS_FILE} not found")
@@ -44,6 +67,37 @@ except json.JSONDecodeError:
 except KeyError as e:
     print(f"[GOOGLE API Key Error]: {e}")
 
+
+def _load_gemini_model():
+    if not GOOGLE_API_KEY:
+        return {}
+    import google.generativeai as genai
+    genai.configure(api_key=GOOGLE_API_KEY)
+    return {"gemini_model": genai.GenerativeModel('gemini-2.0-flash')}
+
+
+# ------ Lazy attributes ------
+_LAZY_ATTRIBUTES = {
+    "embedding_model": _load_embedding_model,
+    "DEVICE": _load_embedding_model,
+    "chroma_client": _load_chroma_client,
+    "gemini_model": _load_gemini_model,
+}
+_lazy_lock = threading.RLock()
+
+
+def __getattr__(name):
+    # Called only for attributes not yet in the module namespace
+    loader = _LAZY_ATTRIBUTES.get(name)
+    if loader is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _lazy_lock:
+        if name not in globals():
+            globals().update(loader())
+    if name not in globals():
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r} (not configured)")
+    return globals()[name]
+
 # ------ MongoDB Schema ------
 SCHEMA_FILE_PATH = 'mongodb_schema.txt'
 DB_SCHEMA = None
@@ -67,3 +121,72 @@ MONGO_URI = secrets.get(MONGO_URI_KEY)
 if not MONGO_URI:
     print(f"[MONGO URI Error]: Key {MONGO_URI_KEY} not found in {SECRETS_FILE}")
 
+
+# ------ MongoDB Connection Pool ------
+MONGO_MAX_POOL_SIZE = 50
+MONGO_MIN_POOL_SIZE = 5
+MONGO_MAX_IDLE_TIME_MS = 300000
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+# Compressors are negotiated in order; the ones whose Python package is missing are skipped
+MONGO_COMPRESSORS = ["zstd", "snappy", "zlib"]
+MONGO_INTERACTIVE_READ_PREFERENCE = "primaryPreferred"
+MONGO_ANALYTICS_READ_PREFERENCE = "secondaryPreferred"
+
+# ------ Query Optimization ------
+# Rewrite generated aggregation pipelines before execution (see src/query_engine/pipeline_optimizer.py)
+ENABLE_PIPELINE_OPTIMIZER = True
+
+# ------ Analytics Cache ------
+# Seconds between background refreshes of the dashboard analytics shared by all sessions
+ANALYTICS_CACHE_REFRESH_SECONDS = 300
+# Summaries and rollups follow inserts incrementally at every refresh; updated and deleted
+# documents are picked up by a full rebuild this often
+SUMMARY_FULL_REBUILD_SECONDS = 3600
+
+# ------ Patient Record Cache ------
+PATIENT_CACHE_MAX_SIZE = 200
+PATIENT_CACHE_TTL_SECONDS = 600
+# Patients of the same SEZIONE prefetched after every opened record
+PATIENT_PREFETCH_COUNT = 5
+# Seconds after which the typeahead index reads the newly inserted patients
+PATIENT_SEARCH_REFRESH_SECONDS = 300
+
+# ------ Cohort Index ------
+# Seconds after which the cohort bitmaps read the newly inserted documents
+COHORT_INDEX_REFRESH_SECONDS = 300
+# Seconds after which the bitmaps are rebuilt from scratch, picking up updated and deleted documents
+COHORT_INDEX_REBUILD_SECONDS = 3600
+
+# ------ Session Result Store ------
+# Query results larger than this are spilled to memory-mapped Parquet files
+RESULT_STORE_MEMORY_THRESHOLD_BYTES = 8 * 1024 ** 2
+RESULT_STORE_SESSION_QUOTA_BYTES = 256 * 1024 ** 2
+RESULT_STORE_GLOBAL_QUOTA_BYTES = 2 * 1024 ** 3
+# Results of sessions idle for longer are released
+RESULT_STORE_IDLE_SECONDS = 3600
+
+# ------ Logging ------
+# JSON lines, one record per line (src/monitoring/structured_logging.py)
+LOG_FILE_PATH = "logs/app_activity.log"
+LOG_LEVEL = "DEBUG"
+# The log rotates at this size or after LOG_ROTATE_SECONDS, whichever comes first
+LOG_MAX_BYTES = 20 * 1024 ** 2
+LOG_ROTATE_SECONDS = 86400
+LOG_BACKUP_COUNT = 14
+# Fraction of the interactions whose generated query and RAG context are logged at DEBUG
+LOG_DEBUG_SAMPLE_RATE = 0.1
+
+# ------ Query History ------
+# SQLite database of the executed queries (src/query_engine/query_history.py)
+QUERY_HISTORY_PATH = "query_history.db"
+
+# ------ Background Query Jobs ------
+JOB_QUEUE_WORKERS = 4
+# Queries each user may have queued or running at the same time
+JOB_QUEUE_PER_USER_LIMIT = 2
+# Seconds a finished job stays listed
+JOB_RETENTION_SECONDS = 3600
+# Seconds between two refreshes of the background jobs panel
+JOB_POLL_SECONDS = 2
+# Server-side time limit (maxTimeMS) of a background query
+JOB_MAX_TIME_MS = 600000
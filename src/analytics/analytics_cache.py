@@ -0,0 +1,172 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any
+import pandas as pd
+import src.analytics.analytics_dashboard as ad
+from src.analytics.materialized_views import refresh_all, get_watermark, acquire_refresh_lease, release_refresh_lease
+from src.analytics.time_rollups import refresh_all_series
+
+# Dashboard analytics served through the cache: name -> function(db) returning (DataFrame, error)
+DEFAULT_ANALYTICS = {
+    "distribuzione_sesso": ad.get_distibuzione_sesso,
+    "distribuzione_comune_di_nascita": ad.get_distribuzione_comune_di_nascita,
+    "heart_failure_by_year": ad.get_heart_failure_by_year,
+    "principali_cause_decesso": ad.get_principali_cause_decesso,
+    "pazienti_per_evento": ad.get_pazienti_per_evento,
+    "lesioni_coronarografiche": ad.get_lesioni_coronarografiche,
+}
+
+# Watermark of the materialization each analytic reads: its data is as recent as that refresh
+ANALYTICS_SOURCES = {
+    "distribuzione_sesso": "distribuzione_sesso",
+    "distribuzione_comune_di_nascita": "distribuzione_comune_di_nascita",
+    "heart_failure_by_year": "rollup_heart_failure",
+    "principali_cause_decesso": "principali_cause_decesso",
+    "pazienti_per_evento": "pazienti_per_evento",
+    "lesioni_coronarografiche": "lesioni_coronarografiche",
+}
+
+
+def refresh_materializations(db, full: bool = False, rebuild_after: float = None, lease_seconds: float = 600):
+    """Refresh the materialized summaries and the time rollups under the cross-process refresh lease.
+
+    Returns:
+        One status entry per summary and series, or None if another process is refreshing them
+    """
+    lease = acquire_refresh_lease(db, ttl_seconds=lease_seconds)
+    if lease is None:
+        return None
+    try:
+        return refresh_all(db, full=full, rebuild_after=rebuild_after) + refresh_all_series(db, full=full, rebuild_after=rebuild_after)
+    finally:
+        release_refresh_lease(db, lease)
+
+
+class AnalyticsCache:
+    """Process-wide stale-while-revalidate cache of the dashboard analytics.
+
+    Readers always get the last snapshot without waiting for MongoDB: only the
+    very first read of an analytic computes it in the caller's thread. A
+    background thread recomputes every registered analytic each refresh_interval
+    seconds, and a read of a snapshot older than that triggers an early refresh.
+    A failed refresh keeps serving the previous snapshot and records the error.
+
+    With materialize=True the background thread first brings the materialized
+    summaries and rollups the analytics read up to date (rebuilding them every
+    rebuild_after seconds), so each cycle reads new data.
+    """
+
+    def __init__(self, db, analytics: Dict[str, Callable] = None, refresh_interval: float = 300,
+                 materialize: bool = False, rebuild_after: float = None):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.materialize = materialize
+        self.rebuild_after = rebuild_after
+        self.last_materialization = None
+        self._analytics = dict(analytics if analytics is not None else DEFAULT_ANALYTICS)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def register(self, name: str, function: Callable):
+        with self._lock:
+            self._analytics[name] = function
+
+    def get(self, name: str):
+        """Return the cached result of an analytic.
+
+        Returns:
+            tuple:
+                - DataFrame: Last computed data
+                - str: Error message, or None
+                - datetime: How recent the data is (last sync of the summary it reads)
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            entry = self.refresh(name)
+        elif time.monotonic() - entry["computed_at"] > self.refresh_interval:
+            self._refresh_async(name)
+        return entry["data"], entry["error"], entry["refreshed_at"]
+
+    def _data_as_of(self, name: str) -> datetime:
+        """When the materialization read by an analytic was last synced, in local time; now for live reads."""
+        try:
+            watermark = get_watermark(self.db, ANALYTICS_SOURCES[name]) if name in ANALYTICS_SOURCES else None
+        except Exception:
+            watermark = None
+        if watermark is None or watermark.get("refreshed_at") is None:
+            # Not materialized yet: the analytic runs the live pipeline
+            return datetime.now()
+        return watermark["refreshed_at"].replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+    def refresh(self, name: str) -> Dict[str, Any]:
+        """Recompute one analytic now and store the new snapshot."""
+        with self._lock:
+            function = self._analytics[name]
+            previous = self._entries.get(name)
+        # Read before the data: a summary refreshed in between makes the timestamp older, never newer
+        data_as_of = self._data_as_of(name)
+        try:
+            data, error = function(self.db)
+        except Exception as e:
+            data, error = pd.DataFrame(), f"Error refreshing {name}: {e}"
+
+        if error and previous is not None and previous["error"] is None:
+            # Keep serving the last good snapshot
+            entry = dict(previous, last_error=error)
+        else:
+            entry = {
+                "data": data,
+                "error": error,
+                "refreshed_at": data_as_of,
+                "computed_at": time.monotonic(),
+                "last_error": error,
+            }
+        with self._lock:
+            self._entries[name] = entry
+            self._refreshing.discard(name)
+        return entry
+
+    def _refresh_async(self, name: str):
+        with self._lock:
+            if name in self._refreshing:
+                return
+            self._refreshing.add(name)
+        threading.Thread(target=self.refresh, args=(name,), daemon=True, name=f"analytics-refresh-{name}").start()
+
+    def refresh_all(self):
+        with self._lock:
+            names = list(self._analytics)
+        for name in names:
+            self.refresh(name)
+
+    def freshness(self) -> Dict[str, Any]:
+        """Timestamp and last refresh error of every cached analytic."""
+        with self._lock:
+            return {
+                name: {"refreshed_at": entry["refreshed_at"], "last_error": entry["last_error"]}
+                for name, entry in self._entries.items()
+            }
+
+    def _run(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            if self.materialize:
+                try:
+                    self.last_materialization = refresh_materializations(self.db, rebuild_after=self.rebuild_after)
+                except Exception as e:
+                    self.last_materialization = [{"summary": "*", "mode": "error", "error": str(e)}]
+            self.refresh_all()
+
+    def start(self):
+        """Start the background refresh thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name="analytics-cache-refresher")
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
@@ -1,34 +1,35 @@
-import pymongo
-from pymongo import MongoClient
 import pandas as pd
 from datetime import datetime
-import config
+from src.database.connection_manager import get_database, WORKLOAD_ANALYTICS
+from src.analytics.materialized_views import SUMMARIES, read_summary, source_pipeline
+from src.analytics.time_rollups import query_rollup
 
 def get_db_connection():
-    """Get a connection to the MongoDB database."""
+    """Get the analytics database handle from the shared connection pool."""
     try:
-        client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
-        client.server_info()
-        db = client[config.MONGO_DB_NAME]
-        return db
-    except pymongo.errors.ServerSelectionTimeoutError as e:
-        print("Failed to connect to MongoDB server: {e}")
-        return None
+        return get_database(WORKLOAD_ANALYTICS)
     except Exception as e:
         print(f"Error connecting to MongoDB: {e}")
         return None
 
+def _aggregate_summary(db, summary_name, tail_stages):
+    """Run the stages after $group on the materialized summary, or the live pipeline if it is missing."""
+    result = read_summary(db, summary_name, tail_stages)
+    if result is None:
+        source = SUMMARIES[summary_name]["source"]
+        result = list(db[source].aggregate(source_pipeline(summary_name) + tail_stages))
+    return result
+
 # ---------- Analytics functions --------------------------
 def get_distibuzione_sesso(db):
     if db is None:
         return pd.DataFrame(), "Connection to the database failed."
     pipeline = [
-        {"$group": {"_id": "$SESSO", "count": {"$sum": 1}}},
         {"$project": {"Sesso": "$_id", "Numero Pazienti": "$count", "_id": 0}},
         {"$sort": {"Numero Pazienti": -1}}
     ]
     try:
-        result = list(db.ANAGRAFICA.aggregate(pipeline))
+        result = _aggregate_summary(db, "distribuzione_sesso", pipeline)
         return pd.DataFrame(result), None
     except Exception as e:
         return pd.DataFrame(), f"Error executing query sesso: {e}"
@@ -38,14 +39,12 @@ def get_distribuzione_comune_di_nascita(db):
     if db is None:
         return pd.DataFrame(), "Connection to the database failed."
     pipeline = [
-        {"$match": {"COMUNE_DI_NASCITA": {"$ne": None, "$exists": True}}},
-        {"$group": {"_id":"$COMUNE_DI_NASCITA", "count":{"$sum": 1}}},
         {"$project": {"Comune di nascita": "$_id", "Numero Pazienti": "$count", "_id": 0}},
         {"$sort": {"Numero Pazienti": -1}},
         {"$limit": 20}
     ]
     try:
-        result = list(db.ANAGRAFICA.aggregate(pipeline))
+        result = _aggregate_summary(db, "distribuzione_comune_di_nascita", pipeline)
         return pd.DataFrame(result), None
     except Exception as e:
         return pd.DataFrame(), f"Error executing query comune di nascita: {e}"
@@ -54,19 +53,12 @@ def get_principali_cause_decesso(db):
     if db is None:
         return pd.DataFrame(), "Connection to the database failed."
     pipeline = [
-        {"$match":
-            {
-            "DATA_DECESSO": {"$ne": None, "$exists": True},
-            "MOTIVO_DECESSO": {"$ne": None, "$exists": True}
-            }
-        },
-        {"$group": {"_id": "$MOTIVO_DECESSO", "count": {"$sum": 1}}},
         {"$project": {"Motivo del decesso": "$_id", "Numero Pazienti deceduti": "$count", "_id": 0}},
         {"$sort": {"Numero Pazienti deceduti": -1}},
         {"$limit": 20}
     ]
     try:
-        result = list(db.ANAGRAFICA.aggregate(pipeline))
+        result = _aggregate_summary(db, "principali_cause_decesso", pipeline)
         return pd.DataFrame(result), None
     except Exception as e:
         return pd.DataFrame(), f"Error executing query motivi di decesso: {e}"
@@ -75,175 +67,57 @@ def get_pazienti_per_evento(db):
     if db is None:
         return pd.DataFrame(), "Connection to the database failed."
     pipeline = [
-        {"$group": {"_id": "$TIPO_EVENTO", "count": {"$sum": 1}}},
         {"$project": {"Tipo evento": "$_id", "Numero Pazienti": "$count", "_id": 0}},
         {"$sort": {"Numero Pazienti": -1}}
     ]
     try:
-        result = list(db.LISTA_EVENTI.aggregate(pipeline))
+        result = _aggregate_summary(db, "pazienti_per_evento", pipeline)
         return pd.DataFrame(result), None
     except Exception as e:
         return pd.DataFrame(), f"Error executing query motivi di decesso: {e}"
 
 def get_heart_failure_by_year(db):
-
-    pipeline = [
-        {"$match": {
-            "HEART_FAILURE": "YES"
-        }},
-        {"$group": {
-            "_id" : {"$year": "$DATA"},
-            "count": {"$sum": 1}
-        }},
-        {"$project": {
-            "Anno": "$_id",
-            "Numero Casi": "$count",
-            "_id": 0
-        }},
-        {"$sort": {
-            "Anno": 1
-        }}
-    ]
-
+    if db is None:
+        return pd.DataFrame(), "Connection to the database failed."
     try:
-        result = list(db.ECOCARDIO_DATI.aggregate(pipeline))
-        return pd.DataFrame(result), None
+        # Yearly buckets of the heart_failure time series (src/analytics/time_rollups.py)
+        buckets = query_rollup(db, "heart_failure", "year")
+        return pd.DataFrame({
+            "Anno": buckets["bucket"].dt.year if not buckets.empty else [],
+            "Numero Casi": buckets["count"]
+        }), None
     except Exception as e:
-        return pd.DataFrame(), f"Error executing query motivi di decesso: {e}"
-
-
-# ------- Functions for medical records ---------------
-def get_lista_eventi(db, search_data: dict):
-    if db is None:
-        return pd.DataFrame(), "Connection to the database failed"
-    elif search_data is None:
-        return pd.DataFrame(), "Invalid data to find the patient"
-    else:
-
-        # Initialise specific match phase
-        match_stage = {}
-
-        if search_data["type"] == "fiscal_code":
-            match_stage = {"$match": {"CODICE_FISCALE": search_data["value"]}}
-        elif search_data["type"] == 'code_section':
-            id_paz = str(search_data['section']) + "_" + str(search_data['code'])
-            match_stage = {"$match": {"ID_PAZ": id_paz}}
-        else:
-            return pd.DataFrame(), "Tipo di ricerca non valido."
-
-        common_pipeline = [
-            {"$project": {"ID_PAZ": 1, "_id": 0}},
-            {"$lookup": {
-                "from": "LISTA_EVENTI",
-                "localField": "ID_PAZ",
-                "foreignField": "ID_PAZ",
-                "as": "associated_events"
-            }},
-            {"$unwind": "$associated_events"},
-            {"$replaceRoot": {"newRoot": "$associated_events"}},
-            {"$project": {
-                "Id Paziente": "$ID_PAZ",
-                "Codice paziente": "$CODPAZ",
-                "Tipo evento": "$TIPO_EVENTO",
-                "Data evento": "$DATA",
-                "_id": 0
-            }}
-        ]
-
-        pipeline = [match_stage] + common_pipeline
+        return pd.DataFrame(), f"Error executing query heart failure per anno: {e}"
 
-        try:
-            result = list(db.ANAGRAFICA.aggregate(pipeline))
-
-            if not result:
-                return pd.DataFrame(), f"Nessun evento trovato per i dati inseriti"
-            return pd.DataFrame(result), None
-        except Exception as e:
-            return pd.DataFrame(), f"Error during query event_list"
-
-def get_last_anamnesi_data(db, patient_id):
+def get_andamento_temporale(db, series, granularity, start=None, end=None):
+    """Counts of a time series per bucket, one column per key (event type) or a single column."""
     if db is None:
-        return pd.DataFrame(), "Connection to the database failed"
-    elif patient_id is None:
-        return pd.DataFrame(), "Invalid data to find the patient"
-    else:
-
-        pipeline = [
-            {"$match": {"ID_PAZ": patient_id}},
-            {"$project": {"ID_PAZ": 1, "_id": 0}},
-            {"$lookup": {
-               "from": "LISTA_EVENTI",
-               "localField": "ID_PAZ",
-               "foreignField": "ID_PAZ",
-               "as": "associated_events"
-            }},
-            {"$unwind": "$associated_events"},
-            {"$match": {"associated_events.TIPO_EVENTO": "ANAMNESI"}},
-            {"$sort": {"associated_events.DATA": -1}},
-            {"$limit": 1},
-            {"$replaceRoot": {"newRoot": "$associated_events"}},
-            {"$project": {
-                "Id Paziente": "$ID_PAZ",
-                "Tipo Evento": "$TIPO_EVENTO",
-                "Data evento": "$DATA",
-                "_id": 0
-            }}
-        ]
-
-        try:
-            result = list(db.ANAGRAFICA.aggregate(pipeline))
-
-            if not result:
-                return pd.DataFrame(), f"Nessun evento trovato per i dati inseriti"
-            return pd.DataFrame(result), None
-        except Exception as e:
-            return pd.DataFrame(), f"Error during query event_list"
-
-
+        return pd.DataFrame(), "Connection to the database failed."
+    try:
+        buckets = query_rollup(db, series, granularity, start, end)
+        if buckets.empty:
+            return pd.DataFrame(), None
+        buckets["key"] = buckets["key"].fillna("Totale")
+        trend = buckets.pivot_table(index="bucket", columns="key", values="count", aggfunc="sum", fill_value=0)
+        trend.index.name = "Periodo"
+        trend.columns.name = None
+        return trend, None
+    except Exception as e:
+        return pd.DataFrame(), f"Error executing query andamento temporale: {e}"
 
-def get_most_worth_from_anamnesi(db, patient_id, date):
+def get_lesioni_coronarografiche(db):
     if db is None:
-        return pd.DataFrame(), "Connection to the database failed"
-    elif patient_id is None or date is None:
-        return pd.DataFrame(), "Invalid data to find the patient"
-    else:
-
-        pipeline = [
-            {"$match": {"ID_PAZ": patient_id}},
-            {"$project": {"ID_PAZ": 1, "_id": 0}},
-            {"$lookup": {
-                "from": "ANAMNESI",
-                "localField": "ID_PAZ",
-                "foreignField": "ID_PAZ",
-                "as": "associated_anamnesi"
-            }},
-            {"$unwind": "$associated_anamnesi"},
-            {"$match": {"associated_anamnesi.DATA": date}},
-            {"$replaceRoot": {"newRoot": "$associated_anamnesi"}},
-            {"$project": {
-                "Id Paziente": "$ID_PAZ",
-                "Data ultima Anamnesi": "$DATA",
-                "Diabete": "$DIABETE",
-                "Dislipedemia Generica": "$DISLIPEDEMIA",
-                "Il paziente Fuma": "$FUMO",
-                "Infarto Miocardio Acuto Pregresso": "$PREVIOUS_IMA",
-                "Intervento Coronarico Percutaneo (PCI/PTCA) pregresso": "$PREVIOUS_PCI",
-                "Bypass Aorto-Coronarico (CABG) pregresso": "$PREVIOUS_CABG",
-                "Coronary Artery Disease (Malattia Coronarica)": "$CAD",
-                "Ictus pregresso": "$STROKE",
-                "Familiarità per patologie cerebrovascolari": "$CAD_FAMILIARITY_CEREBRAL",
-                "Familiarità per patologie cardiache": "$CAD_FAMILIARITY_CARDIAC",
-                "Familiarità generica per Coronary Artery Disease": "$CAD_FAMILIARITY",
-                "_id": 0
-            }}
-        ]
-
-        try:
-            result = list(db.ANAGRAFICA.aggregate(pipeline))
-
-            if not result:
-                return pd.DataFrame(), f"Nessun evento trovato per i dati inseriti"
-            return pd.DataFrame(result), None
-        except Exception as e:
-            return pd.DataFrame(), f"Error during query event_list"
-
+        return pd.DataFrame(), "Connection to the database failed."
+    lesion_columns = ["LESIONI_TC", "LESIONI_IVA", "LESIONI_CX", "LESIONI_DX"]
+    try:
+        # One $group counts the exams with a "YES (...)" value in each of the four lesion fields
+        result = _aggregate_summary(db, "lesioni_coronarografiche", [])
+        if not result:
+            return pd.DataFrame(), None
+        counts = result[0]
+        return pd.DataFrame({
+            "Tipo Lesione": lesion_columns,
+            "Numero Coronarografie": [counts.get(col, 0) for col in lesion_columns]
+        }), None
+    except Exception as e:
+        return pd.DataFrame(), f"Error executing query lesioni coronarografiche: {e}"
@@ -0,0 +1,113 @@
+import copy
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Callable
+import altair as alt
+import pandas as pd
+import squarify
+from src.export.result_export import result_hash
+
+# Drawing area of the treemap layout, in the units of its x/y scales
+TREEMAP_WIDTH, TREEMAP_HEIGHT = 1200, 700
+
+
+def line_chart(data_df: pd.DataFrame, x: str, y: str, title: str, color: str = "purple") -> alt.Chart:
+    """Line with a point per row; x is treated as ordinal so every value (e.g. every year) gets a tick."""
+    return alt.Chart(data_df[[x, y]], title=title).mark_line(point=True, color=color).encode(
+        x=alt.X(f"{x}:O", title=x, axis=alt.Axis(labelAngle=-45)),
+        y=alt.Y(f"{y}:Q", title=y),
+        tooltip=[x, y],
+    ).properties(height=400)
+
+
+def horizontal_bar_chart(data_df: pd.DataFrame, category: str, value: str, title: str, color: str = "skyblue") -> alt.Chart:
+    """Horizontal bars, first row on top (the order of the aggregation is kept)."""
+    return alt.Chart(data_df[[category, value]], title=title).mark_bar(color=color).encode(
+        x=alt.X(f"{value}:Q", title=value),
+        y=alt.Y(f"{category}:N", title=category, sort=None),
+        tooltip=[category, value],
+    ).properties(height=max(200, 28 * len(data_df)))
+
+
+def treemap_chart(data_df: pd.DataFrame, label: str, value: str, title: str) -> alt.Chart:
+    """Treemap with the squarify layout, drawn as Vega-Lite rectangles instead of a matplotlib figure."""
+    data_df = data_df[data_df[value] > 0]
+    if data_df.empty:
+        return alt.Chart(pd.DataFrame({label: [], value: []}), title=title).mark_rect()
+    sizes = squarify.normalize_sizes(data_df[value].tolist(), TREEMAP_WIDTH, TREEMAP_HEIGHT)
+    rects = squarify.padded_squarify(sizes, 0, 0, TREEMAP_WIDTH, TREEMAP_HEIGHT)
+    layout_df = pd.DataFrame({
+        label: data_df[label].astype(str).tolist(),
+        value: data_df[value].tolist(),
+        "x": [r["x"] for r in rects],
+        "x2": [r["x"] + r["dx"] for r in rects],
+        "y": [r["y"] for r in rects],
+        "y2": [r["y"] + r["dy"] for r in rects],
+    })
+    layout_df["text"] = layout_df[label] + "\n(" + layout_df[value].astype(str) + ")"
+    layout_df["cx"] = (layout_df["x"] + layout_df["x2"]) / 2
+    layout_df["cy"] = (layout_df["y"] + layout_df["y2"]) / 2
+
+    x_scale = alt.Scale(domain=[0, TREEMAP_WIDTH])
+    y_scale = alt.Scale(domain=[0, TREEMAP_HEIGHT])
+    base = alt.Chart(layout_df)
+    rectangles = base.mark_rect(opacity=0.8).encode(
+        x=alt.X("x:Q", scale=x_scale, axis=None), x2="x2:Q",
+        y=alt.Y("y:Q", scale=y_scale, axis=None), y2="y2:Q",
+        color=alt.Color(f"{label}:N", legend=None),
+        tooltip=[label, value],
+    )
+    labels = base.mark_text(color="white", fontSize=12, lineBreak="\n").encode(
+        x=alt.X("cx:Q", scale=x_scale, axis=None), y=alt.Y("cy:Q", scale=y_scale, axis=None), text="text:N",
+    )
+    return (rectangles + labels).properties(title=title, height=TREEMAP_HEIGHT * 0.6)
+
+
+CHART_BUILDERS: Dict[str, Callable[..., alt.Chart]] = {
+    "line": line_chart,
+    "barh": horizontal_bar_chart,
+    "treemap": treemap_chart,
+}
+
+
+class ChartCache:
+    """Vega-Lite specs of the analytics charts, shared across sessions and reruns.
+
+    Charts are built from the aggregated frames as Altair specs and drawn by
+    the browser, so a rerun never renders an image on the server. Building and
+    validating the spec is the remaining cost: specs are kept in an LRU keyed
+    by (chart kind, data hash, arguments) and a rerun on unchanged data only
+    hashes the frame.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._specs: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def spec(self, kind: str, data_df: pd.DataFrame, *args, **kwargs) -> Dict[str, Any]:
+        """Vega-Lite spec (dict) of CHART_BUILDERS[kind](data_df, *args, **kwargs).
+
+        A copy is returned: st.vega_lite_chart moves the datasets out of the spec it receives.
+        """
+        key = (kind, result_hash(data_df), args, tuple(sorted(kwargs.items())))
+        with self._lock:
+            spec = self._specs.get(key)
+            if spec is not None:
+                self._specs.move_to_end(key)
+                self.stats["hits"] += 1
+                return copy.deepcopy(spec)
+            self.stats["misses"] += 1
+
+        spec = CHART_BUILDERS[kind](data_df, *args, **kwargs).to_dict()
+        with self._lock:
+            self._specs[key] = spec
+            self._specs.move_to_end(key)
+            while len(self._specs) > self.max_entries:
+                self._specs.popitem(last=False)
+        return copy.deepcopy(spec)
+
+    def clear(self):
+        with self._lock:
+            self._specs.clear()
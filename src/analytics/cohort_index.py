@@ -0,0 +1,263 @@
+import re
+import threading
+import time
+from typing import Dict, Any, List
+import numpy as np
+
+_YES = {"$regex": "^YES"}
+
+# Boolean patient attributes: a patient has the attribute if at least one document of
+# "collection" with its ID_PAZ matches "match"
+COHORT_ATTRIBUTES = {
+    "DIABETE": {"collection": "ANAMNESI", "match": {"DIABETE": _YES}},
+    "FUMO": {"collection": "ANAMNESI", "match": {"FUMO": _YES}},
+    "FUMO_ATTUALE": {"collection": "ANAMNESI", "match": {"FUMO": "YES (current)"}},
+    "PREVIOUS_PCI": {"collection": "ANAMNESI", "match": {"$or": [{"PREVIOUS_PCI": _YES}, {"PREVIOUS_PCI": {"$gt": 0}}]}},
+    "PREVIOUS_CABG": {"collection": "ANAMNESI", "match": {"$or": [{"PREVIOUS_CABG": _YES}, {"PREVIOUS_CABG": {"$gt": 0}}]}},
+    "PREVIOUS_IMA": {"collection": "ANAMNESI", "match": {"PREVIOUS_IMA": _YES}},
+    "CAD": {"collection": "ANAMNESI", "match": {"CAD": _YES}},
+    "STROKE": {"collection": "ANAMNESI", "match": {"STROKE": _YES}},
+    "RICOVERO": {"collection": "RICOVERO_OSPEDALIERO", "match": {}},
+    "HEART_FAILURE": {"collection": "ECOCARDIO_DATI", "match": {"HEART_FAILURE": "YES"}},
+    "DECEDUTO": {"collection": "ANAGRAFICA", "match": {"DATA_DECESSO": {"$ne": None}}},
+}
+
+# One attribute per TIPO_EVENTO of LISTA_EVENTI, named "EVENTO:<tipo>"
+EVENT_ATTRIBUTE_PREFIX = "EVENTO:"
+
+_TOKEN_PATTERN = re.compile(r'\(|\)|"[^"]*"|[^\s()"]+')
+_OPERATORS = {"AND": "AND", "&": "AND", "E": "AND", "OR": "OR", "|": "OR", "O": "OR", "NOT": "NOT", "!": "NOT", "NON": "NOT"}
+
+
+class CohortExpressionError(ValueError):
+    pass
+
+
+class CohortIndex:
+    """In-memory bitmaps of patients per boolean clinical attribute.
+
+    Every ID_PAZ is mapped to a dense integer position and each attribute is a
+    Python int used as a bitset over those positions, so AND/OR/NOT cohorts are
+    single big-integer operations (a few microseconds for 100k patients).
+    The index is built from the source collections and refreshed incrementally
+    with the documents whose _id is greater than the last one read; it is
+    rebuilt periodically (refresh_if_stale's rebuild_after_seconds) to account
+    for updated or deleted documents.
+    """
+
+    def __init__(self, db, attributes: Dict[str, Dict[str, Any]] = None):
+        self.db = db
+        self.attributes_definition = dict(attributes if attributes is not None else COHORT_ATTRIBUTES)
+        self._positions: Dict[str, int] = {}
+        self._patient_ids: List[str] = []
+        self._bitmaps: Dict[str, int] = {}
+        self._watermarks: Dict[str, Any] = {}
+        self._refreshed_at = None
+        self._rebuilt_at = None
+        self._lock = threading.RLock()
+        # Held while a rebuild loads its bitmaps, so concurrent callers do not start another one
+        self._rebuild_lock = threading.Lock()
+
+    # ---- Dense id map ----
+    def _position(self, patient_id: str) -> int:
+        position = self._positions.get(patient_id)
+        if position is None:
+            position = len(self._patient_ids)
+            self._positions[patient_id] = position
+            self._patient_ids.append(patient_id)
+        return position
+
+    def _window(self, collection_name: str) -> Dict[str, Any]:
+        last_id = self._watermarks.get(collection_name)
+        return {"_id": {"$gt": last_id}} if last_id is not None else {}
+
+    def _latest_id(self, collection_name: str):
+        latest = self.db[collection_name].find_one({}, projection={"_id": 1}, sort=[("_id", -1)])
+        return latest["_id"] if latest else None
+
+    # ---- Loading ----
+    def _load_patients(self, high_mark):
+        query = self._window("ANAGRAFICA")
+        if high_mark is not None:
+            query.setdefault("_id", {})["$lte"] = high_mark
+        for document in self.db.ANAGRAFICA.find(query, projection={"ID_PAZ": 1, "_id": 0}, sort=[("_id", 1)]):
+            if document.get("ID_PAZ"):
+                self._position(document["ID_PAZ"])
+
+    def _load_attribute(self, name: str, definition: Dict[str, Any], high_mark):
+        window = self._window(definition["collection"])
+        if high_mark is not None:
+            window.setdefault("_id", {})["$lte"] = high_mark
+        pipeline = [
+            {"$match": {"$and": [window, definition["match"]]} if window else definition["match"]},
+            {"$group": {"_id": "$ID_PAZ"}}
+        ]
+        bitmap = self._bitmaps.get(name, 0)
+        for document in self.db[definition["collection"]].aggregate(pipeline, allowDiskUse=True):
+            if document["_id"]:
+                bitmap |= 1 << self._position(document["_id"])
+        self._bitmaps[name] = bitmap
+
+    def _load_events(self, high_mark):
+        window = self._window("LISTA_EVENTI")
+        if high_mark is not None:
+            window.setdefault("_id", {})["$lte"] = high_mark
+        pipeline = ([{"$match": window}] if window else []) + [
+            {"$group": {"_id": {"tipo": "$TIPO_EVENTO", "paziente": "$ID_PAZ"}}}
+        ]
+        updates: Dict[str, int] = {}
+        for document in self.db.LISTA_EVENTI.aggregate(pipeline, allowDiskUse=True):
+            event_type, patient_id = document["_id"].get("tipo"), document["_id"].get("paziente")
+            if event_type and patient_id:
+                name = EVENT_ATTRIBUTE_PREFIX + str(event_type)
+                updates[name] = updates.get(name, 0) | (1 << self._position(patient_id))
+        for name, bits in updates.items():
+            self._bitmaps[name] = self._bitmaps.get(name, 0) | bits
+
+    def refresh(self) -> Dict[str, int]:
+        """Apply the documents inserted since the last load (the first call builds the index).
+
+        Returns:
+            Number of patients having each attribute
+        """
+        with self._lock:
+            collections = {"ANAGRAFICA", "LISTA_EVENTI"} | {d["collection"] for d in self.attributes_definition.values()}
+            high_marks = {name: self._latest_id(name) for name in collections}
+
+            self._load_patients(high_marks["ANAGRAFICA"])
+            for name, definition in self.attributes_definition.items():
+                self._load_attribute(name, definition, high_marks[definition["collection"]])
+            self._load_events(high_marks["LISTA_EVENTI"])
+
+            first_load = not self._watermarks
+            for name, high_mark in high_marks.items():
+                if high_mark is not None:
+                    self._watermarks[name] = high_mark
+            self._refreshed_at = time.monotonic()
+            if first_load:
+                self._rebuilt_at = self._refreshed_at
+            return {name: bitmap.bit_count() for name, bitmap in self._bitmaps.items()}
+
+    def refresh_if_stale(self, max_age_seconds: float, rebuild_after_seconds: float = None):
+        """Rebuild the index when rebuild_after_seconds have passed since the last build, else refresh it when older than max_age_seconds."""
+        now = time.monotonic()
+        if rebuild_after_seconds is not None and self._rebuilt_at is not None and now - self._rebuilt_at > rebuild_after_seconds:
+            self.rebuild()
+        elif self._refreshed_at is None or now - self._refreshed_at > max_age_seconds:
+            self.refresh()
+
+    def rebuild(self) -> Dict[str, int]:
+        """Load the index from scratch and swap it in, picking up updated and deleted documents.
+
+        Cohorts keep being evaluated on the current bitmaps while the new ones
+        are loaded. A rebuild requested while another one runs is skipped.
+        """
+        if not self._rebuild_lock.acquire(blocking=False):
+            with self._lock:
+                return {name: bitmap.bit_count() for name, bitmap in self._bitmaps.items()}
+        try:
+            fresh = CohortIndex(self.db, self.attributes_definition)
+            counts = fresh.refresh()
+            with self._lock:
+                self._positions = fresh._positions
+                self._patient_ids = fresh._patient_ids
+                self._bitmaps = fresh._bitmaps
+                self._watermarks = fresh._watermarks
+                self._refreshed_at = self._rebuilt_at = fresh._refreshed_at
+            return counts
+        finally:
+            self._rebuild_lock.release()
+
+    # ---- Cohort expressions ----
+    def attributes(self) -> List[str]:
+        with self._lock:
+            return sorted(self._bitmaps)
+
+    def _universe(self) -> int:
+        return (1 << len(self._patient_ids)) - 1
+
+    def evaluate(self, expression: str) -> int:
+        """Evaluate a cohort expression to a bitmap.
+
+        Grammar: attribute names combined with AND/OR/NOT (also &, |, !, E, O, NON)
+        and parentheses; names with spaces go in double quotes, e.g.
+        'DIABETE AND FUMO AND PREVIOUS_PCI AND (RICOVERO OR "EVENTO:RICOVERO")'.
+
+        Raises:
+            CohortExpressionError: On syntax errors or unknown attributes
+        """
+        tokens = _TOKEN_PATTERN.findall(expression or "")
+        if not tokens:
+            raise CohortExpressionError("Espressione della coorte vuota")
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        def operator(token):
+            return _OPERATORS.get(token.upper()) if token and not token.startswith('"') else None
+
+        def parse_or():
+            nonlocal position
+            result = parse_and()
+            while operator(peek()) == "OR":
+                position += 1
+                result |= parse_and()
+            return result
+
+        def parse_and():
+            nonlocal position
+            result = parse_not()
+            while operator(peek()) == "AND":
+                position += 1
+                result &= parse_not()
+            return result
+
+        def parse_not():
+            nonlocal position
+            token = peek()
+            if operator(token) == "NOT":
+                position += 1
+                return self._universe() & ~parse_not()
+            if token == "(":
+                position += 1
+                result = parse_or()
+                if peek() != ")":
+                    raise CohortExpressionError("Parentesi non chiusa nell'espressione della coorte")
+                position += 1
+                return result
+            if token is None or token == ")" or operator(token):
+                raise CohortExpressionError(f"Attributo atteso alla posizione {position + 1}")
+            position += 1
+            name = token.strip('"')
+            bitmap = self._bitmaps.get(name)
+            if bitmap is None:
+                bitmap = self._bitmaps.get(name.upper())
+            if bitmap is None:
+                raise CohortExpressionError(f"Attributo sconosciuto: {name}")
+            return bitmap
+
+        with self._lock:
+            result = parse_or()
+        if position != len(tokens):
+            raise CohortExpressionError(f"Token inatteso: {tokens[position]}")
+        return result
+
+    def count(self, expression: str) -> int:
+        return self.evaluate(expression).bit_count()
+
+    def patient_ids(self, expression: str, limit: int = None) -> List[str]:
+        """ID_PAZ of the patients in the cohort, in dense id order."""
+        bitmap = self.evaluate(expression)
+        if not bitmap:
+            return []
+        # Unpack the bitset with numpy instead of one big-int operation per set bit
+        raw = np.frombuffer(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little"), dtype=np.uint8)
+        positions = np.flatnonzero(np.unpackbits(raw, bitorder="little"))
+        if limit is not None:
+            positions = positions[:limit]
+        with self._lock:
+            return [self._patient_ids[p] for p in positions]
+
+    def __len__(self):
+        return len(self._patient_ids)
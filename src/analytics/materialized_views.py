@@ -0,0 +1,252 @@
+import argparse
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
+from pymongo import ReadPreference
+from pymongo.errors import DuplicateKeyError
+
+WATERMARK_COLLECTION = "SUMMARY_WATERMARKS"
+# Watermark document held by the process applying refreshes (incremental $merge must not run twice)
+REFRESH_LEASE = "_refresh_lease"
+# Group of the documents whose key field is missing or null ($merge rejects a null _id)
+MISSING_KEY = "N/D"
+
+# Every summary stores the $group output {_id: <key>, count: <n>} of one dashboard analytic.
+# "accumulators" (optional) replaces the count with other $sum accumulators: they must stay
+# additive for the incremental refresh. "watermark_field" (optional) names a timestamp updated
+# on every change of a source document; without it the refresh follows the monotonically
+# growing ObjectId of new documents, which misses updates and deletes: refresh_summary then
+# rebuilds the summary from scratch every rebuild_after seconds.
+SUMMARIES = {
+    "distribuzione_sesso": {
+        "source": "ANAGRAFICA",
+        "match": {},
+        "group_key": {"$ifNull": ["$SESSO", MISSING_KEY]},
+    },
+    "distribuzione_comune_di_nascita": {
+        "source": "ANAGRAFICA",
+        "match": {"COMUNE_DI_NASCITA": {"$ne": None, "$exists": True}},
+        "group_key": "$COMUNE_DI_NASCITA",
+    },
+    "principali_cause_decesso": {
+        "source": "ANAGRAFICA",
+        "match": {
+            "DATA_DECESSO": {"$ne": None, "$exists": True},
+            "MOTIVO_DECESSO": {"$ne": None, "$exists": True}
+        },
+        "group_key": "$MOTIVO_DECESSO",
+    },
+    "pazienti_per_evento": {
+        "source": "LISTA_EVENTI",
+        "match": {},
+        "group_key": {"$ifNull": ["$TIPO_EVENTO", MISSING_KEY]},
+    },
+    "lesioni_coronarografiche": {
+        "source": "CORONAROGRAFIA_PTCA",
+        "match": {},
+        # Single group: a constant key, since $merge on _id rejects a null one
+        "group_key": {"$literal": "totale"},
+        # Counts exam documents, not distinct patients
+        "accumulators": {
+            field: {"$sum": {"$cond": [
+                {"$regexMatch": {"input": {"$ifNull": [f"${field}", ""]}, "regex": "^YES"}}, 1, 0
+            ]}}
+            for field in ("LESIONI_TC", "LESIONI_IVA", "LESIONI_CX", "LESIONI_DX")
+        },
+    },
+}
+
+
+def summary_collection(name: str) -> str:
+    """Name of the collection holding a materialized summary."""
+    return f"SUMMARY_{name.upper()}"
+
+
+def _accumulators(name: str) -> Dict[str, Any]:
+    return SUMMARIES[name].get("accumulators") or {"count": {"$sum": 1}}
+
+
+def source_pipeline(name: str) -> List[Dict[str, Any]]:
+    """The $match + $group stages computing a summary from its source collection."""
+    definition = SUMMARIES[name]
+    stages = [{"$match": definition["match"]}] if definition["match"] else []
+    stages.append({"$group": {"_id": definition["group_key"], **_accumulators(name)}})
+    return stages
+
+
+def definition_hash(name: str) -> str:
+    """Hash of the pipeline of a summary: a stored summary built by another definition is rebuilt."""
+    return hashlib.sha256(json.dumps(source_pipeline(name), sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def get_watermark(db, name: str):
+    """Return the watermark document of a summary, None if it was never materialized."""
+    return db[WATERMARK_COLLECTION].find_one({"_id": name})
+
+
+def set_watermark(db, name: str, value, **extra):
+    db[WATERMARK_COLLECTION].update_one(
+        {"_id": name},
+        {"$set": {"value": value, "refreshed_at": datetime.now(timezone.utc), **extra}},
+        upsert=True
+    )
+
+
+def acquire_refresh_lease(db, ttl_seconds: float = 600) -> str:
+    """Take the refresh lease shared by every process, returning its holder id, or None if another process holds it.
+
+    The lease expires after ttl_seconds, so a process that died while refreshing does not block the others.
+    """
+    db = db.client.get_database(db.name, read_preference=ReadPreference.PRIMARY)
+    holder = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    try:
+        db[WATERMARK_COLLECTION].update_one(
+            {"_id": REFRESH_LEASE, "expires_at": {"$lt": now}},
+            {"$set": {"holder": holder, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease document exists and has not expired
+        return None
+    return holder
+
+
+def release_refresh_lease(db, holder: str):
+    db = db.client.get_database(db.name, read_preference=ReadPreference.PRIMARY)
+    db[WATERMARK_COLLECTION].delete_one({"_id": REFRESH_LEASE, "holder": holder})
+
+
+def _latest_marker(collection, field: str):
+    latest = collection.find_one({field: {"$ne": None}}, projection={field: 1}, sort=[(field, -1)])
+    return latest[field] if latest else None
+
+
+def refresh_summary(db, name: str, full: bool = False, rebuild_after: float = None) -> Dict[str, Any]:
+    """Bring a summary collection up to date with its source collection.
+
+    Callers running concurrently with other processes should hold the refresh
+    lease (acquire_refresh_lease): two incremental refreshes of the same window
+    would count the new documents twice.
+
+    Args:
+        db: pymongo Database
+        name: Key of SUMMARIES
+        full: Rebuild from scratch instead of applying the new documents only
+        rebuild_after: Seconds after which a summary without watermark_field is rebuilt,
+            picking up the updated and deleted source documents
+
+    Returns:
+        Dictionary with the summary name and the refresh mode applied
+    """
+    # $out/$merge write to the primary: do not inherit the analytics read preference
+    db = db.client.get_database(db.name, read_preference=ReadPreference.PRIMARY)
+    definition = SUMMARIES[name]
+    source = db[definition["source"]]
+    target = summary_collection(name)
+    watermark_field = definition.get("watermark_field", "_id")
+
+    high_mark = _latest_marker(source, watermark_field)
+    watermark = None if full else get_watermark(db, name)
+    if watermark is not None and watermark.get("definition") != definition_hash(name):
+        watermark = None
+    if watermark is not None and rebuild_after is not None and watermark_field == "_id":
+        rebuilt_at = watermark.get("rebuilt_at")
+        if rebuilt_at is None or datetime.now(timezone.utc) - rebuilt_at.replace(tzinfo=timezone.utc) > timedelta(seconds=rebuild_after):
+            watermark = None
+
+    if watermark is None:
+        pipeline = source_pipeline(name)
+        if high_mark is not None:
+            pipeline.insert(0, {"$match": {watermark_field: {"$lte": high_mark}}})
+        pipeline.append({"$out": target})
+        source.aggregate(pipeline)
+        set_watermark(db, name, high_mark, mode="full", definition=definition_hash(name), rebuilt_at=datetime.now(timezone.utc))
+        return {"summary": name, "mode": "full"}
+
+    last_mark = watermark.get("value")
+    if high_mark is None or (last_mark is not None and high_mark <= last_mark):
+        set_watermark(db, name, last_mark, mode="unchanged")
+        return {"summary": name, "mode": "unchanged"}
+
+    window = {watermark_field: {"$lte": high_mark}}
+    if last_mark is not None:
+        window[watermark_field]["$gt"] = last_mark
+
+    if watermark_field == "_id":
+        # Only inserts move the ObjectId watermark: add the new counts to the stored ones
+        pipeline = [{"$match": window}] + source_pipeline(name) + [{
+            "$merge": {
+                "into": target,
+                "on": "_id",
+                "whenMatched": [{"$set": {
+                    field: {"$add": [f"${field}", f"$$new.{field}"]} for field in _accumulators(name)
+                }}],
+                "whenNotMatched": "insert"
+            }
+        }]
+        source.aggregate(pipeline)
+    else:
+        # Changed documents: recompute every group they touch. A change that moves a
+        # document to another group leaves the old group stale until the next full refresh.
+        touched_keys = [
+            doc["_id"] for doc in source.aggregate(
+                [{"$match": window}, {"$group": {"_id": definition["group_key"]}}]
+            )
+        ]
+        if touched_keys:
+            pipeline = [
+                {"$match": definition["match"]},
+                {"$addFields": {"_summary_key": definition["group_key"]}},
+                {"$match": {"_summary_key": {"$in": touched_keys}}},
+                {"$group": {"_id": "$_summary_key", **_accumulators(name)}},
+                {"$merge": {"into": target, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+            ]
+            source.aggregate(pipeline)
+
+    set_watermark(db, name, high_mark, mode="incremental")
+    return {"summary": name, "mode": "incremental"}
+
+
+def refresh_all(db, full: bool = False, rebuild_after: float = None) -> List[Dict[str, Any]]:
+    """Refresh every summary, returning one status entry per summary."""
+    results = []
+    for name in SUMMARIES:
+        try:
+            results.append(refresh_summary(db, name, full=full, rebuild_after=rebuild_after))
+        except Exception as e:
+            results.append({"summary": name, "mode": "error", "error": str(e)})
+    return results
+
+
+def read_summary(db, name: str, tail_stages: List[Dict[str, Any]]):
+    """Read a materialized summary through the stages that follow $group in the live pipeline.
+
+    Returns:
+        The aggregated documents, or None if the summary was never materialized
+    """
+    if get_watermark(db, name) is None:
+        return None
+    return list(db[summary_collection(name)].aggregate(tail_stages))
+
+
+if __name__ == "__main__":
+
+    from src.database.connection_manager import get_database, WORKLOAD_ANALYTICS
+
+    parser = argparse.ArgumentParser(description="Materialize the analytics summaries")
+    parser.add_argument("summaries", nargs="*", help="Summaries to refresh (default: all)")
+    parser.add_argument("--full", action="store_true", help="Rebuild instead of refreshing incrementally")
+    args = parser.parse_args()
+
+    analytics_db = get_database(WORKLOAD_ANALYTICS)
+    lease = acquire_refresh_lease(analytics_db)
+    if lease is None:
+        raise SystemExit("Another process is refreshing the summaries: try again later")
+    try:
+        for summary_name in args.summaries or SUMMARIES:
+            print(refresh_summary(analytics_db, summary_name, full=args.full))
+    finally:
+        release_refresh_lease(analytics_db, lease)
@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+from src.analytics.patient_record import PatientRecordAssembler, patient_match
+
+
+class PatientRecordCache:
+    """Bounded LRU + TTL cache of clinical records keyed by ID_PAZ.
+
+    Records are assembled with PatientRecordAssembler on a miss. After every
+    access the patients that follow in the same SEZIONE, and the recently viewed
+    patients whose entry expired, are prefetched in the background with one
+    assemble_many aggregation, so flipping between them hits the cache.
+    """
+
+    def __init__(self, assembler: PatientRecordAssembler, max_size: int = 200, ttl_seconds: float = 600,
+                 prefetch_count: int = 5, recent_count: int = 10):
+        self.assembler = assembler
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.prefetch_count = prefetch_count
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # CODICE_FISCALE -> ID_PAZ, learnt from the assembled records
+        self._aliases: Dict[str, str] = {}
+        self._recent = deque(maxlen=recent_count)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="patient-prefetch")
+        self.hits = 0
+        self.misses = 0
+
+    # ---- Cache primitives ----
+    def _lookup(self, patient_id: str, sections: List[str]):
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None:
+                return None
+            if time.monotonic() > entry["expires_at"] or not set(sections) <= entry["sections"]:
+                return None
+            self._entries.move_to_end(patient_id)
+            return entry["record"]
+
+    def _store(self, record: Dict[str, Any], sections: List[str]):
+        patient_id = record["ID_PAZ"]
+        with self._lock:
+            self._entries[patient_id] = {
+                "record": record,
+                "sections": set(sections),
+                "expires_at": time.monotonic() + self.ttl_seconds,
+            }
+            self._entries.move_to_end(patient_id)
+            if record.get("CODICE_FISCALE"):
+                self._aliases[record["CODICE_FISCALE"]] = patient_id
+            while len(self._entries) > self.max_size:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self._aliases.pop(evicted["record"].get("CODICE_FISCALE"), None)
+
+    def _patient_id(self, search_data: dict):
+        match = patient_match(search_data)
+        if match is None:
+            return None
+        if "ID_PAZ" in match:
+            return match["ID_PAZ"]
+        with self._lock:
+            return self._aliases.get(match.get("CODICE_FISCALE"))
+
+    # ---- Public API ----
+    def get(self, search_data: dict, sections: List[str]):
+        """Return a clinical record from the cache, assembling it on a miss.
+
+        Returns:
+            tuple:
+                - dict: Record as returned by PatientRecordAssembler.assemble, or None
+                - str: Error message, or None
+                - bool: True if the record was served from the cache
+        """
+        patient_id = self._patient_id(search_data)
+        record = self._lookup(patient_id, sections) if patient_id else None
+        cache_hit = record is not None
+        if cache_hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+            record, error = self.assembler.assemble(search_data, sections)
+            if error:
+                return None, error, False
+            self._store(record, sections)
+
+        with self._lock:
+            if record["ID_PAZ"] in self._recent:
+                self._recent.remove(record["ID_PAZ"])
+            self._recent.append(record["ID_PAZ"])
+        self._schedule_prefetch(record, sections)
+        return record, None, cache_hit
+
+    def invalidate(self, patient_id: str = None):
+        """Drop one patient, or the whole cache when no patient is given."""
+        with self._lock:
+            if patient_id is None:
+                self._entries.clear()
+                self._aliases.clear()
+            else:
+                entry = self._entries.pop(patient_id, None)
+                if entry:
+                    self._aliases.pop(entry["record"].get("CODICE_FISCALE"), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    # ---- Speculative prefetch ----
+    def _section_neighbours(self, record: Dict[str, Any]) -> List[str]:
+        """The next patients of the same SEZIONE, in ID_PAZ order (uses the ID_PAZ index)."""
+        if "_" not in (record.get("ID_PAZ") or "") or self.prefetch_count <= 0:
+            return []
+        # ID_PAZ is "<SEZIONE>_<CODPAZ>"
+        prefix = record["ID_PAZ"].split("_")[0] + "_"
+        cursor = self.assembler.db.ANAGRAFICA.find(
+            {"ID_PAZ": {"$gt": record["ID_PAZ"], "$regex": f"^{re.escape(prefix)}"}},
+            projection={"ID_PAZ": 1, "_id": 0},
+            sort=[("ID_PAZ", 1)],
+            limit=self.prefetch_count
+        )
+        return [doc["ID_PAZ"] for doc in cursor]
+
+    def _prefetch(self, record: Dict[str, Any], sections: List[str]):
+        try:
+            with self._lock:
+                candidates = [patient_id for patient_id in self._recent if patient_id != record["ID_PAZ"]]
+            candidates += self._section_neighbours(record)
+            missing = [patient_id for patient_id in dict.fromkeys(candidates)
+                       if self._lookup(patient_id, sections) is None]
+            if not missing:
+                return
+            records, error = self.assembler.assemble_many(missing, sections)
+            if not error:
+                for prefetched in records.values():
+                    self._store(prefetched, sections)
+        except Exception as e:
+            print(f"Patient prefetch failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(record["ID_PAZ"])
+
+    def _schedule_prefetch(self, record: Dict[str, Any], sections: List[str]):
+        with self._lock:
+            if record["ID_PAZ"] in self._pending:
+                return
+            self._pending.add(record["ID_PAZ"])
+        self._executor.submit(self._prefetch, record, list(sections))
@@ -0,0 +1,179 @@
+from typing import Dict, Any, List
+import pandas as pd
+
+# Sections of the clinical record, each one a correlated $lookup on ID_PAZ (served by the ID_PAZ
+# index of every clinical collection). "sort"/"limit" select the documents of the patient,
+# "project" renames the fields shown in the record (None keeps the whole document).
+RECORD_SECTIONS = {
+    "eventi": {
+        "title": "Lista eventi del paziente",
+        "from": "LISTA_EVENTI",
+        "sort": None,
+        "limit": None,
+        "project": {
+            "Id Paziente": "$ID_PAZ",
+            "Codice paziente": "$CODPAZ",
+            "Tipo evento": "$TIPO_EVENTO",
+            "Data evento": "$DATA",
+        },
+    },
+    "anamnesi": {
+        "title": "Ultima Anamnesi del Paziente",
+        "from": "ANAMNESI",
+        "sort": {"DATA": -1},
+        "limit": 1,
+        "project": {
+            "Id Paziente": "$ID_PAZ",
+            "Data ultima Anamnesi": "$DATA",
+            "Diabete": "$DIABETE",
+            "Dislipedemia Generica": "$DISLIPEDEMIA",
+            "Il paziente Fuma": "$FUMO",
+            "Infarto Miocardio Acuto Pregresso": "$PREVIOUS_IMA",
+            "Intervento Coronarico Percutaneo (PCI/PTCA) pregresso": "$PREVIOUS_PCI",
+            "Bypass Aorto-Coronarico (CABG) pregresso": "$PREVIOUS_CABG",
+            "Coronary Artery Disease (Malattia Coronarica)": "$CAD",
+            "Ictus pregresso": "$STROKE",
+            "Familiarità per patologie cerebrovascolari": "$CAD_FAMILIARITY_CEREBRAL",
+            "Familiarità per patologie cardiache": "$CAD_FAMILIARITY_CARDIAC",
+            "Familiarità generica per Coronary Artery Disease": "$CAD_FAMILIARITY",
+        },
+    },
+    "ecocardio": {
+        "title": "Ultimo Ecocardiogramma",
+        "from": "ECOCARDIO_DATI",
+        "sort": {"DATA": -1},
+        "limit": 1,
+        "project": None,
+    },
+    "coronarografia": {
+        "title": "Coronarografie / PTCA",
+        "from": "CORONAROGRAFIA_PTCA",
+        "sort": {"DATA": -1},
+        "limit": None,
+        "project": {
+            "Data": "$DATA",
+            "Lesioni Tronco Comune": "$LESIONI_TC",
+            "Lesioni IVA": "$LESIONI_IVA",
+            "Lesioni Circonflessa": "$LESIONI_CX",
+            "Lesioni Coronaria Destra": "$LESIONI_DX",
+        },
+    },
+    "esami_laboratorio": {
+        "title": "Ultimi Esami di Laboratorio",
+        "from": "ESAMI_LABORATORIO",
+        "sort": {"DATA": -1},
+        "limit": 1,
+        "project": None,
+    },
+}
+
+DEFAULT_SECTIONS = ["eventi", "anamnesi"]
+
+
+def patient_match(search_data: dict):
+    """Build the ANAGRAFICA filter for a search of the clinical record view, None if invalid."""
+    if not search_data:
+        return None
+    if search_data.get("type") == "fiscal_code":
+        return {"CODICE_FISCALE": search_data["value"]}
+    if search_data.get("type") == "code_section":
+        return {"ID_PAZ": str(search_data["section"]) + "_" + str(search_data["code"])}
+    if search_data.get("type") == "patient_id":
+        return {"ID_PAZ": search_data["value"]}
+    return None
+
+
+def _section_lookup(name: str) -> Dict[str, Any]:
+    section = RECORD_SECTIONS[name]
+    sub_pipeline = []
+    if section["sort"]:
+        sub_pipeline.append({"$sort": section["sort"]})
+    if section["limit"]:
+        sub_pipeline.append({"$limit": section["limit"]})
+    if section["project"]:
+        sub_pipeline.append({"$project": dict(section["project"], _id=0)})
+    else:
+        sub_pipeline.append({"$project": {"_id": 0}})
+    return {"$lookup": {
+        "from": section["from"],
+        "localField": "ID_PAZ",
+        "foreignField": "ID_PAZ",
+        "pipeline": sub_pipeline,
+        "as": name
+    }}
+
+
+class PatientRecordAssembler:
+    """Fetch the sections of a clinical record in a single aggregation on ANAGRAFICA.
+
+    Every section is a correlated $lookup with its own $sort/$limit, so the latest
+    anamnesis is read directly from ANAMNESI instead of unwinding and sorting the
+    whole event list. Requires MongoDB 5.0+ (localField/foreignField with pipeline).
+    """
+
+    def __init__(self, db, sections: List[str] = None):
+        self.db = db
+        self.sections = list(sections or DEFAULT_SECTIONS)
+
+    def _pipeline(self, match: Dict[str, Any], sections: List[str], limit: int = None) -> List[Dict[str, Any]]:
+        stages = [{"$match": match}]
+        if limit:
+            stages.append({"$limit": limit})
+        stages.append({"$project": {"ID_PAZ": 1, "SEZIONE": 1, "CODICE_FISCALE": 1, "_id": 0}})
+        return stages + [_section_lookup(name) for name in sections]
+
+    @staticmethod
+    def _to_frames(document: Dict[str, Any], sections: List[str]) -> Dict[str, pd.DataFrame]:
+        record = {key: document.get(key) for key in ("ID_PAZ", "SEZIONE", "CODICE_FISCALE")}
+        for name in sections:
+            record[name] = pd.DataFrame(document.get(name, []))
+        return record
+
+    def assemble(self, search_data: dict, sections: List[str] = None):
+        """Assemble the clinical record of one patient.
+
+        Args:
+            search_data: Search of the clinical record view (fiscal code, code + section or patient id)
+            sections: Keys of RECORD_SECTIONS to include (default: the assembler's sections)
+
+        Returns:
+            tuple:
+                - dict: "ID_PAZ", "SEZIONE", "CODICE_FISCALE" plus one DataFrame per section, or None
+                - str: Error message, or None
+        """
+        if self.db is None:
+            return None, "Connection to the database failed"
+        match = patient_match(search_data)
+        if match is None:
+            return None, "Tipo di ricerca non valido."
+        sections = list(sections or self.sections)
+
+        try:
+            pipeline = self._pipeline(match, sections, limit=1)
+            result = list(self.db.ANAGRAFICA.aggregate(pipeline))
+        except Exception as e:
+            return None, f"Error during query patient_record: {e}"
+        if not result:
+            return None, "Nessun paziente trovato per i dati inseriti"
+        return self._to_frames(result[0], sections), None
+
+    def assemble_many(self, patient_ids: List[str], sections: List[str] = None):
+        """Assemble the clinical records of several patients with one aggregation.
+
+        Returns:
+            tuple:
+                - dict: ID_PAZ -> record as returned by assemble
+                - str: Error message, or None
+        """
+        if self.db is None:
+            return {}, "Connection to the database failed"
+        if not patient_ids:
+            return {}, None
+        sections = list(sections or self.sections)
+
+        try:
+            pipeline = self._pipeline({"ID_PAZ": {"$in": list(patient_ids)}}, sections)
+            result = list(self.db.ANAGRAFICA.aggregate(pipeline))
+        except Exception as e:
+            return {}, f"Error during query patient_record: {e}"
+        return {document.get("ID_PAZ"): self._to_frames(document, sections) for document in result}, None
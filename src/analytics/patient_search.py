@@ -0,0 +1,192 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Any, List
+
+SEARCH_FIELDS = ["ID_PAZ", "CODICE_FISCALE", "COGNOME", "NOMEPAZ"]
+
+
+def normalize(text) -> str:
+    """Uppercase, strip accents and collapse whitespace."""
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", text).strip().upper()
+
+
+def _deletions(token: str) -> set:
+    """The token and every string obtained by deleting one of its characters."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """True if a and b differ by at most one insertion, deletion, substitution or adjacent swap."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (len(diff) == 2 and diff[1] == diff[0] + 1
+                                  and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class PatientSearchIndex:
+    """In-memory typeahead index over fiscal codes, patient ids and names.
+
+    Prefix search runs on a sorted list of (key, ID_PAZ) pairs with bisect. Fuzzy
+    search (one typo per word) uses a symmetric deletion index over the distinct
+    surname and name words only: fiscal codes and ids are matched by prefix.
+    The index is loaded with one projection-only scan of ANAGRAFICA and then
+    refreshed with the documents whose _id is greater than the last one seen.
+    """
+
+    def __init__(self, db, min_fuzzy_length: int = 3):
+        self.db = db
+        self.min_fuzzy_length = min_fuzzy_length
+        self._patients: Dict[str, Dict[str, Any]] = {}
+        self._keys: List[tuple] = []
+        self._word_ids: Dict[str, set] = defaultdict(set)
+        self._word_deletions: Dict[str, set] = defaultdict(set)
+        self._last_id = None
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    # ---- Index maintenance ----
+    def _add(self, document: Dict[str, Any], keep_sorted: bool):
+        patient_id = document.get("ID_PAZ")
+        if not patient_id or patient_id in self._patients:
+            return
+        patient = {field: document.get(field) for field in SEARCH_FIELDS}
+        self._patients[patient_id] = patient
+
+        surname, name = normalize(patient["COGNOME"]), normalize(patient["NOMEPAZ"])
+        keys = {normalize(patient_id), normalize(patient["CODICE_FISCALE"])}
+        if surname:
+            keys.add(f"{surname} {name}".strip())
+        if name:
+            keys.add(f"{name} {surname}".strip())
+        for key in keys:
+            if key and keep_sorted:
+                bisect.insort(self._keys, (key, patient_id))
+            elif key:
+                self._keys.append((key, patient_id))
+
+        for word in f"{surname} {name}".split():
+            if word not in self._word_ids:
+                for variant in _deletions(word):
+                    self._word_deletions[variant].add(word)
+            self._word_ids[word].add(patient_id)
+
+    def _scan(self, query: Dict[str, Any], keep_sorted: bool) -> int:
+        cursor = self.db.ANAGRAFICA.find(
+            query,
+            projection={field: 1 for field in SEARCH_FIELDS},
+            sort=[("_id", 1)]
+        )
+        count = 0
+        for document in cursor:
+            self._add(document, keep_sorted)
+            self._last_id = document["_id"]
+            count += 1
+        return count
+
+    def load(self) -> int:
+        """(Re)build the whole index, returning the number of patients read."""
+        with self._lock:
+            self._patients.clear()
+            self._keys = []
+            self._word_ids.clear()
+            self._word_deletions.clear()
+            self._last_id = None
+            # Sorting once after the full scan is much cheaper than one insort per key
+            count = self._scan({}, keep_sorted=False)
+            self._keys.sort()
+            self._loaded_at = time.monotonic()
+            return count
+
+    def refresh(self) -> int:
+        """Add the patients inserted since the last scan."""
+        with self._lock:
+            if self._last_id is None:
+                return self.load()
+            count = self._scan({"_id": {"$gt": self._last_id}}, keep_sorted=True)
+            self._loaded_at = time.monotonic()
+            return count
+
+    def refresh_if_stale(self, max_age_seconds: float) -> int:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > max_age_seconds:
+            return self.refresh()
+        return 0
+
+    # ---- Lookups ----
+    def _prefix_ids(self, prefix: str, limit: int) -> List[str]:
+        found = []
+        position = bisect.bisect_left(self._keys, (prefix,))
+        while position < len(self._keys) and len(found) < limit:
+            key, patient_id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            if patient_id not in found:
+                found.append(patient_id)
+            position += 1
+        return found
+
+    def _fuzzy_word_ids(self, word: str, is_last: bool) -> set:
+        words = set()
+        for variant in _deletions(word):
+            words |= {candidate for candidate in self._word_deletions.get(variant, ())
+                      if _within_one_edit(word, candidate)}
+        ids = set()
+        for candidate in words:
+            ids |= self._word_ids[candidate]
+        if is_last:
+            # The last word may still be being typed: every key starting with it, however
+            # common the prefix; search caps the results after intersecting the words
+            start = bisect.bisect_left(self._keys, (word,))
+            end = bisect.bisect_left(self._keys, (word + "\uffff",), lo=start)
+            ids.update(patient_id for _, patient_id in self._keys[start:end])
+        return ids
+
+    def search(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Patients whose id, fiscal code or name starts with the text, then fuzzy matches.
+
+        Args:
+            text: What the user typed ("RSSMR", "2_15", "ROSSI MAR", "ROSI MARIO"...)
+            limit: Maximum number of patients returned
+
+        Returns:
+            Patient dictionaries with SEARCH_FIELDS, best matches first
+        """
+        query = normalize(text)
+        if not query:
+            return []
+        with self._lock:
+            found = self._prefix_ids(query, limit)
+            words = query.split()
+            if len(found) < limit and all(len(word) >= self.min_fuzzy_length for word in words):
+                fuzzy_ids = None
+                for position, word in enumerate(words):
+                    word_ids = self._fuzzy_word_ids(word, position == len(words) - 1)
+                    fuzzy_ids = word_ids if fuzzy_ids is None else fuzzy_ids & word_ids
+                    if not fuzzy_ids:
+                        break
+                for patient_id in sorted(fuzzy_ids or ()):
+                    if len(found) >= limit:
+                        break
+                    if patient_id not in found:
+                        found.append(patient_id)
+            return [self._patients[patient_id] for patient_id in found]
+
+    def __len__(self):
+        return len(self._patients)
@@ -0,0 +1,212 @@
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
+import pandas as pd
+from pymongo import ReadPreference
+from src.analytics.materialized_views import get_watermark, set_watermark, acquire_refresh_lease, release_refresh_lease
+
+ROLLUP_COLLECTION = "ROLLUP_TIMESERIES"
+GRANULARITIES = ("day", "month", "year")
+
+# Time series, each kept in its own rollup_collection: documents of "source" matching "match",
+# counted per time bucket of "date_field" and per value of "key" (None for a single series).
+SERIES = {
+    "eventi": {
+        "source": "LISTA_EVENTI",
+        "match": {},
+        "date_field": "DATA",
+        "key": "$TIPO_EVENTO",
+    },
+    "heart_failure": {
+        "source": "ECOCARDIO_DATI",
+        "match": {"HEART_FAILURE": "YES"},
+        "date_field": "DATA",
+        "key": None,
+    },
+}
+
+
+def _watermark_name(series: str) -> str:
+    return f"rollup_{series}"
+
+
+def rollup_collection(series: str) -> str:
+    """Name of the collection holding the buckets of a series."""
+    return f"{ROLLUP_COLLECTION}_{series.upper()}"
+
+
+def _bucket_pipeline(series: str, granularities=GRANULARITIES) -> List[Dict[str, Any]]:
+    """Stages counting the documents of a series per (granularity, bucket, key).
+
+    Documents are grouped by day first, then every daily bucket is rolled up
+    into the coarser granularities: the source is read once for all of them.
+    """
+    definition = SERIES[series]
+    date_path = "$" + definition["date_field"]
+    match = dict(definition["match"])
+    match[definition["date_field"]] = {"$type": "date"}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {"day": {"$dateTrunc": {"date": date_path, "unit": "day"}}, "key": definition["key"]},
+            "count": {"$sum": 1}
+        }},
+        {"$project": {
+            "_id": 0,
+            "key": "$_id.key",
+            "count": 1,
+            "buckets": [
+                {"granularity": granularity, "bucket": {"$dateTrunc": {"date": "$_id.day", "unit": granularity}}}
+                for granularity in granularities
+            ]
+        }},
+        {"$unwind": "$buckets"},
+        {"$group": {
+            "_id": {
+                "series": series,
+                "granularity": "$buckets.granularity",
+                "bucket": "$buckets.bucket",
+                "key": "$key"
+            },
+            "count": {"$sum": "$count"}
+        }},
+        {"$addFields": {
+            "series": "$_id.series",
+            "granularity": "$_id.granularity",
+            "bucket": "$_id.bucket",
+            "key": "$_id.key"
+        }},
+    ]
+
+
+def refresh_series(db, series: str, full: bool = False, rebuild_after: float = None) -> Dict[str, Any]:
+    """Add the documents inserted after the _id watermark to the buckets of a series.
+
+    Args:
+        db: pymongo Database
+        series: Key of SERIES
+        full: Recompute the buckets from every document and swap them in for the stored ones
+        rebuild_after: Seconds after which the buckets are recomputed from scratch,
+            picking up the updated and deleted source documents
+
+    Returns:
+        Dictionary with the series name and the refresh mode applied
+    """
+    db = db.client.get_database(db.name, read_preference=ReadPreference.PRIMARY)
+    source = db[SERIES[series]["source"]]
+    target = rollup_collection(series)
+    name = _watermark_name(series)
+
+    latest = source.find_one({}, projection={"_id": 1}, sort=[("_id", -1)])
+    high_mark = latest["_id"] if latest else None
+    watermark = None if full else get_watermark(db, name)
+    if watermark is not None and watermark.get("collection") != target:
+        # Buckets written by a previous layout (shared ROLLUP_COLLECTION): rebuild
+        watermark = None
+    if watermark is not None and rebuild_after is not None:
+        rebuilt_at = watermark.get("rebuilt_at")
+        if rebuilt_at is None or datetime.now(timezone.utc) - rebuilt_at.replace(tzinfo=timezone.utc) > timedelta(seconds=rebuild_after):
+            watermark = None
+
+    if watermark is None:
+        # $out writes a temporary collection and renames it over the target only when the
+        # aggregation succeeds: readers see the old buckets until then, never a partial series
+        pipeline = _bucket_pipeline(series) + [{"$out": target}]
+        if high_mark is not None:
+            pipeline.insert(0, {"$match": {"_id": {"$lte": high_mark}}})
+        source.aggregate(pipeline)
+        # Serves the range reads of query_rollup ($out keeps the indexes of the replaced collection)
+        db[target].create_index([("granularity", 1), ("bucket", 1)])
+        set_watermark(db, name, high_mark, mode="full", collection=target, rebuilt_at=datetime.now(timezone.utc))
+        return {"series": series, "mode": "full"}
+
+    last_mark = watermark.get("value")
+    if high_mark is None or (last_mark is not None and high_mark <= last_mark):
+        # No new documents, but the buckets are in sync as of now
+        set_watermark(db, name, last_mark, mode="unchanged")
+        return {"series": series, "mode": "unchanged"}
+    window = {"_id": {"$lte": high_mark}}
+    if last_mark is not None:
+        window["_id"]["$gt"] = last_mark
+
+    pipeline = [{"$match": window}] + _bucket_pipeline(series) + [{
+        "$merge": {
+            "into": target,
+            "on": "_id",
+            "whenMatched": [{"$set": {"count": {"$add": ["$count", "$$new.count"]}}}],
+            "whenNotMatched": "insert"
+        }
+    }]
+    source.aggregate(pipeline)
+    set_watermark(db, name, high_mark, mode="incremental")
+    return {"series": series, "mode": "incremental"}
+
+
+def refresh_all_series(db, full: bool = False, rebuild_after: float = None) -> List[Dict[str, Any]]:
+    results = []
+    for series in SERIES:
+        try:
+            results.append(refresh_series(db, series, full=full, rebuild_after=rebuild_after))
+        except Exception as e:
+            results.append({"series": series, "mode": "error", "error": str(e)})
+    return results
+
+
+def query_rollup(db, series: str, granularity: str, start: datetime = None, end: datetime = None, keys: List[str] = None) -> pd.DataFrame:
+    """Read the buckets of a series at a granularity, optionally within [start, end) and for some keys.
+
+    Falls back to computing the buckets from the source collection while the
+    series has never been materialized.
+
+    Returns:
+        DataFrame with the columns bucket, key and count, sorted by bucket
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    bucket_range = {}
+    if start is not None:
+        bucket_range["$gte"] = start
+    if end is not None:
+        bucket_range["$lt"] = end
+
+    watermark = get_watermark(db, _watermark_name(series))
+    if watermark is not None and watermark.get("collection") == rollup_collection(series):
+        query = {"granularity": granularity}
+        if bucket_range:
+            query["bucket"] = bucket_range
+        if keys:
+            query["key"] = {"$in": list(keys)}
+        documents = list(db[rollup_collection(series)].find(
+            query, projection={"_id": 0, "bucket": 1, "key": 1, "count": 1}, sort=[("bucket", 1)]
+        ))
+    else:
+        pipeline = _bucket_pipeline(series, granularities=(granularity,))
+        if bucket_range:
+            # Same semantics as the materialized read: the range applies to the bucket start
+            pipeline.append({"$match": {"bucket": bucket_range}})
+        if keys:
+            pipeline.append({"$match": {"key": {"$in": list(keys)}}})
+        pipeline += [{"$project": {"_id": 0, "bucket": 1, "key": 1, "count": 1}}, {"$sort": {"bucket": 1}}]
+        documents = list(db[SERIES[series]["source"]].aggregate(pipeline))
+
+    return pd.DataFrame(documents, columns=["bucket", "key", "count"])
+
+
+if __name__ == "__main__":
+
+    from src.database.connection_manager import get_database, WORKLOAD_ANALYTICS
+
+    parser = argparse.ArgumentParser(description="Maintain the time-bucketed rollups")
+    parser.add_argument("series", nargs="*", help="Series to refresh (default: all)")
+    parser.add_argument("--full", action="store_true", help="Recompute instead of refreshing incrementally")
+    args = parser.parse_args()
+
+    analytics_db = get_database(WORKLOAD_ANALYTICS)
+    lease = acquire_refresh_lease(analytics_db)
+    if lease is None:
+        raise SystemExit("Another process is refreshing the rollups: try again later")
+    try:
+        for series_name in args.series or SERIES:
+            print(refresh_series(analytics_db, series_name, full=args.full))
+    finally:
+        release_refresh_lease(analytics_db, lease)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import math
+from datetime import datetime
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Iterable
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from src.query_engine.query_executor import MongoDBQueryExecutor
+from src.query_engine.query_validator import QueryValidator
+from src.query_engine.pipeline_optimizer import optimize_query
+from src.analytics.analytics_cache import AnalyticsCache, DEFAULT_ANALYTICS
+from src.analytics.analytics_dashboard import get_andamento_temporale
+from src.analytics.time_rollups import SERIES, GRANULARITIES
+
+logger = logging.getLogger("QueryDelCuoreApi")
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The API only reads: other operations and the stages writing to a collection are refused
+READ_OPERATIONS = ("find", "aggregate")
+WRITE_STAGES = ("$out", "$merge")
+
+
+# ---- Request bodies ----
+class GenerateRequest(BaseModel):
+    instruction: str = Field(..., min_length=1, description="Request in natural language")
+
+
+class ExecuteRequest(BaseModel):
+    query: Dict[str, Any] = Field(..., description="Query in the generator's format (collection_name, operation_type, arguments)")
+    instruction: Optional[str] = Field(None, description="Request the query answers, used for projection injection")
+    optimize: bool = Field(True, description="Rewrite aggregation pipelines before execution")
+
+
+class AskRequest(BaseModel):
+    instruction: str = Field(..., min_length=1, description="Request in natural language")
+    optimize: bool = Field(True, description="Rewrite aggregation pipelines before execution")
+
+
+# ---- Serialization ----
+def _json_default(value: Any):
+    # Dates as ISO 8601 (NaT as null), ObjectId and Decimal128 as strings
+    if hasattr(value, "isoformat"):
+        return None if value != value else value.isoformat()
+    return str(value)
+
+
+def _finite(value: Any):
+    # NaN and infinities (missing values of pandas frames) are not valid JSON: write them as null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(_finite(value), ensure_ascii=False, default=_json_default, allow_nan=False)
+
+
+def _ndjson(lines: Iterable[Any]):
+    for line in lines:
+        yield _dumps(line) + "\n"
+
+
+def _json_response(payload: Dict[str, Any]) -> StreamingResponse:
+    # Serialized in the threadpool while streaming instead of building one response body on the event loop
+    def body():
+        yield _dumps(payload)
+    return StreamingResponse(body(), media_type="application/json")
+
+
+def _result_response(result: Dict[str, Any], fmt: str, header: Dict[str, Any] = None) -> StreamingResponse:
+    """Stream an execution result: one JSON document, or NDJSON with a metadata line followed by one line per row."""
+    metadata = {
+        **(header or {}),
+        "success": result["success"],
+        "error": result["error"],
+        "query_type": result["query_type"],
+        "query_executed": json.loads(result["query_executed"]) if result.get("query_executed") else None,
+        "injected_projection": result["injected_projection"],
+        "rows": len(result["data"] or []),
+    }
+    if fmt == "ndjson":
+        return StreamingResponse(_ndjson([metadata, *(result["data"] or [])]), media_type=NDJSON_MEDIA_TYPE)
+    return _json_response({**metadata, "data": result["data"] or []})
+
+
+# ---- Validation ----
+def _write_stages(value: Any) -> List[str]:
+    # Anywhere in the arguments: $facet and $lookup nest pipelines
+    if isinstance(value, dict):
+        return [key for key in value if key in WRITE_STAGES] + [stage for item in value.values() for stage in _write_stages(item)]
+    if isinstance(value, list):
+        return [stage for item in value for stage in _write_stages(item)]
+    return []
+
+
+def query_errors(validator: QueryValidator, query_dict: Any) -> List[str]:
+    """Reasons to refuse a query before it reaches the database, empty if it is a valid read."""
+    if not isinstance(query_dict, dict):
+        return ["The query must be a JSON object"]
+    if query_dict.get("operation_type") not in READ_OPERATIONS:
+        return [f"Unsupported operation_type '{query_dict.get('operation_type')}' (must be 'find' or 'aggregate')"]
+    write_stages = sorted(set(_write_stages(query_dict.get("arguments"))))
+    if write_stages:
+        return [f"Stages writing to the database are not allowed: {', '.join(write_stages)}"]
+    return validator.validate(query_dict)
+
+
+# ---- Application ----
+def _default_state() -> Dict[str, Any]:
+    """Models and connection pools of the Streamlit app, built from config (loads the embedding model)."""
+    import config
+    from src.query_engine.query_generator import MongoDBQueryGenerator
+    from src.database.connection_manager import get_database, WORKLOAD_INTERACTIVE, WORKLOAD_ANALYTICS
+
+    return {
+        "query_generator": MongoDBQueryGenerator(config.embedding_model, config.gemini_model, config.chroma_client, config.DB_SCHEMA, config.MAX_RETRIES),
+        "db": get_database(WORKLOAD_INTERACTIVE),
+        "analytics_db": get_database(WORKLOAD_ANALYTICS),
+        "db_schema": config.DB_SCHEMA,
+        "optimize": config.ENABLE_PIPELINE_OPTIMIZER,
+        "analytics_refresh_seconds": config.ANALYTICS_CACHE_REFRESH_SECONDS,
+    }
+
+
+def create_app(query_generator=None, db=None, analytics_db=None, db_schema: Dict[str, Any] = None,
+               optimize: bool = True, analytics_refresh_seconds: float = 300) -> FastAPI:
+    """Build the HTTP API.
+
+    Without arguments the generator, the database handles and the schema are
+    created from config when the application starts, once per worker process:
+        uvicorn src.api.server:create_app --factory --workers 4
+    Tests pass a fake generator (any object with generate_query(instruction)
+    returning (query_json, error, context)) and a database of a local MongoDB.
+    Queries are validated against db_schema before execution: without a schema
+    every query is refused.
+    """
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if query_generator is None and db is None:
+            state = await asyncio.to_thread(_default_state)
+        else:
+            state = {
+                "query_generator": query_generator,
+                "db": db,
+                "analytics_db": analytics_db if analytics_db is not None else db,
+                "db_schema": db_schema,
+                "optimize": optimize,
+                "analytics_refresh_seconds": analytics_refresh_seconds,
+            }
+        app.state.query_generator = state["query_generator"]
+        app.state.executor = MongoDBQueryExecutor(state["db"], state["db_schema"]) if state["db"] is not None else None
+        app.state.validator = QueryValidator(state["db_schema"] or {})
+        app.state.optimize = state["optimize"]
+        app.state.analytics_db = state["analytics_db"]
+        app.state.analytics_cache = None
+        if state["analytics_db"] is not None:
+            app.state.analytics_cache = AnalyticsCache(state["analytics_db"], refresh_interval=state["analytics_refresh_seconds"])
+            app.state.analytics_cache.start()
+        yield
+        if app.state.analytics_cache is not None:
+            app.state.analytics_cache.stop()
+
+    app = FastAPI(title="LLM2Query API", lifespan=lifespan)
+
+    def generator(request: Request):
+        if request.app.state.query_generator is None:
+            raise HTTPException(status_code=503, detail="Query generator not configured")
+        return request.app.state.query_generator
+
+    def executor(request: Request) -> MongoDBQueryExecutor:
+        if request.app.state.executor is None:
+            raise HTTPException(status_code=503, detail="Database connection not available")
+        return request.app.state.executor
+
+    async def generate(request: Request, instruction: str) -> Dict[str, Any]:
+        generated_query, error_message, _ = await asyncio.to_thread(generator(request).generate_query, instruction)
+        if error_message or not generated_query:
+            raise HTTPException(status_code=502, detail=error_message or "No query generated")
+        try:
+            query_dict = json.loads(generated_query)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=502, detail=f"Generated query is not valid JSON: {e}")
+        if query_dict.get("error_type") == "irrelevant_request":
+            raise HTTPException(status_code=422, detail=query_dict.get("message", "Richiesta non pertinente."))
+        return query_dict
+
+    async def execute(request: Request, query_dict: Dict[str, Any], instruction: Optional[str], optimize_pipeline: bool):
+        errors = query_errors(request.app.state.validator, query_dict)
+        if errors:
+            raise HTTPException(status_code=422, detail=errors)
+        applied_rules = []
+        if optimize_pipeline and request.app.state.optimize:
+            query_dict, applied_rules = optimize_query(query_dict)
+        result = await asyncio.to_thread(executor(request).execute_query, query_dict, instruction)
+        return result, applied_rules
+
+    @app.get("/health")
+    async def health(request: Request):
+        return {
+            "status": "ok",
+            "generator": request.app.state.query_generator is not None,
+            "database": request.app.state.executor is not None,
+        }
+
+    @app.post("/generate")
+    async def generate_endpoint(body: GenerateRequest, request: Request):
+        """Generate the MongoDB query answering an instruction, without executing it."""
+        return {"instruction": body.instruction, "query": await generate(request, body.instruction)}
+
+    @app.post("/execute")
+    async def execute_endpoint(body: ExecuteRequest, request: Request, fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")):
+        """Execute a query; with format=ndjson the rows are streamed one per line after a metadata line."""
+        result, applied_rules = await execute(request, body.query, body.instruction, body.optimize)
+        if not result["success"] and fmt == "json":
+            raise HTTPException(status_code=400, detail=result["error"])
+        return _result_response(result, fmt, {"optimizations": applied_rules})
+
+    @app.post("/ask")
+    async def ask_endpoint(body: AskRequest, request: Request, fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$")):
+        """Generate the query answering an instruction and execute it."""
+        query_dict = await generate(request, body.instruction)
+        result, applied_rules = await execute(request, query_dict, body.instruction, body.optimize)
+        if not result["success"] and fmt == "json":
+            raise HTTPException(status_code=400, detail=result["error"])
+        return _result_response(result, fmt, {"instruction": body.instruction, "generated_query": query_dict, "optimizations": applied_rules})
+
+    @app.get("/analytics")
+    async def analytics_list():
+        return {"analytics": list(DEFAULT_ANALYTICS), "series": list(SERIES), "granularities": list(GRANULARITIES)}
+
+    @app.get("/analytics/andamento_temporale")
+    async def trend_endpoint(request: Request, series: str, granularity: str = "month",
+                             start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """Counts of a time series per bucket in [start, end), read live from the rollups (not cached)."""
+        if series not in SERIES:
+            raise HTTPException(status_code=404, detail=f"Unknown series: {series}")
+        if granularity not in GRANULARITIES:
+            raise HTTPException(status_code=422, detail=f"Granularity must be one of {', '.join(GRANULARITIES)}")
+        if request.app.state.analytics_db is None:
+            raise HTTPException(status_code=503, detail="Database connection not available")
+        trend_df, error = await asyncio.to_thread(get_andamento_temporale, request.app.state.analytics_db, series, granularity, start, end)
+        if error:
+            raise HTTPException(status_code=502, detail=error)
+        return _json_response({
+            "series": series,
+            "granularity": granularity,
+            "data": trend_df.reset_index().to_dict(orient="records") if not trend_df.empty else [],
+        })
+
+    @app.get("/analytics/{name}")
+    async def analytics_endpoint(name: str, request: Request):
+        """Dashboard analytic, served from the per-worker stale-while-revalidate cache."""
+        if name not in DEFAULT_ANALYTICS:
+            raise HTTPException(status_code=404, detail=f"Unknown analytic: {name}")
+        if request.app.state.analytics_cache is None:
+            raise HTTPException(status_code=503, detail="Database connection not available")
+        data_df, error, refreshed_at = await asyncio.to_thread(request.app.state.analytics_cache.get, name)
+        if error:
+            raise HTTPException(status_code=502, detail=error)
+        return _json_response({"name": name, "refreshed_at": refreshed_at, "data": data_df.to_dict(orient="records")})
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the LLM2Query HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes, each loading its own models and pools")
+    args = parser.parse_args()
+
+    uvicorn.run("src.api.server:create_app", factory=True, host=args.host, port=args.port, workers=args.workers)
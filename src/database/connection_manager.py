@@ -0,0 +1,166 @@
+import importlib.util
+import threading
+from typing import Dict, Any
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.database import Database
+import config
+
+WORKLOAD_INTERACTIVE = "interactive"
+WORKLOAD_ANALYTICS = "analytics"
+
+# Python packages needed by each wire compressor (zlib is part of the standard library)
+_COMPRESSOR_MODULES = {
+    "zstd": "zstandard",
+    "snappy": "snappy",
+    "zlib": "zlib",
+}
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool counters for every server the client talks to."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _update(self, address, **deltas):
+        key = f"{address[0]}:{address[1]}"
+        with self._lock:
+            stats = self._stats.setdefault(key, {
+                "open": 0,
+                "in_use": 0,
+                "created": 0,
+                "closed": 0,
+                "checked_out": 0,
+                "checkout_failed": 0,
+                "cleared": 0,
+            })
+            for name, delta in deltas.items():
+                stats[name] += delta
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {address: dict(stats) for address, stats in self._stats.items()}
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._update(event.address, cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failed=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, in_use=1, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+
+_client = None
+_client_lock = threading.Lock()
+_pool_listener = PoolStatsListener()
+
+
+def available_compressors() -> list:
+    """Return the configured compressors whose Python package is installed."""
+    return [
+        name for name in config.MONGO_COMPRESSORS
+        if name in _COMPRESSOR_MODULES and importlib.util.find_spec(_COMPRESSOR_MODULES[name]) is not None
+    ]
+
+
+def get_client() -> MongoClient:
+    """Return the process-wide MongoClient, creating it on first use.
+
+    The client connects in the background: server discovery and the
+    minPoolSize pre-warming run on pymongo's monitor threads, so this call
+    never blocks on a network handshake.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                options = {
+                    "maxPoolSize": config.MONGO_MAX_POOL_SIZE,
+                    "minPoolSize": config.MONGO_MIN_POOL_SIZE,
+                    "maxIdleTimeMS": config.MONGO_MAX_IDLE_TIME_MS,
+                    "serverSelectionTimeoutMS": config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    "event_listeners": [_pool_listener],
+                }
+                compressors = available_compressors()
+                if compressors:
+                    options["compressors"] = ",".join(compressors)
+                _client = MongoClient(config.MONGO_URI, **options)
+    return _client
+
+
+def get_database(workload: str = WORKLOAD_INTERACTIVE) -> Database:
+    """Get the project database bound to the read preference of a workload.
+
+    Args:
+        workload: WORKLOAD_INTERACTIVE for user-facing queries or
+            WORKLOAD_ANALYTICS for dashboards and evaluation runs.
+
+    Returns:
+        A pymongo Database sharing the process-wide connection pool.
+    """
+    if workload == WORKLOAD_ANALYTICS:
+        read_preference_name = config.MONGO_ANALYTICS_READ_PREFERENCE
+    elif workload == WORKLOAD_INTERACTIVE:
+        read_preference_name = config.MONGO_INTERACTIVE_READ_PREFERENCE
+    else:
+        raise ValueError(f"Unknown workload: {workload}")
+
+    read_preference = _READ_PREFERENCES.get(read_preference_name)
+    if read_preference is None:
+        raise ValueError(f"Unknown read preference: {read_preference_name}")
+
+    return get_client().get_database(config.MONGO_DB_NAME, read_preference=read_preference)
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Return the pool configuration and the live per-server counters."""
+    return {
+        "max_pool_size": config.MONGO_MAX_POOL_SIZE,
+        "min_pool_size": config.MONGO_MIN_POOL_SIZE,
+        "compressors": available_compressors(),
+        "client_initialized": _client is not None,
+        "servers": _pool_listener.snapshot(),
+    }
+
+
+def close_client():
+    """Close the shared client and its pools (used on shutdown and in scripts)."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,264 @@
+import argparse
+import os
+import queue
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from typing import Dict, Any, List, Optional, Union
+import numpy as np
+
+# Shared secret of server and clients: multiprocessing.connection unpickles every message,
+# so only peers that pass the HMAC challenge on this key are talked to
+AUTHKEY_ENV = "EMBEDDING_SERVER_AUTHKEY"
+
+
+def default_socket_path() -> str:
+    """Socket in a directory only this user can write: $XDG_RUNTIME_DIR, else a per-user temp directory."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(tempfile.gettempdir(), f"llm2query-{os.getuid()}")
+    return os.path.join(runtime_dir, "llm2query_embedding.sock")
+
+
+DEFAULT_SOCKET = default_socket_path()
+
+
+def authkey_from_env() -> bytes:
+    authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(f"Set {AUTHKEY_ENV} to the shared secret of the embedding server")
+    return authkey.encode()
+
+
+def ensure_private_directory(path: str):
+    """Create the socket directory (mode 700) and refuse one another user owns or can write into."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} must be a directory owned by this user and writable only by it")
+
+
+class EmbeddingServer:
+    """Host one embedding model for every process of the node.
+
+    Clients connect over a Unix socket (multiprocessing.connection). Every
+    connection is served by its own thread, which only queues the request: a
+    single batcher thread takes the first pending request, waits at most
+    max_wait_ms for others (up to max_batch_size sentences) and encodes them
+    all with one model.encode call, so concurrent callers share forward passes.
+    Connections must answer the challenge on authkey; a request not answered
+    within request_timeout seconds gets an error instead of blocking its caller.
+    """
+
+    def __init__(self, model, address: str = DEFAULT_SOCKET, authkey: Optional[bytes] = None,
+                 max_batch_size: int = 64, max_wait_ms: float = 5, request_timeout: float = 60):
+        self.model = model
+        self.address = address
+        self.authkey = authkey or authkey_from_env()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.request_timeout = request_timeout
+        self._requests: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._listener = None
+        self.stats = {"requests": 0, "batches": 0, "sentences": 0}
+
+    # ---- Batching ----
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            first = self._requests.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch, size = [first], len(first["sentences"])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request["normalize"] != first["normalize"]:
+                # Encoded with other options: leave it for the next batch
+                self._requests.put(request)
+                break
+            batch.append(request)
+            size += len(request["sentences"])
+        return batch
+
+    def _encode_batch(self, batch: List[Dict[str, Any]]):
+        sentences = [sentence for request in batch for sentence in request["sentences"]]
+        embeddings = np.asarray(self.model.encode(
+            sentences, batch_size=self.max_batch_size, normalize_embeddings=batch[0]["normalize"]
+        ), dtype=np.float32)
+        self.stats["batches"] += 1
+        self.stats["sentences"] += len(sentences)
+
+        start = 0
+        for request in batch:
+            count = len(request["sentences"])
+            request["response"] = ("ok", embeddings[start:start + count])
+            start += count
+            request["done"].set()
+
+    def _run_batcher(self):
+        # Nothing may end this loop but close(): a dead batcher would leave every caller waiting
+        while not self._stop_event.is_set():
+            batch = []
+            try:
+                batch = self._next_batch()
+                if batch:
+                    self._encode_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request["done"].is_set():
+                        request["response"] = ("error", f"{type(e).__name__}: {e}")
+                        request["done"].set()
+
+    # ---- Connections ----
+    def _serve_connection(self, connection):
+        with connection:
+            while not self._stop_event.is_set():
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                command = message.get("command")
+                if command == "ping":
+                    connection.send(("ok", dict(self.stats)))
+                    continue
+                if command != "encode":
+                    connection.send(("error", f"Unknown command: {command}"))
+                    continue
+                request = {
+                    "sentences": list(message["sentences"]),
+                    "normalize": bool(message.get("normalize_embeddings", False)),
+                    "done": threading.Event(),
+                    "response": None,
+                }
+                self.stats["requests"] += 1
+                self._requests.put(request)
+                if not request["done"].wait(self.request_timeout):
+                    request["response"] = ("error", f"No embedding within {self.request_timeout} s")
+                try:
+                    connection.send(request["response"])
+                except (EOFError, OSError):
+                    return
+
+    def serve_forever(self):
+        ensure_private_directory(os.path.dirname(os.path.abspath(self.address)))
+        if os.path.exists(self.address):
+            # Left over by a server that did not shut down cleanly
+            os.remove(self.address)
+        # The socket is created 0600 by bind itself, not opened to others until a later chmod
+        previous_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(previous_umask)
+        threading.Thread(target=self._run_batcher, daemon=True, name="embedding-batcher").start()
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    connection = self._listener.accept()
+                except AuthenticationError:
+                    # A peer without the key: drop it and keep serving
+                    continue
+                except OSError:
+                    break
+                threading.Thread(target=self._serve_connection, args=(connection,), daemon=True, name="embedding-connection").start()
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop_event.set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+
+class EmbeddingClient:
+    """Drop-in replacement of SentenceTransformer.encode backed by an EmbeddingServer.
+
+    Each thread keeps its own connection, so concurrent callers of the same
+    process reach the server in parallel and can be batched together. The
+    server must prove it holds authkey too, so a socket planted at the same
+    path by another user is refused before any answer is unpickled.
+    """
+
+    def __init__(self, address: str = DEFAULT_SOCKET, authkey: Optional[bytes] = None, timeout: float = 30):
+        self.address = address
+        self.authkey = authkey or authkey_from_env()
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            self._local.connection = connection
+        return connection
+
+    def _request(self, message: Dict[str, Any]):
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.send(message)
+                if not connection.poll(self.timeout):
+                    # The late answer would be read by the next request: drop the connection
+                    connection.close()
+                    self._local.connection = None
+                    raise TimeoutError(f"No answer from the embedding server at {self.address} within {self.timeout} s")
+                status, payload = connection.recv()
+                break
+            except (EOFError, ConnectionError, BrokenPipeError):
+                # The server restarted: reconnect once
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        if status != "ok":
+            raise RuntimeError(f"Embedding server error: {payload}")
+        return payload
+
+    def encode(self, sentences: Union[str, List[str]], normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Embed one sentence (1-D array) or a list of sentences (2-D array), like SentenceTransformer.encode."""
+        single = isinstance(sentences, str)
+        embeddings = self._request({
+            "command": "encode",
+            "sentences": [sentences] if single else list(sentences),
+            "normalize_embeddings": normalize_embeddings,
+        })
+        return embeddings[0] if single else embeddings
+
+    def ping(self) -> Dict[str, int]:
+        """Request, batch and sentence counters of the server."""
+        return self._request({"command": "ping"})
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve the embedding model to every process of the node")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path, in a directory only this user can write (set EMBEDDING_SERVER_SOCKET to the same value)")
+    parser.add_argument("--model", default="thenlper/gte-large")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5, help="How long a request waits for others to batch with")
+    parser.add_argument("--request-timeout", type=float, default=60, help="Seconds before a pending request is answered with an error")
+    args = parser.parse_args()
+    # Read before loading the model, so a missing key fails fast
+    server_authkey = authkey_from_env()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    embedding_model = SentenceTransformer(args.model)
+    if next(embedding_model.parameters()).is_meta:
+        embedding_model.to_empty(device=device)
+    else:
+        embedding_model.to(device)
+    print(f"Serving {args.model} on {device} at {args.socket}")
+    EmbeddingServer(embedding_model, args.socket, server_authkey, args.max_batch_size, args.max_wait_ms,
+                    args.request_timeout).serve_forever()
@@ -0,0 +1,87 @@
+import argparse
+import io
+import time
+import pandas as pd
+from src.analytics.charts import ChartCache, CHART_BUILDERS
+
+# Aggregated frames shaped like the analytics results, with the arguments of their chart
+SAMPLE_CHARTS = {
+    "heart_failure_by_year": ("line", pd.DataFrame({
+        "Anno": list(range(2000, 2025)),
+        "Numero Casi": [120 + 7 * i for i in range(25)],
+    }), ("Anno", "Numero Casi", "Andamento Annuale dei Casi di Scompenso cardiaco")),
+    "principali_cause_decesso": ("barh", pd.DataFrame({
+        "Motivo del decesso": [f"Motivo {i}" for i in range(10)],
+        "Numero Pazienti deceduti": [300 - 25 * i for i in range(10)],
+    }), ("Motivo del decesso", "Numero Pazienti deceduti", "Principali Motivi di decesso")),
+    "pazienti_per_evento": ("barh", pd.DataFrame({
+        "Tipo evento": [f"Evento {i}" for i in range(8)],
+        "Numero Pazienti": [500 - 40 * i for i in range(8)],
+    }), ("Tipo evento", "Numero Pazienti", "Numero pazienti per evento")),
+    "lesioni_coronarografiche": ("treemap", pd.DataFrame({
+        "Tipo Lesione": [f"Lesione {i}" for i in range(12)],
+        "Numero Coronarografie": [400 - 30 * i for i in range(12)],
+    }), ("Tipo Lesione", "Numero Coronarografie", "Numero Coronarografie per Tipo di Lesione")),
+}
+
+
+def matplotlib_render(plt, kind: str, data_df: pd.DataFrame, x: str, y: str, title: str, close: bool = True):
+    """Figure drawn as app.py did before the Vega-Lite charts, encoded to PNG with the settings of st.pyplot."""
+    fig, ax = plt.subplots(figsize=(12, 7) if kind == "treemap" else (10, 6))
+    if kind == "line":
+        ax.plot(data_df[x], data_df[y], marker='o', linestyle='-', color='purple')
+        ax.set_xticks(data_df[x].astype(int))
+        ax.tick_params(axis='x', rotation=45)
+    elif kind == "barh":
+        ax.barh(data_df[x], data_df[y], color="skyblue")
+        ax.invert_yaxis()
+    else:
+        import squarify
+        labels = [f"{label}\n({count})" for label, count in zip(data_df[x], data_df[y])]
+        squarify.plot(sizes=data_df[y], label=labels, alpha=0.8, ax=ax, pad=True, text_kwargs={'fontsize': 10, 'color': 'white'})
+        ax.axis('off')
+    ax.set_title(title)
+    plt.tight_layout()
+    fig.savefig(io.BytesIO(), bbox_inches="tight", dpi=200, format="png")
+    if close:
+        plt.close(fig)
+
+
+def cpu_ms(function, repeat: int) -> float:
+    """Mean CPU time of one call, in milliseconds."""
+    started = time.process_time()
+    for _ in range(repeat):
+        function()
+    return (time.process_time() - started) * 1000 / repeat
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="CPU time per render of the analytics charts: matplotlib PNG vs cached Vega-Lite spec")
+    parser.add_argument("--repeat", type=int, default=10, help="Renders per chart and method")
+    parser.add_argument("--skip-matplotlib", action="store_true", help="Only time the Vega-Lite specs")
+    args = parser.parse_args()
+
+    plt = None
+    if not args.skip_matplotlib:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+    cache = ChartCache()
+    print(f"{'Chart':<28}{'matplotlib PNG':>16}{'Vega-Lite spec':>16}{'cached spec':>14}   (CPU ms per render)")
+    for name, (kind, data_df, chart_args) in SAMPLE_CHARTS.items():
+        png_ms = cpu_ms(lambda: matplotlib_render(plt, kind, data_df, *chart_args), args.repeat) if plt else float("nan")
+        spec_ms = cpu_ms(lambda: CHART_BUILDERS[kind](data_df, *chart_args).to_dict(), args.repeat)
+        cache.spec(kind, data_df, *chart_args)
+        cached_ms = cpu_ms(lambda: cache.spec(kind, data_df, *chart_args), args.repeat)
+        print(f"{name:<28}{png_ms:>16.1f}{spec_ms:>16.1f}{cached_ms:>14.2f}")
+
+    if plt:
+        # What every rerun used to leave behind: figures that are never closed stay in pyplot's registry
+        kind, data_df, chart_args = SAMPLE_CHARTS["lesioni_coronarografiche"]
+        for _ in range(args.repeat):
+            matplotlib_render(plt, kind, data_df, *chart_args, close=False)
+        print(f"\nOpen figures after {args.repeat} renders without plt.close: {len(plt.get_fignums())}")
+        plt.close("all")
+        print(f"Open figures after plt.close('all'): {len(plt.get_fignums())}")
@@ -0,0 +1,89 @@
+import argparse
+import ast
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# "import time:      self [us] |  cumulative | imported package"
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+# Imports paid before the first paint of each mode, in addition to the ones of app.py
+MODE_IMPORTS = {
+    "Assistente": ["torch", "sentence_transformers", "chromadb", "google.generativeai", "src.query_engine.query_generator"],
+    "Analitiche": ["src.analytics.charts"],
+    "Panoramica": ["src.analytics.charts"],
+    "Cartella Clinica Paziente": [],
+}
+
+
+def app_imports(app_path: str = os.path.join(PROJECT_ROOT, "app.py")) -> List[str]:
+    """Modules imported at the top level of app.py, i.e. paid by every session before the first paint."""
+    with open(app_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def _run_importtime(code: str):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    per_module: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        # One leading space marks a first-level import (not done by another module)
+        if match and len(match.group(3)) == 1:
+            per_module[match.group(4)] = int(match.group(2)) / 1000
+    return completed, per_module
+
+
+def profile_imports(modules: List[str]) -> Dict[str, object]:
+    """Import modules in a fresh interpreter with -X importtime.
+
+    Modules loaded by the interpreter startup (site, encodings...) are excluded.
+
+    Returns:
+        dict with total_ms (sum of the cumulative time of the first-level imports),
+        per_module (first-level imports -> cumulative ms), error (stderr tail if the import failed)
+    """
+    _, startup = _run_importtime("pass")
+    completed, per_module = _run_importtime("\n".join(f"import {module}" for module in modules))
+    per_module = {module: elapsed for module, elapsed in per_module.items() if module not in startup}
+    error = None
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}"
+    return {"total_ms": sum(per_module.values()), "per_module": per_module, "error": error}
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Import-time profile of app.py and of each mode (python -X importtime)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest first-level imports to list")
+    parser.add_argument("--modules", nargs="*", default=None, help="Profile these modules instead of app.py and its modes")
+    args = parser.parse_args()
+
+    targets = {"custom": args.modules} if args.modules else {
+        "app.py (every session)": app_imports(),
+        **{f"app.py + {mode}": app_imports() + extra for mode, extra in MODE_IMPORTS.items()},
+    }
+
+    for name, modules in targets.items():
+        profile = profile_imports(modules)
+        print(f"{name:<45}{profile['total_ms']:>10.0f} ms")
+        if profile["error"]:
+            print(f"    import failed: {profile['error']}")
+
+    baseline = profile_imports(app_imports())
+    print(f"\nSlowest imports of app.py:")
+    for module, elapsed in sorted(baseline["per_module"].items(), key=lambda item: -item[1])[:args.top]:
+        print(f"    {module:<50}{elapsed:>10.1f} ms")
@@ -1,19 +1,12 @@
 import os
-import config
-from pymongo import MongoClient
+from src.database.connection_manager import get_database, WORKLOAD_ANALYTICS
 from src.query_engine.query_executor import MongoDBQueryExecutor
 from typing import Dict, Any
 import pandas as pd
 
 
 # ---- Mongo Client Config ----
-try:
-    client = MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
-    client.server_info()
-    db = client[config.MONGO_DB_NAME]
-
-except Exception as e:
-    print(f"Error Mongo DB configuration: {e}")
+db = get_database(WORKLOAD_ANALYTICS)
 
 # ---- Query Executor -----
 executor = MongoDBQueryExecutor(db)
@@ -0,0 +1,84 @@
+import time
+from src.evaluation import manual_query_executor as mqe
+from src.query_engine.pipeline_optimizer import optimize_query
+
+# Pipelines used in the benchmark: the aggregate gold queries plus the generator prompt example
+benchmark_queries = {
+    "gold_medium_query_n11": mqe.gold_medium_query_n11,
+    "gold_medium_query_n12": mqe.gold_medium_query_n12,
+    "gold_medium_query_n13": mqe.gold_medium_query_n13,
+    "gold_medium_query_n14": mqe.gold_medium_query_n14,
+    "gold_medium_query_n15": mqe.gold_medium_query_n15,
+    "gold_difficult_query_n21": mqe.gold_difficult_query_n21,
+    "gold_difficult_query_n22": mqe.gold_difficult_query_n22,
+    "gold_difficult_query_n23": mqe.gold_difficult_query_n23,
+    "prompt_example_diabete_ricoveri": lambda: {
+        "collection_name": "ANAMNESI",
+        "operation_type": "aggregate",
+        "arguments": {
+            "pipeline": [
+                {"$match": {"DIABETE": "YES"}},
+                {"$lookup": {
+                    "from": "RICOVERO_OSPEDALIERO",
+                    "localField": "ID_PAZ",
+                    "foreignField": "ID_PAZ",
+                    "as": "info_ricoveri"
+                }},
+                {"$project": {
+                    "_id": 0,
+                    "id_paziente_anamnesi": "$ID_PAZ",
+                    "date_ricoveri_ospedalieri": "$info_ricoveri.DATA"
+                }}
+            ]
+        }
+    },
+}
+
+
+def _collect_execution_stats(explain_output, totals):
+    """Sum the documents and keys examined anywhere in an explain document.
+
+    Cursor stages report them inside "executionStats", $lookup stages next to the stage itself.
+    """
+    if isinstance(explain_output, dict):
+        for key, value in explain_output.items():
+            if key == "totalDocsExamined" and isinstance(value, int):
+                totals["docs_examined"] += value
+            elif key == "totalKeysExamined" and isinstance(value, int):
+                totals["keys_examined"] += value
+            elif isinstance(value, (dict, list)):
+                _collect_execution_stats(value, totals)
+    elif isinstance(explain_output, list):
+        for item in explain_output:
+            _collect_execution_stats(item, totals)
+    return totals
+
+
+def explain_cost(db, query_dict):
+    """Run an aggregate query under explain("executionStats") and summarise its cost."""
+    pipeline = mqe.executor._convert_iso_strings_to_datetime(query_dict["arguments"]["pipeline"])
+    start = time.perf_counter()
+    explain_output = db.command(
+        "explain",
+        {"aggregate": query_dict["collection_name"], "pipeline": pipeline, "cursor": {}},
+        verbosity="executionStats"
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    totals = _collect_execution_stats(explain_output, {"docs_examined": 0, "keys_examined": 0})
+    totals["elapsed_ms"] = round(elapsed_ms, 1)
+    return totals
+
+
+if __name__ == "__main__":
+
+    print(f"{'query':<34}{'rules':<48}{'docs before':>12}{'docs after':>12}{'ms before':>11}{'ms after':>10}")
+    for name, query_builder in benchmark_queries.items():
+        original_query = query_builder()
+        optimized_query, applied_rules = optimize_query(original_query)
+
+        before = explain_cost(mqe.db, original_query)
+        after = explain_cost(mqe.db, optimized_query) if applied_rules else before
+
+        print(f"{name:<34}{', '.join(applied_rules) or '-':<48}"
+              f"{before['docs_examined']:>12}{after['docs_examined']:>12}"
+              f"{before['elapsed_ms']:>11}{after['elapsed_ms']:>10}")
@@ -0,0 +1,72 @@
+import inspect
+import json
+import bson
+import pandas as pd
+from src.evaluation import manual_query_executor as mqe
+from src.query_engine.projection_injector import inject_projection
+import config
+
+# Gold queries whose docstring carries the original "User Need" instruction
+benchmark_queries = [
+    mqe.gold_easy_query_n3,
+    mqe.gold_easy_query_n4,
+    mqe.gold_easy_query_n5,
+    mqe.gold_medium_query_n11,
+    mqe.gold_medium_query_n12,
+    mqe.gold_medium_query_n13,
+    mqe.gold_medium_query_n14,
+    mqe.gold_medium_query_n15,
+]
+
+# Extra instructions exercising the find path on the wide anamnesis records
+extra_cases = [
+    ("Mostra diabete e fumo del paziente 1_7", {
+        "collection_name": "ANAMNESI",
+        "operation_type": "find",
+        "arguments": {"filter": {"ID_PAZ": "1_7"}}
+    }),
+    ("Elenca data e conclusioni degli esami strumentali del paziente 1_7", {
+        "collection_name": "ESAMI_STRUMENTALI_CARDIO",
+        "operation_type": "find",
+        "arguments": {"filter": {"ID_PAZ": "1_7"}}
+    }),
+]
+
+
+def _instruction_of(query_function) -> str:
+    doc = inspect.getdoc(query_function) or ""
+    return " ".join(doc.replace("User Need:", "").split())
+
+
+def measure(query_dict):
+    """Run a query and return (documents, BSON bytes received, DataFrame bytes)."""
+    arguments = query_dict["arguments"]
+    collection = mqe.db[query_dict["collection_name"]]
+    if query_dict["operation_type"] == "find":
+        filter_criteria = mqe.executor._convert_iso_strings_to_datetime(arguments.get("filter", {}))
+        documents = list(collection.find(filter_criteria, arguments.get("projection")))
+    else:
+        pipeline = mqe.executor._convert_iso_strings_to_datetime(arguments["pipeline"])
+        documents = list(collection.aggregate(pipeline))
+
+    wire_bytes = sum(len(bson.encode(document)) for document in documents)
+    frame_bytes = int(pd.DataFrame(mqe.executor._sanitize_data(documents)).memory_usage(deep=True).sum())
+    return len(documents), wire_bytes, frame_bytes
+
+
+if __name__ == "__main__":
+
+    cases = [(_instruction_of(f), f()) for f in benchmark_queries] + extra_cases
+
+    print(f"{'instruction':<70}{'docs':>7}{'bytes before':>14}{'bytes after':>13}{'df before':>11}{'df after':>10}")
+    for instruction, query_dict in cases:
+        injected_query, projection = inject_projection(query_dict, instruction, config.DB_SCHEMA)
+        docs, wire_before, frame_before = measure(query_dict)
+        if projection:
+            _, wire_after, frame_after = measure(injected_query)
+        else:
+            wire_after, frame_after = wire_before, frame_before
+
+        print(f"{instruction[:68]:<70}{docs:>7}{wire_before:>14}{wire_after:>13}{frame_before:>11}{frame_after:>10}")
+        if projection:
+            print(f"    projection: {json.dumps(projection)}")
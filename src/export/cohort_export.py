@@ -0,0 +1,314 @@
+import argparse
+import glob
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Iterable
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Collections exported for every patient, each written to its own partition directory
+CLINICAL_COLLECTIONS = [
+    "ANAGRAFICA",
+    "ANAMNESI",
+    "LISTA_EVENTI",
+    "CORONAROGRAFIA_PTCA",
+    "ECOCARDIO_DATI",
+    "ECOCAROTIDI",
+    "ESAMI_LABORATORIO",
+    "ESAMI_SPECIALISTICI",
+    "ESAMI_STRUMENTALI_CARDIO",
+    "RICOVERO_OSPEDALIERO",
+    "VISITA_CONTROLLO_ECG",
+]
+
+EXPORT_FORMATS = ("parquet", "csv")
+
+# Arrow type of each bsonType of mongodb_schema.txt (identifiers and unknown types as strings)
+ARROW_TYPES = {
+    "number": pa.float64(),
+    "double": pa.float64(),
+    "int": pa.float64(),
+    "long": pa.float64(),
+    "decimal": pa.float64(),
+    "string": pa.string(),
+    "objectId": pa.string(),
+    "date": pa.timestamp("ms"),
+    "bool": pa.bool_(),
+}
+MANIFEST_NAME = "manifest.json"
+
+
+# ---- Patient selection ----
+def resolve_patient_ids(db, ids: Iterable[str] = None, ids_file: str = None, query: Dict[str, Any] = None, cohort: str = None) -> List[str]:
+    """Collect the ID_PAZ to export from a list, a file (one per line), an ANAGRAFICA filter or a cohort expression."""
+    patient_ids = list(ids or [])
+    if ids_file:
+        with open(ids_file, encoding="utf-8") as f:
+            patient_ids += [line.strip() for line in f if line.strip()]
+    if query is not None:
+        patient_ids += [doc["ID_PAZ"] for doc in db.ANAGRAFICA.find(query, projection={"ID_PAZ": 1, "_id": 0}) if doc.get("ID_PAZ")]
+    if cohort:
+        from src.analytics.cohort_index import CohortIndex
+        cohort_index = CohortIndex(db)
+        cohort_index.refresh()
+        patient_ids += cohort_index.patient_ids(cohort)
+    # Sorted and unique: the batches must be identical when an export is resumed
+    return sorted(set(patient_ids))
+
+
+# ---- Manifest ----
+def _write_json_atomic(path: str, payload: Dict[str, Any]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def _load_manifest(output_dir: str, patient_ids: List[str], fmt: str, batch_size: int, collections: List[str]) -> Dict[str, Any]:
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest["patients"] != patient_ids or manifest["format"] != fmt or manifest["batch_size"] != batch_size:
+            raise ValueError(f"{output_dir} contains a different export: use another output directory")
+        for collection in collections:
+            manifest["completed"].setdefault(collection, [])
+        for key in ("schemas", "coerced", "dropped_fields"):
+            manifest.setdefault(key, {})
+        return manifest
+    return {
+        "format": fmt,
+        "batch_size": batch_size,
+        "patients": patient_ids,
+        "collections": collections,
+        "completed": {collection: [] for collection in collections},
+        "files": {},
+        "rows": {},
+        "schemas": {},
+        "coerced": {},
+        "dropped_fields": {},
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None,
+    }
+
+
+# ---- Writing ----
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Make mixed-type object columns (e.g. numbers and strings) serializable as strings."""
+    for column in df.columns[df.dtypes == object]:
+        values = df[column].dropna()
+        if values.map(type).nunique() > 1 or (len(values) and not isinstance(values.iloc[0], (str, datetime))):
+            df[column] = df[column].map(lambda v: v if v is None or (isinstance(v, float) and pd.isna(v)) else str(v))
+    return df
+
+
+def collection_schema(collection: str, db_schema: Dict[str, Any] = None) -> pa.Schema:
+    """Arrow schema of a collection's part files from the declared bsonTypes, or None if it is not declared."""
+    for definition in (db_schema or {}).get("collections", []):
+        if definition["name"] == collection:
+            properties = definition.get("document", {}).get("properties", {})
+            return pa.schema([
+                (field, ARROW_TYPES.get(spec.get("bsonType"), pa.string()))
+                for field, spec in properties.items() if field != "_id"
+            ])
+    return None
+
+
+def _inferred_schema(df: pd.DataFrame) -> pa.Schema:
+    # Types of the first chunk; columns that are all null there are exported as strings
+    inferred = pa.Table.from_pandas(normalize_frame(df.copy()), preserve_index=False).schema
+    return pa.schema([(field.name, pa.string() if pa.types.is_null(field.type) else field.type) for field in inferred])
+
+
+def _schema_to_manifest(schema: pa.Schema) -> Dict[str, str]:
+    return {field.name: str(field.type) for field in schema}
+
+
+def _schema_from_manifest(fields: Dict[str, str]) -> pa.Schema:
+    return pa.schema([(name, pa.type_for_alias(type_name)) for name, type_name in fields.items()])
+
+
+def conform_frame(df: pd.DataFrame, schema: pa.Schema):
+    """Cast a chunk to the schema of its collection, so every part file of a partition agrees.
+
+    Missing columns are added as nulls and undeclared ones are left out. Values
+    that cannot be converted to the declared type (e.g. text in a number field)
+    become null.
+
+    Returns:
+        tuple:
+            - pa.Table: The chunk with the collection schema
+            - dict: Values nulled by the conversion, per column
+            - list: Columns of the chunk not in the schema
+    """
+    coerced = {}
+    columns = {}
+    for field in schema:
+        values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), dtype=object)
+        present = values.notna()
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            converted = pd.to_numeric(values, errors="coerce")
+        elif pa.types.is_timestamp(field.type):
+            converted = pd.to_datetime(values, errors="coerce", utc=True).dt.tz_convert(None)
+        elif pa.types.is_boolean(field.type):
+            converted = values.map(lambda v: v if v is None or isinstance(v, bool) or pd.isna(v) else None).astype(object)
+        else:
+            converted = values.map(lambda v: None if v is None or (isinstance(v, float) and pd.isna(v)) else str(v)).astype(object)
+        lost = int((present & converted.isna()).sum())
+        if lost:
+            coerced[field.name] = lost
+        columns[field.name] = converted
+    table = pa.Table.from_pandas(pd.DataFrame(columns, index=df.index), schema=schema, preserve_index=False)
+    return table, coerced, [column for column in df.columns if column not in schema.names]
+
+
+def _write_chunk(df: pd.DataFrame, path: str, fmt: str, schema: pa.Schema = None):
+    """Write one part file; Parquet parts are cast to the collection schema first.
+
+    Returns:
+        The coerced values and dropped columns reported by conform_frame ({} and [] for CSV)
+    """
+    tmp_path = path + ".tmp"
+    coerced, dropped = {}, []
+    if fmt == "parquet":
+        table, coerced, dropped = conform_frame(df, schema)
+        pq.write_table(table, tmp_path)
+    else:
+        normalize_frame(df).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return coerced, dropped
+
+
+def _export_batch(db, collection: str, batch: List[str], batch_number: int, partition_dir: str, fmt: str, chunk_rows: int,
+                  manifest: Dict[str, Any], db_schema: Dict[str, Any] = None):
+    """Stream the documents of one patient batch into part files of at most chunk_rows rows."""
+    for stale in glob.glob(os.path.join(partition_dir, f"part-{batch_number:05d}-*")):
+        # Leftovers of an interrupted run of this batch
+        os.remove(stale)
+
+    cursor = db[collection].find({"ID_PAZ": {"$in": batch}}, projection={"_id": 0}, batch_size=min(chunk_rows, 1000))
+    files, rows, buffer, chunk_number = [], 0, [], 0
+
+    def flush():
+        nonlocal chunk_number
+        path = os.path.join(partition_dir, f"part-{batch_number:05d}-{chunk_number:03d}.{fmt}")
+        df = pd.DataFrame(buffer)
+        schema = None
+        if fmt == "parquet":
+            # Fixed at the first part file and kept in the manifest, so resumed runs write the same schema
+            if collection not in manifest["schemas"]:
+                schema = collection_schema(collection, db_schema) or _inferred_schema(df)
+                manifest["schemas"][collection] = _schema_to_manifest(schema)
+            schema = _schema_from_manifest(manifest["schemas"][collection])
+        coerced, dropped = _write_chunk(df, path, fmt, schema)
+        collection_coerced = manifest["coerced"].setdefault(collection, {})
+        for column, count in coerced.items():
+            collection_coerced[column] = collection_coerced.get(column, 0) + count
+        if dropped:
+            manifest["dropped_fields"][collection] = sorted(set(manifest["dropped_fields"].get(collection, [])) | set(dropped))
+        files.append(os.path.basename(path))
+        chunk_number += 1
+
+    for document in cursor:
+        buffer.append(document)
+        rows += 1
+        if len(buffer) >= chunk_rows:
+            flush()
+            buffer = []
+    if buffer:
+        flush()
+    return files, rows
+
+
+def export_cohort(db, patient_ids: List[str], output_dir: str, fmt: str = "parquet", collections: List[str] = None,
+                  batch_size: int = 500, chunk_rows: int = 50000, progress=None, db_schema: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Export the clinical records of a cohort, one partition directory per collection.
+
+    Patients are processed in batches of batch_size with one $in query per
+    collection (served by the ID_PAZ indexes); at most chunk_rows documents are
+    held in memory before being written to a part file. Progress is recorded in
+    manifest.json after every batch, so running the same export again resumes
+    from the first batch not completed.
+
+    Every Parquet part file of a collection is written with the same Arrow
+    schema, taken from the declared bsonTypes of db_schema (or inferred from
+    the first part file when the collection is not declared), so each
+    partition directory reads back as one dataset.
+
+    Args:
+        db: pymongo Database
+        patient_ids: ID_PAZ to export (see resolve_patient_ids)
+        output_dir: Export directory
+        fmt: "parquet" or "csv"
+        collections: Collections to export (default: CLINICAL_COLLECTIONS)
+        batch_size: Patients per $in query
+        chunk_rows: Maximum rows per part file
+        progress: Optional callable(collection, completed_batches, total_batches)
+        db_schema: Parsed mongodb_schema.txt (config.DB_SCHEMA)
+
+    Returns:
+        The manifest of the export
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    collections = list(collections or CLINICAL_COLLECTIONS)
+    patient_ids = sorted(set(patient_ids))
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir, patient_ids, fmt, batch_size, collections)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+
+    batches = [patient_ids[i:i + batch_size] for i in range(0, len(patient_ids), batch_size)]
+    for collection in collections:
+        partition_dir = os.path.join(output_dir, collection)
+        os.makedirs(partition_dir, exist_ok=True)
+        completed = set(manifest["completed"][collection])
+        for batch_number, batch in enumerate(batches):
+            if batch_number in completed:
+                continue
+            files, rows = _export_batch(db, collection, batch, batch_number, partition_dir, fmt, chunk_rows, manifest, db_schema)
+            manifest["completed"][collection].append(batch_number)
+            manifest["files"].setdefault(collection, []).extend(files)
+            manifest["rows"][collection] = manifest["rows"].get(collection, 0) + rows
+            _write_json_atomic(manifest_path, manifest)
+            if progress:
+                progress(collection, len(manifest["completed"][collection]), len(batches))
+
+    manifest["finished_at"] = datetime.now().isoformat()
+    _write_json_atomic(manifest_path, manifest)
+    return manifest
+
+
+if __name__ == "__main__":
+
+    import config
+    from src.database.connection_manager import get_database, WORKLOAD_ANALYTICS
+
+    parser = argparse.ArgumentParser(description="Export the clinical records of a cohort to Parquet/CSV")
+    parser.add_argument("--output", required=True, help="Export directory (re-run with the same arguments to resume)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+    parser.add_argument("--ids", nargs="*", default=[], help="ID_PAZ to export")
+    parser.add_argument("--ids-file", default=None, help="File with one ID_PAZ per line")
+    parser.add_argument("--query", default=None, help="ANAGRAFICA filter as JSON, e.g. '{\"SEZIONE\": 1}'")
+    parser.add_argument("--cohort", default=None, help="Cohort expression, e.g. 'DIABETE AND FUMO'")
+    parser.add_argument("--collections", nargs="*", default=None, help="Collections to export (default: all clinical collections)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Patients per $in query")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="Maximum rows per part file")
+    args = parser.parse_args()
+
+    analytics_db = get_database(WORKLOAD_ANALYTICS)
+    cohort_ids = resolve_patient_ids(
+        analytics_db,
+        ids=args.ids,
+        ids_file=args.ids_file,
+        query=json.loads(args.query) if args.query else None,
+        cohort=args.cohort
+    )
+    print(f"Exporting {len(cohort_ids)} patients to {args.output}")
+    result = export_cohort(
+        analytics_db, cohort_ids, args.output, fmt=args.format, collections=args.collections,
+        batch_size=args.batch_size, chunk_rows=args.chunk_rows, db_schema=config.DB_SCHEMA,
+        progress=lambda collection, done, total: print(f"{collection}: batch {done}/{total}")
+    )
+    print(json.dumps(result["rows"], indent=2))
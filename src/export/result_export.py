@@ -0,0 +1,127 @@
+import hashlib
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List
+import pandas as pd
+from src.export.cohort_export import normalize_frame
+
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "mime": "text/csv", "module": None},
+    "parquet": {"label": "Parquet", "mime": "application/vnd.apache.parquet", "module": "pyarrow"},
+    "xlsx": {"label": "Excel (XLSX)", "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "module": "openpyxl"},
+}
+
+# Excel worksheets cannot hold more rows than this (header included)
+XLSX_MAX_ROWS = 1048575
+
+
+def available_formats() -> List[str]:
+    """Export formats whose writer package is installed (XLSX needs openpyxl)."""
+    return [fmt for fmt, spec in EXPORT_FORMATS.items()
+            if spec["module"] is None or importlib.util.find_spec(spec["module"]) is not None]
+
+
+def result_hash(df: pd.DataFrame) -> str:
+    """Content hash of a result, used as cache key of its exports."""
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    except TypeError:
+        # Nested documents/arrays are not hashable: hash their string form
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=False).values
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+class ResultExporter:
+    """Serialize query results on request and keep the files of the latest exports.
+
+    Files are written chunk by chunk into a temporary directory instead of
+    building the whole CSV string in memory, and are kept in an LRU keyed by
+    (result hash, format): preparing the same result again costs nothing.
+    """
+
+    def __init__(self, max_entries: int = 32, chunk_rows: int = 50000, export_dir: str = None):
+        self.max_entries = max_entries
+        self.chunk_rows = chunk_rows
+        self.export_dir = export_dir or tempfile.mkdtemp(prefix="llm2query_exports_")
+        os.makedirs(self.export_dir, exist_ok=True)
+        self._files: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached_path(self, key: str, fmt: str):
+        with self._lock:
+            path = self._files.get((key, fmt))
+            if path and os.path.exists(path):
+                self._files.move_to_end((key, fmt))
+                return path
+            return None
+
+    def export(self, df: pd.DataFrame, fmt: str, key: str = None) -> str:
+        """Return the path of the result serialized in the given format, writing it on a cache miss.
+
+        Raises:
+            ValueError: If the format is unknown, its package is missing or the result does not fit it
+        """
+        if fmt not in available_formats():
+            raise ValueError(f"Formato di esportazione non disponibile: {fmt}")
+        key = key or result_hash(df)
+        path = self.cached_path(key, fmt)
+        if path:
+            return path
+
+        path = os.path.join(self.export_dir, f"{key}.{fmt}")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            getattr(self, f"_write_{fmt}")(normalize_frame(df.copy()), tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            self._files[(key, fmt)] = path
+            self._files.move_to_end((key, fmt))
+            while len(self._files) > self.max_entries:
+                _, evicted_path = self._files.popitem(last=False)
+                if os.path.exists(evicted_path):
+                    os.remove(evicted_path)
+        return path
+
+    def _chunks(self, df: pd.DataFrame):
+        for start in range(0, max(len(df), 1), self.chunk_rows):
+            yield start, df.iloc[start:start + self.chunk_rows]
+
+    def _write_csv(self, df: pd.DataFrame, path: str):
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for start, chunk in self._chunks(df):
+                chunk.to_csv(f, index=False, header=(start == 0))
+
+    def _write_parquet(self, df: pd.DataFrame, path: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        # One schema for the whole result, then one row group per chunk
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(path, schema) as writer:
+            for _, chunk in self._chunks(df):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+    def _write_xlsx(self, df: pd.DataFrame, path: str):
+        if len(df) > XLSX_MAX_ROWS:
+            raise ValueError(f"Il risultato ha {len(df)} righe: il formato XLSX ne supporta al massimo {XLSX_MAX_ROWS}")
+        # Excel does not store timezones
+        for column in df.select_dtypes(include=["datetimetz"]).columns:
+            df[column] = df[column].dt.tz_localize(None)
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            for start, chunk in self._chunks(df):
+                chunk.to_excel(writer, index=False, header=(start == 0), startrow=start + 1 if start else 0)
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+        shutil.rmtree(self.export_dir, ignore_errors=True)
+        os.makedirs(self.export_dir, exist_ok=True)
@@ -0,0 +1,179 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Any
+
+# Attributes every LogRecord has: anything else was passed through "extra" and is emitted as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+_request_started = contextvars.ContextVar("request_started", default=None)
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+# Listener per configured logger: Streamlit re-executes app.py on every interaction
+_listeners: Dict[str, QueueListener] = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request id and every "extra" field."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that also rolls over every interval_seconds, whichever comes first."""
+
+    def __init__(self, filename: str, max_bytes: int, interval_seconds: float, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval_seconds = interval_seconds
+        self._rollover_at = time.time() + interval_seconds
+
+    def shouldRollover(self, record: logging.LogRecord) -> int:
+        if self.interval_seconds and time.time() >= self._rollover_at:
+            return 1
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._rollover_at = time.time() + self.interval_seconds
+
+
+class _RequestContextFilter(logging.Filter):
+    """Stamp records with the request id of the emitting thread before they cross the queue."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        request_id = _request_id.get()
+        if request_id is not None and not hasattr(record, "request_id"):
+            record.request_id = request_id
+        return True
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves the "extra" fields as objects, to be serialized by the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # The traceback cannot cross the queue: keep its text
+            record.exception = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+
+def setup_logging(name: str, log_path: str, level: int = logging.DEBUG, max_bytes: int = 20 * 1024 ** 2,
+                  interval_seconds: float = 86400, backup_count: int = 14) -> logging.Logger:
+    """Configure a logger whose records are written as JSON lines by a background listener thread.
+
+    The calling thread only puts the record on an in-memory queue; formatting
+    and file I/O happen in the listener. The file rotates when it reaches
+    max_bytes or after interval_seconds, keeping backup_count old files.
+    Calling it again for the same logger returns it unchanged.
+    """
+    logger = logging.getLogger(name)
+    if name in _listeners:
+        return logger
+
+    os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+    file_handler = SizeAndTimeRotatingFileHandler(log_path, max_bytes, interval_seconds, backup_count)
+    file_handler.setLevel(level)
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(_RequestContextFilter())
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+
+    logger.setLevel(level)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    if not _listeners:
+        atexit.register(shutdown_logging)
+    _listeners[name] = listener
+    return logger
+
+
+def shutdown_logging():
+    """Flush the queued records and stop every listener thread."""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+# ---- Request context ----
+def begin_request(request_id: str = None) -> str:
+    """Start a request in the current thread: following records carry its id and stage() times its stages."""
+    request_id = request_id or uuid.uuid4().hex[:12]
+    _request_id.set(request_id)
+    _request_started.set(time.perf_counter())
+    _stage_timings.set({})
+    return request_id
+
+
+def finish_request(logger: logging.Logger, message: str = "Richiesta completata", **fields):
+    """Log the stage timings and total duration of the current request, then clear its context.
+
+    Returns:
+        dict with stage_timings_ms and duration_ms, or None outside a request
+    """
+    started = _request_started.get()
+    summary = None
+    if started is not None:
+        summary = {
+            "stage_timings_ms": _stage_timings.get() or {},
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        logger.info(message, extra={**summary, **fields})
+    _request_id.set(None)
+    _request_started.set(None)
+    _stage_timings.set(None)
+    return summary
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request; repeated stages add up."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0) + (time.perf_counter() - started) * 1000, 1)
+
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, sample_rate: float = 1.0, **fields):
+    """Log a large DEBUG payload (query, RAG context...) for a sample_rate fraction of the calls.
+
+    The payload is serialized by the listener thread, not by the caller.
+    """
+    if not logger.isEnabledFor(logging.DEBUG) or random.random() >= sample_rate:
+        return
+    logger.debug(message, extra={"payload": payload, "sample_rate": sample_rate, **fields})
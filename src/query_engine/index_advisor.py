@@ -0,0 +1,297 @@
+import argparse
+import json
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Iterable
+
+# Lines written by app.py for every executed query
+_LOG_QUERY_PATTERN = re.compile(r"Esecuzione query: (\{.*\})\s*$")
+
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte", "$ne", "$nin", "$regex", "$exists", "$not"}
+_EQUALITY_OPERATORS = {"$eq", "$in"}
+
+
+# ---- Query log parsing ----
+def parse_query_log(path: str) -> List[Dict[str, Any]]:
+    """Read the executed queries from app_activity.log or from a JSON-lines query log.
+
+    A JSON-lines log has one object per line, either the query itself or an
+    object with the query under the "query" key.
+    """
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            payload = None
+            match = _LOG_QUERY_PATTERN.search(line)
+            if match:
+                payload = match.group(1)
+            elif line.startswith("{"):
+                payload = line
+            if payload is None:
+                continue
+            try:
+                record = json.loads(payload)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get("query"), dict):
+                record = record["query"]
+            if isinstance(record, dict) and record.get("collection_name"):
+                queries.append(record)
+    return queries
+
+
+# ---- Access pattern extraction ----
+def _classify_filter(filter_doc, equality: set, ranges: set):
+    if not isinstance(filter_doc, dict):
+        return
+    for key, value in filter_doc.items():
+        if key == "$and" and isinstance(value, list):
+            for sub_doc in value:
+                _classify_filter(sub_doc, equality, ranges)
+        elif key.startswith("$"):
+            # $or/$nor/$expr need dedicated indexes per branch: not advised here
+            continue
+        elif isinstance(value, dict) and value and all(k.startswith("$") for k in value):
+            operators = set(value)
+            if operators & _RANGE_OPERATORS:
+                ranges.add(key)
+            elif operators & _EQUALITY_OPERATORS:
+                equality.add(key)
+        else:
+            equality.add(key)
+
+
+def extract_access_patterns(query_dict: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turn a query into (collection, equality, sort, range) access patterns.
+
+    Returns:
+        One pattern for the queried collection plus one per joined collection
+    """
+    collection_name = query_dict.get("collection_name")
+    arguments = query_dict.get("arguments") or {}
+    patterns = []
+
+    if query_dict.get("operation_type") == "find":
+        equality, ranges = set(), set()
+        _classify_filter(arguments.get("filter", {}), equality, ranges)
+        patterns.append({
+            "collection": collection_name,
+            "equality": equality,
+            "sort": [],
+            "range": ranges,
+            "filter": arguments.get("filter", {}),
+        })
+
+    elif query_dict.get("operation_type") == "aggregate":
+        pipeline = arguments.get("pipeline") or []
+        equality, ranges, sort, matches = set(), set(), [], []
+        # Only the leading $match/$sort stages can use an index of the source collection
+        leading = True
+        for stage in pipeline:
+            if not isinstance(stage, dict) or len(stage) != 1:
+                continue
+            operator, spec = next(iter(stage.items()))
+            if leading and operator == "$match":
+                _classify_filter(spec, equality, ranges)
+                matches.append(spec)
+            elif leading and operator == "$sort" and isinstance(spec, dict):
+                sort = list(spec.items())
+                leading = False
+            elif operator == "$lookup" and isinstance(spec, dict):
+                leading = False
+                if spec.get("from") and spec.get("foreignField"):
+                    patterns.append({
+                        "collection": spec["from"],
+                        "equality": {spec["foreignField"]},
+                        "sort": [],
+                        "range": set(),
+                        "filter": {spec["foreignField"]: None},
+                    })
+            else:
+                leading = False
+        patterns.insert(0, {
+            "collection": collection_name,
+            "equality": equality,
+            "sort": sort,
+            "range": ranges,
+            "filter": matches[0] if len(matches) == 1 else {"$and": matches} if matches else {},
+        })
+
+    return [p for p in patterns if p["collection"] and (p["equality"] or p["sort"] or p["range"])]
+
+
+# ---- Index comparison ----
+def load_existing_indexes(schema_path: str) -> Dict[str, List[List[str]]]:
+    """Read the declared indexes of every collection from mongodb_schema.txt."""
+    with open(schema_path, encoding="utf-8") as f:
+        schema = json.load(f)
+    return {
+        collection["name"]: [list(index["key"].keys()) for index in collection.get("indexes", [])]
+        for collection in schema.get("collections", [])
+    }
+
+
+def esr_key(pattern: Dict[str, Any], field_frequency: Counter) -> List[tuple]:
+    """Order the fields of a pattern by the Equality-Sort-Range rule."""
+    key = [(field, 1) for field in sorted(pattern["equality"], key=lambda f: (-field_frequency[f], f))]
+    used = {field for field, _ in key}
+    for field, direction in pattern["sort"]:
+        if field not in used:
+            key.append((field, direction))
+            used.add(field)
+    for field in sorted(pattern["range"], key=lambda f: (-field_frequency[f], f)):
+        if field not in used:
+            key.append((field, 1))
+    return key
+
+
+def served_fields(index_fields: List[str], pattern: Dict[str, Any]) -> int:
+    """How many predicate fields of a pattern an index key can use, following its prefix."""
+    served = 0
+    remaining_equality = set(pattern["equality"])
+    position = 0
+    while position < len(index_fields) and index_fields[position] in remaining_equality:
+        remaining_equality.discard(index_fields[position])
+        served += 1
+        position += 1
+    for field, _ in pattern["sort"]:
+        if position < len(index_fields) and index_fields[position] == field:
+            served += 1
+            position += 1
+        else:
+            break
+    if position < len(index_fields) and index_fields[position] in pattern["range"]:
+        served += 1
+    return served
+
+
+def propose_indexes(queries: Iterable[Dict[str, Any]], existing_indexes: Dict[str, List[List[str]]]) -> List[Dict[str, Any]]:
+    """Rank compound index proposals for the access patterns found in the queries.
+
+    The estimated benefit of a proposal is, summed over the queries it serves, the
+    number of predicate fields it can use beyond the best existing index.
+    """
+    patterns = [p for query in queries for p in extract_access_patterns(query)]
+    field_frequency = defaultdict(Counter)
+    for pattern in patterns:
+        field_frequency[pattern["collection"]].update(pattern["equality"] | pattern["range"])
+
+    grouped = defaultdict(list)
+    for pattern in patterns:
+        key = tuple(esr_key(pattern, field_frequency[pattern["collection"]]))
+        grouped[(pattern["collection"], key)].append(pattern)
+
+    proposals = []
+    for (collection, key), members in grouped.items():
+        existing = existing_indexes.get(collection, [])
+        best_existing = max(existing, key=lambda index: served_fields(index, members[0]), default=[])
+        already_served = served_fields(best_existing, members[0])
+        gain = len(key) - already_served
+        if gain <= 0:
+            continue
+        proposals.append({
+            "collection": collection,
+            "key": list(key),
+            "queries": len(members),
+            "estimated_benefit": gain * len(members),
+            "best_existing_index": best_existing,
+            "sample": members[0],
+        })
+
+    # A proposal whose key is a prefix of another one on the same collection is served by it
+    proposals.sort(key=lambda p: -len(p["key"]))
+    merged = []
+    for proposal in proposals:
+        covering = next((m for m in merged if m["collection"] == proposal["collection"]
+                         and m["key"][:len(proposal["key"])] == proposal["key"]), None)
+        if covering:
+            covering["queries"] += proposal["queries"]
+            covering["estimated_benefit"] += proposal["estimated_benefit"]
+        else:
+            merged.append(proposal)
+
+    merged.sort(key=lambda p: (-p["estimated_benefit"], p["collection"]))
+    return merged
+
+
+# ---- Optional validation on a local MongoDB stand-in ----
+def _docs_examined(explain_output) -> int:
+    total = 0
+    if isinstance(explain_output, dict):
+        for key, value in explain_output.items():
+            if key == "totalDocsExamined" and isinstance(value, int):
+                total += value
+            elif isinstance(value, (dict, list)):
+                total += _docs_examined(value)
+    elif isinstance(explain_output, list):
+        for item in explain_output:
+            total += _docs_examined(item)
+    return total
+
+
+def _explain_pattern(db, pattern: Dict[str, Any]) -> int:
+    """Explain a find that exercises the pattern with the logged filter values.
+
+    The log holds dates as ISO strings: they are converted as the executor does,
+    so a date range is measured against dates and not string comparisons.
+    """
+    from src.query_engine.query_executor import MongoDBQueryExecutor
+
+    query_filter = MongoDBQueryExecutor(db)._convert_iso_strings_to_datetime(pattern["filter"])
+    command = {"find": pattern["collection"], "filter": query_filter}
+    if pattern["sort"]:
+        command["sort"] = dict(pattern["sort"])
+    return _docs_examined(db.command("explain", command, verbosity="executionStats"))
+
+
+def validate_proposals(db, proposals: List[Dict[str, Any]]) -> None:
+    """Measure each proposal with explain before and after creating the index.
+
+    Meant for a local stand-in loaded with representative data: indexes are
+    created and dropped again, never left behind.
+    """
+    for proposal in proposals:
+        collection = db[proposal["collection"]]
+        before = _explain_pattern(db, proposal["sample"])
+        index_name = collection.create_index(proposal["key"])
+        try:
+            after = _explain_pattern(db, proposal["sample"])
+        finally:
+            collection.drop_index(index_name)
+        proposal["docs_examined_before"] = before
+        proposal["docs_examined_after"] = after
+
+
+def _format_key(key: List[tuple]) -> str:
+    return "{" + ", ".join(f"{field}: {direction}" for field, direction in key) + "}"
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Propose MongoDB indexes from the log of generated queries")
+    parser.add_argument("--log", default="logs/app_activity.log", help="app_activity.log or a JSON-lines query log")
+    parser.add_argument("--schema", default="mongodb_schema.txt", help="Schema file with the current indexes")
+    parser.add_argument("--top", type=int, default=10, help="Number of proposals to show")
+    parser.add_argument("--validate-uri", default=None, help="MongoDB stand-in used to validate proposals with explain")
+    parser.add_argument("--db-name", default="CAMPANIA_SALUTE", help="Database name on the stand-in")
+    args = parser.parse_args()
+
+    logged_queries = parse_query_log(args.log)
+    print(f"Parsed {len(logged_queries)} queries from {args.log}")
+    ranked = propose_indexes(logged_queries, load_existing_indexes(args.schema))[:args.top]
+
+    if args.validate_uri:
+        from pymongo import MongoClient
+        standin_client = MongoClient(args.validate_uri, serverSelectionTimeoutMS=5000)
+        validate_proposals(standin_client[args.db_name], ranked)
+
+    for rank, proposal in enumerate(ranked, start=1):
+        line = (f"{rank:>2}. {proposal['collection']:<26} {_format_key(proposal['key']):<55}"
+                f" queries={proposal['queries']:<4} benefit={proposal['estimated_benefit']:<5}"
+                f" best existing={proposal['best_existing_index'] or '-'}")
+        if "docs_examined_before" in proposal:
+            line += f" docsExamined {proposal['docs_examined_before']} -> {proposal['docs_examined_after']}"
+        print(line)
@@ -0,0 +1,192 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Optional
+import pandas as pd
+from src.query_engine.query_executor import MongoDBQueryExecutor
+from src.query_engine.result_store import ResultStore
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobLimitError(RuntimeError):
+    pass
+
+
+class _JobCancelled(Exception):
+    pass
+
+
+class QueryJobQueue:
+    """Process-wide pool executing generated queries in the background.
+
+    A submitted query gets a job id and runs on one of max_workers threads;
+    the number of documents read is reported while the cursor is consumed, and
+    the result is stored in the ResultStore under the session that submitted
+    it. Each user may have at most per_user_limit jobs queued or running, so
+    one analyst cannot occupy every worker. Finished jobs are forgotten after
+    retention_seconds.
+
+    Every query runs with maxTimeMS = max_time_ms and a comment naming its job.
+    Cancelling a running job kills its server-side operation ($currentOp +
+    killOp), so a long $group/$lookup that returns few rows stops too; without
+    the privileges to do so, the operation ends at maxTimeMS.
+    """
+
+    def __init__(self, result_store: ResultStore, max_workers: int = 4, per_user_limit: int = 2, retention_seconds: float = 3600,
+                 max_time_ms: int = None):
+        self.result_store = result_store
+        self.per_user_limit = per_user_limit
+        self.retention_seconds = retention_seconds
+        self.max_time_ms = max_time_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-job")
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, db, query_dict: Dict[str, Any], user: str, session_id: str, instruction: str = None,
+               db_schema: Dict[str, Any] = None, on_finish: Callable[[Dict[str, Any]], None] = None) -> str:
+        """Queue a query and return its job id.
+
+        Args:
+            db: pymongo Database the query runs on
+            query_dict: Query in the generator's format
+            user: Key of the per-user concurrency cap
+            session_id: ResultStore session receiving the result
+            instruction: User request, used for projection injection
+            db_schema: Parsed schema, enables projection injection
+            on_finish: Optional callable receiving the job status when it ends
+
+        Raises:
+            JobLimitError: If the user already has per_user_limit active jobs
+        """
+        self._forget_expired()
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job["user"] == user and job["state"] in ACTIVE_STATES)
+            if active >= self.per_user_limit:
+                raise JobLimitError(f"Hai già {active} query in esecuzione: attendi che una termini (massimo {self.per_user_limit})")
+            self._jobs[job_id] = {
+                "id": job_id,
+                "user": user,
+                "session_id": session_id,
+                "instruction": instruction,
+                "query": query_dict,
+                "db": db,
+                "state": QUEUED,
+                "rows_read": 0,
+                "rows": None,
+                "result_id": None,
+                "error": None,
+                "cancel_requested": False,
+                "submitted_at": datetime.now(),
+                "started_at": None,
+                "finished_at": None,
+                "finished_monotonic": None,
+            }
+        self._pool.submit(self._run, job_id, db, db_schema, on_finish)
+        return job_id
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id: str, db, db_schema, on_finish):
+        with self._lock:
+            job = self._jobs[job_id]
+            if job["cancel_requested"]:
+                job.update(state=CANCELLED, finished_at=datetime.now(), finished_monotonic=time.monotonic())
+                return
+            job.update(state=RUNNING, started_at=datetime.now())
+
+        def progress(rows_read: int):
+            with self._lock:
+                job["rows_read"] = rows_read
+                if job["cancel_requested"]:
+                    raise _JobCancelled()
+
+        fields = {}
+        try:
+            result = MongoDBQueryExecutor(db, db_schema).execute_query(
+                job["query"], job["instruction"], progress=progress,
+                max_time_ms=self.max_time_ms, comment=self._comment(job_id)
+            )
+            if job["cancel_requested"]:
+                fields = {"state": CANCELLED}
+            elif not result["success"]:
+                fields = {"state": FAILED, "error": result["error"]}
+            else:
+                data = result["data"] or []
+                result_id = self.result_store.put(job["session_id"], pd.DataFrame(data)) if data else None
+                fields = {"state": DONE, "rows": len(data), "result_id": result_id}
+        except Exception as e:
+            fields = {"state": FAILED, "error": str(e)}
+        self._update(job_id, finished_at=datetime.now(), finished_monotonic=time.monotonic(), **fields)
+        if on_finish is not None:
+            try:
+                on_finish(self.status(job_id))
+            except Exception:
+                pass
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job (state, rows_read, rows, result_id, error, timestamps), or None if unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {key: value for key, value in job.items() if key not in ("query", "db", "cancel_requested", "finished_monotonic")}
+
+    def jobs(self, session_id: str = None, user: str = None) -> List[Dict[str, Any]]:
+        """Jobs of a session or of a user, most recent first."""
+        with self._lock:
+            job_ids = [job_id for job_id, job in self._jobs.items()
+                       if (session_id is None or job["session_id"] == session_id) and (user is None or job["user"] == user)]
+        return [status for status in map(self.status, reversed(job_ids)) if status is not None]
+
+    @staticmethod
+    def _comment(job_id: str) -> str:
+        return f"query-job:{job_id}"
+
+    def _kill_server_operation(self, db, job_id: str):
+        comment = self._comment(job_id)
+        try:
+            admin = db.client.admin
+            operations = admin.aggregate([
+                {"$currentOp": {}},
+                {"$match": {"$or": [{"command.comment": comment}, {"cursor.originatingCommand.comment": comment}]}}
+            ])
+            for operation in operations:
+                admin.command("killOp", op=operation["opid"])
+        except Exception:
+            # No inprog/killop privilege or not a replica set member: maxTimeMS still bounds the operation
+            pass
+
+    def cancel(self, job_id: str) -> bool:
+        """Ask a job to stop: a queued job never starts, a running one has its server-side operation killed."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] not in ACTIVE_STATES:
+                return False
+            job["cancel_requested"] = True
+            running, db = job["state"] == RUNNING, job["db"]
+        if running:
+            threading.Thread(target=self._kill_server_operation, args=(db, job_id), daemon=True, name=f"query-job-kill-{job_id}").start()
+        return True
+
+    def _forget_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["finished_monotonic"] is not None and now - job["finished_monotonic"] > self.retention_seconds]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            for job in self._jobs.values():
+                if job["state"] in ACTIVE_STATES:
+                    job["cancel_requested"] = True
+        self._pool.shutdown(wait=wait, cancel_futures=False)
@@ -0,0 +1,417 @@
+import copy
+from typing import Dict, Any, List, Tuple
+
+# Stages after which the documents have a new, fully known shape
+_CLOSING_STAGES = ("$group", "$count", "$replaceRoot", "$replaceWith")
+# Stages that do not reference any field
+_FIELDLESS_STAGES = ("$limit", "$skip", "$sample", "$unset", "$count")
+
+
+def _expression_paths(expr) -> Tuple[set, bool]:
+    """Collect the field paths referenced by an aggregation expression.
+
+    Returns:
+        tuple:
+            - set: Dotted field paths referenced as "$path"
+            - bool: True if the expression needs the whole document ($$ROOT/$$CURRENT)
+    """
+    paths = set()
+    whole = False
+    if isinstance(expr, str):
+        if expr.startswith("$$ROOT") or expr.startswith("$$CURRENT"):
+            whole = True
+        elif expr.startswith("$") and not expr.startswith("$$"):
+            paths.add(expr[1:])
+    elif isinstance(expr, dict):
+        for value in expr.values():
+            sub_paths, sub_whole = _expression_paths(value)
+            paths |= sub_paths
+            whole = whole or sub_whole
+    elif isinstance(expr, list):
+        for item in expr:
+            sub_paths, sub_whole = _expression_paths(item)
+            paths |= sub_paths
+            whole = whole or sub_whole
+    return paths, whole
+
+
+def _match_paths(match_doc) -> Tuple[set, bool]:
+    """Collect the field paths a $match filter document depends on."""
+    paths = set()
+    whole = False
+    if not isinstance(match_doc, dict):
+        return paths, True
+    for key, value in match_doc.items():
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            for sub_doc in value:
+                sub_paths, sub_whole = _match_paths(sub_doc)
+                paths |= sub_paths
+                whole = whole or sub_whole
+        elif key == "$expr":
+            sub_paths, sub_whole = _expression_paths(value)
+            paths |= sub_paths
+            whole = whole or sub_whole
+        elif key.startswith("$"):
+            # $text, $where and friends cannot be reasoned about statically
+            whole = True
+        else:
+            paths.add(key)
+    return paths, whole
+
+
+def _is_inclusion_projection(projection: dict) -> bool:
+    for key, value in projection.items():
+        if key == "_id":
+            continue
+        if value in (0, False):
+            return False
+        return True
+    # Only "_id" was given: {"_id": 0} is an exclusion, {"_id": 1} an inclusion
+    return projection.get("_id", 0) not in (0, False)
+
+
+def _top(path: str) -> str:
+    return path.split(".")[0]
+
+
+def _stage_paths(stage: dict) -> Tuple[set, set, bool]:
+    """Describe the input fields a single stage depends on.
+
+    Returns:
+        tuple:
+            - set: Field paths whose values are read
+            - set: Field paths that only need to exist (e.g. unwound arrays)
+            - bool: True if the stage needs the whole document or is not understood
+    """
+    operator, spec = next(iter(stage.items()))
+
+    if operator == "$match":
+        paths, whole = _match_paths(spec)
+        return paths, set(), whole
+    if operator == "$sort":
+        return set(spec.keys()), set(), False
+    if operator in ("$group", "$addFields", "$set", "$replaceWith"):
+        paths, whole = _expression_paths(spec)
+        return paths, set(), whole
+    if operator == "$replaceRoot":
+        paths, whole = _expression_paths(spec.get("newRoot"))
+        return paths, set(), whole
+    if operator == "$project":
+        paths = set()
+        whole = False
+        for key, value in spec.items():
+            if value in (0, 1, True, False):
+                if value in (1, True):
+                    paths.add(key)
+            else:
+                sub_paths, sub_whole = _expression_paths(value)
+                paths |= sub_paths
+                whole = whole or sub_whole
+        if _is_inclusion_projection(spec) and spec.get("_id", 1) not in (0, False):
+            paths.add("_id")
+        return paths, set(), whole
+    if operator == "$unwind":
+        path = spec if isinstance(spec, str) else spec.get("path", "")
+        return set(), {path.lstrip("$")}, False
+    if operator == "$lookup":
+        paths = set()
+        whole = False
+        if "localField" in spec:
+            paths.add(spec["localField"])
+        if "let" in spec:
+            paths, whole = _expression_paths(spec["let"])
+            if "localField" in spec:
+                paths.add(spec["localField"])
+        return paths, set(), whole
+    if operator in _FIELDLESS_STAGES:
+        return set(), set(), False
+    return set(), set(), True
+
+
+def _stage_outputs(stage: dict) -> set:
+    """Top-level fields a non-closing stage adds to the documents."""
+    operator, spec = next(iter(stage.items()))
+    if operator == "$lookup":
+        return {_top(spec["as"])}
+    if operator in ("$addFields", "$set"):
+        return {_top(key) for key in spec}
+    if operator == "$unwind" and isinstance(spec, dict) and spec.get("includeArrayIndex"):
+        return {_top(spec["includeArrayIndex"])}
+    return set()
+
+
+def _is_closing(stage: dict) -> bool:
+    operator, spec = next(iter(stage.items()))
+    if operator in _CLOSING_STAGES:
+        return True
+    return operator == "$project" and _is_inclusion_projection(spec)
+
+
+def required_paths(stages: List[dict]):
+    """Compute which input fields a (sub)pipeline needs.
+
+    Args:
+        stages: Aggregation stages, applied to the input documents in order
+
+    Returns:
+        A tuple (read_paths, exist_paths) of dotted input paths, or None when
+        the whole input documents reach the output or cannot be analysed.
+    """
+    read_paths = set()
+    exist_paths = set()
+    produced = set()
+
+    for index, stage in enumerate(stages):
+        paths, exist_only, whole = _stage_paths(stage)
+        if whole:
+            return None
+        read_paths |= {p for p in paths if _top(p) not in produced}
+        exist_paths |= {p for p in exist_only if _top(p) not in produced}
+
+        operator, spec = next(iter(stage.items()))
+        if operator in ("$replaceRoot", "$replaceWith"):
+            new_root = spec.get("newRoot") if operator == "$replaceRoot" else spec
+            if isinstance(new_root, str) and new_root.startswith("$") and not new_root.startswith("$$"):
+                # The rest of the pipeline reads fields of the promoted sub-document
+                root_path = new_root[1:]
+                rest = required_paths(stages[index + 1:])
+                if rest is None:
+                    return None
+                read_paths.discard(root_path)
+                if _top(root_path) in produced:
+                    return read_paths, exist_paths
+                rest_read, rest_exist = rest
+                read_paths |= {f"{root_path}.{p}" for p in rest_read}
+                exist_paths |= {f"{root_path}.{p}" for p in rest_exist}
+                if not rest_read and not rest_exist:
+                    exist_paths.add(root_path)
+            return read_paths, exist_paths
+        if _is_closing(stage):
+            return read_paths, exist_paths
+        produced |= _stage_outputs(stage)
+
+    return None
+
+
+class PipelineOptimizer:
+    def __init__(self):
+        """Initialize the rule-based rewriter for generated aggregation pipelines."""
+        self.applied_rules = []
+
+    def optimize(self, pipeline: List[dict]) -> Tuple[List[dict], List[str]]:
+        """Rewrite an aggregation pipeline into an equivalent, cheaper one.
+
+        Args:
+            pipeline: Aggregation pipeline produced by the LLM
+
+        Returns:
+            tuple:
+                - list: The optimized pipeline (the input is left untouched)
+                - list: Names of the rules that changed the pipeline
+        """
+        self.applied_rules = []
+        if not isinstance(pipeline, list) or not all(isinstance(s, dict) and len(s) == 1 for s in pipeline):
+            return pipeline, []
+
+        stages = copy.deepcopy(pipeline)
+        stages = self._push_down_matches(stages)
+        stages = self._fix_renamed_sort_keys(stages)
+        stages = self._restrict_lookups(stages)
+        stages = self._project_early(stages)
+        return stages, self.applied_rules
+
+    # ---- Rule 1: selective $match before $lookup/$unwind/$sort/$addFields ----
+    def _can_swap(self, previous: dict, match_spec: dict) -> bool:
+        paths, whole = _match_paths(match_spec)
+        if whole:
+            return False
+        tops = {_top(p) for p in paths}
+        operator, spec = next(iter(previous.items()))
+
+        if operator == "$sort":
+            return True
+        if operator in ("$lookup", "$addFields", "$set"):
+            return not (tops & _stage_outputs(previous))
+        if operator == "$unwind":
+            path = spec if isinstance(spec, str) else spec.get("path", "")
+            return _top(path.lstrip("$")) not in tops and not (tops & _stage_outputs(previous))
+        if operator == "$unset":
+            unset_fields = [spec] if isinstance(spec, str) else spec
+            return not (tops & {_top(f) for f in unset_fields})
+        return False
+
+    def _split_match(self, previous: dict, match_spec: dict):
+        """Split a $match into the conjuncts that can cross `previous` and the rest."""
+        movable, blocked = {}, {}
+        for key, value in match_spec.items():
+            if self._can_swap(previous, {key: value}):
+                movable[key] = value
+            else:
+                blocked[key] = value
+        return movable, blocked
+
+    def _push_down_matches(self, stages: List[dict]) -> List[dict]:
+        index = 0
+        while index < len(stages):
+            if "$match" not in stages[index]:
+                index += 1
+                continue
+            if index > 0 and not self._can_swap(stages[index - 1], stages[index]["$match"]):
+                movable, blocked = self._split_match(stages[index - 1], stages[index]["$match"])
+                if movable and blocked:
+                    # Keep the dependent conjuncts in place and push the selective ones up
+                    stages[index:index + 1] = [{"$match": movable}, {"$match": blocked}]
+            position = index
+            while position > 0 and self._can_swap(stages[position - 1], stages[position]["$match"]):
+                stages[position - 1], stages[position] = stages[position], stages[position - 1]
+                position -= 1
+            if position != index:
+                self.applied_rules.append("match_pushdown")
+            index += 1
+        return stages
+
+    # ---- Rule 2: $sort on a field renamed by $group/$project ----
+    def _fix_renamed_sort_keys(self, stages: List[dict]) -> List[dict]:
+        renames = {}
+        shape = None
+
+        for index, stage in enumerate(stages):
+            operator, spec = next(iter(stage.items()))
+
+            if operator == "$group":
+                new_renames = {}
+                group_id = spec.get("_id")
+                if isinstance(group_id, str) and group_id.startswith("$") and not group_id.startswith("$$"):
+                    new_renames[group_id[1:]] = "_id"
+                elif isinstance(group_id, dict):
+                    for key, value in group_id.items():
+                        if isinstance(value, str) and value.startswith("$") and not value.startswith("$$"):
+                            new_renames[value[1:]] = f"_id.{key}"
+                for key, value in spec.items():
+                    if key != "_id" and isinstance(value, dict) and len(value) == 1:
+                        accumulator, argument = next(iter(value.items()))
+                        if accumulator in ("$first", "$last", "$max", "$min") and isinstance(argument, str) \
+                                and argument.startswith("$") and not argument.startswith("$$"):
+                            new_renames.setdefault(argument[1:], key)
+                renames = new_renames
+                shape = set(spec.keys())
+
+            elif operator == "$project" and _is_inclusion_projection(spec):
+                new_shape = {_top(k) for k, v in spec.items() if v not in (0, False)}
+                if spec.get("_id", 1) not in (0, False):
+                    new_shape.add("_id")
+                new_renames = {}
+                for key, value in spec.items():
+                    if isinstance(value, str) and value.startswith("$") and not value.startswith("$$"):
+                        source = value[1:]
+                        originals = [o for o, current in renames.items() if current == source]
+                        for original in originals or [source]:
+                            new_renames[original] = key
+                    elif value in (1, True):
+                        for original, current in renames.items():
+                            if current == key:
+                                new_renames[original] = key
+                renames = new_renames
+                shape = new_shape
+
+            elif operator in ("$count", "$replaceRoot", "$replaceWith", "$facet", "$bucket", "$bucketAuto"):
+                renames = {}
+                shape = None
+
+            elif operator in ("$addFields", "$set") and shape is not None:
+                shape |= {_top(k) for k in spec}
+
+            elif operator == "$sort" and shape is not None:
+                rewritten = {}
+                changed = False
+                for key, direction in spec.items():
+                    if _top(key) not in shape and key in renames and renames[key] not in rewritten:
+                        rewritten[renames[key]] = direction
+                        changed = True
+                    else:
+                        rewritten[key] = direction
+                if changed:
+                    stages[index] = {"$sort": rewritten}
+                    self.applied_rules.append("sort_renamed_field")
+
+        return stages
+
+    # ---- Rule 3: $lookup restricted to the joined fields actually used ----
+    def _restrict_lookups(self, stages: List[dict]) -> List[dict]:
+        for index, stage in enumerate(stages):
+            if "$lookup" not in stage:
+                continue
+            spec = stage["$lookup"]
+            if "pipeline" in spec or "localField" not in spec or "foreignField" not in spec:
+                continue
+
+            needed = required_paths(stages[index + 1:])
+            if needed is None:
+                continue
+            read_paths, exist_paths = needed
+
+            alias = spec["as"]
+            prefix = alias + "."
+            if alias in read_paths:
+                # The joined array is used as a whole
+                continue
+            sub_fields = {_top(p[len(prefix):]) for p in read_paths | exist_paths if p.startswith(prefix)}
+
+            projection = {field: 1 for field in sorted(sub_fields)}
+            if "_id" not in sub_fields:
+                projection["_id"] = 0 if sub_fields else 1
+            # localField/foreignField combined with a sub-pipeline needs MongoDB 5.0+
+            spec["pipeline"] = [{"$project": projection}]
+            self.applied_rules.append("lookup_projection")
+        return stages
+
+    # ---- Rule 4: narrow the documents before they are joined or unwound ----
+    def _project_early(self, stages: List[dict]) -> List[dict]:
+        position = 0
+        while position < len(stages) and "$match" in stages[position]:
+            position += 1
+        if position >= len(stages) or "$project" in stages[position]:
+            return stages
+        if not any(next(iter(s)) in ("$lookup", "$unwind") for s in stages[position:]):
+            return stages
+
+        needed = required_paths(stages[position:])
+        if needed is None:
+            return stages
+        read_paths, exist_paths = needed
+        fields = {_top(p) for p in read_paths | exist_paths}
+        if not fields:
+            return stages
+
+        projection = {field: 1 for field in sorted(fields)}
+        if "_id" not in fields:
+            projection["_id"] = 0
+        stages.insert(position, {"$project": projection})
+        self.applied_rules.append("early_projection")
+        return stages
+
+
+# Helper function for direct optimization
+def optimize_query(query_dict: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Optimize the pipeline of a generated aggregate query.
+
+    Args:
+        query_dict: MongoDB query dictionary produced by the generator
+
+    Returns:
+        tuple:
+            - dict: The query with the optimized pipeline (find queries are returned unchanged)
+            - list: Names of the rules that were applied
+    """
+    if query_dict.get("operation_type") != "aggregate":
+        return query_dict, []
+
+    pipeline = query_dict.get("arguments", {}).get("pipeline")
+    optimized_pipeline, applied_rules = PipelineOptimizer().optimize(pipeline)
+    if not applied_rules:
+        return query_dict, []
+
+    optimized_query = dict(query_dict)
+    optimized_query["arguments"] = dict(query_dict.get("arguments", {}))
+    optimized_query["arguments"]["pipeline"] = optimized_pipeline
+    return optimized_query, applied_rules
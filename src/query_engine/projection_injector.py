@@ -0,0 +1,191 @@
+import re
+from typing import Dict, Any, List, Tuple
+
+# Identifiers always returned so that every row can be traced back to a patient/visit
+ALWAYS_INCLUDED_FIELDS = ["ID_PAZ", "DATA"]
+
+# Italian words (compacted, lowercase prefixes) that point to a schema field
+FIELD_SYNONYMS = {
+    "nome": ["NOMEPAZ"],
+    "cognom": ["COGNOME"],
+    "sess": ["SESSO"],
+    "uomini": ["SESSO"],
+    "donne": ["SESSO"],
+    "fuma": ["FUMO"],
+    "fumat": ["FUMO"],
+    "diabet": ["DIABETE"],
+    "decedut": ["DATA_DECESSO", "MOTIVO_DECESSO"],
+    "decess": ["DATA_DECESSO", "MOTIVO_DECESSO"],
+    "mort": ["DATA_DECESSO", "MOTIVO_DECESSO"],
+    "nascita": ["DATADINASCITA", "COMUNE_DI_NASCITA"],
+    "nati": ["DATADINASCITA", "COMUNE_DI_NASCITA"],
+    "evento": ["TIPO_EVENTO"],
+    "eventi": ["TIPO_EVENTO"],
+    "infart": ["PREVIOUS_IMA"],
+    "ictus": ["STROKE"],
+    "bypass": ["PREVIOUS_CABG"],
+    "angioplastic": ["PREVIOUS_PCI"],
+    "scompens": ["HEART_FAILURE", "STADIO_SCOMPENSO"],
+    "frazionedieiezione": ["EF"],
+    "lesion": ["LESIONI_TC", "LESIONI_IVA", "LESIONI_CX", "LESIONI_DX"],
+    "codicepaziente": ["CODPAZ"],
+    "sintom": ["SINTOMI", "SINTOMI_PS"],
+    "conclusion": ["CONCLUSIONI"],
+    "colesterol": ["COLESTEROLO", "HDL"],
+    "filtrato": ["FILTRATO_GFR"],
+    "pressione": ["PAS", "PAD"],
+    "tiroid": ["FT3", "FT4", "TSH"],
+}
+
+# Requests that explicitly ask for complete documents: never narrow them
+_FULL_DOCUMENT_PATTERN = re.compile(
+    r"tutt[ie] (i |le )?(dati|informazioni|campi|valori)|tutto|complet[aeoi]|dettagli|intera|all (data|fields)",
+    re.IGNORECASE
+)
+
+
+def collection_fields(db_schema: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Map every collection of the schema to its document fields."""
+    return {
+        collection["name"]: list(collection.get("document", {}).get("properties", {}).keys())
+        for collection in db_schema.get("collections", [])
+    }
+
+
+def mentioned_fields(instruction: str, fields: List[str]) -> List[str]:
+    """Find the fields of a collection the user refers to in the instruction.
+
+    Args:
+        instruction: Natural language request
+        fields: Fields of the collection
+
+    Returns:
+        Fields mentioned by name or through FIELD_SYNONYMS, in schema order
+    """
+    lowered = instruction.lower()
+    compact = re.sub(r"[^a-z0-9]", "", lowered)
+    tokens = set(re.findall(r"[a-z0-9]+", lowered))
+
+    found = set()
+    for field in fields:
+        key = field.lower().replace("_", "")
+        # Short acronyms (EF, PAS, TSH...) only match as whole words
+        if (len(key) >= 5 and key in compact) or field.lower() in tokens:
+            found.add(field)
+    for stem, targets in FIELD_SYNONYMS.items():
+        if stem in compact:
+            found.update(target for target in targets if target in fields)
+    return [field for field in fields if field in found]
+
+
+def _filter_fields(filter_doc) -> set:
+    fields = set()
+    if isinstance(filter_doc, dict):
+        for key, value in filter_doc.items():
+            if key in ("$and", "$or", "$nor") and isinstance(value, list):
+                for sub_doc in value:
+                    fields |= _filter_fields(sub_doc)
+            elif not key.startswith("$"):
+                fields.add(key.split(".")[0])
+    return fields
+
+
+def _build_projection(instruction: str, fields: List[str], filter_fields: set):
+    """Projection for a collection, or None when the needed fields cannot be inferred."""
+    if not instruction or _FULL_DOCUMENT_PATTERN.search(instruction):
+        return None
+    requested = [
+        f for f in mentioned_fields(instruction, fields)
+        if f not in filter_fields and f not in ALWAYS_INCLUDED_FIELDS
+    ]
+    if not requested:
+        # Nothing beyond the filter was asked for: the user wants to see the records as they are
+        return None
+    selected = [f for f in fields if f in ALWAYS_INCLUDED_FIELDS or f in filter_fields or f in requested]
+    projection = {field: 1 for field in selected if field != "_id"}
+    projection["_id"] = 0
+    return projection
+
+
+def inject_projection(query_dict: Dict[str, Any], instruction: str, db_schema: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any] | None]:
+    """Add a projection to queries that would otherwise return whole documents.
+
+    Args:
+        query_dict: MongoDB query dictionary to execute
+        instruction: The user's natural language request
+        db_schema: Parsed MongoDB schema (config.DB_SCHEMA)
+
+    Returns:
+        tuple:
+            - dict: The query to execute (unchanged if nothing was injected)
+            - dict: The injected projection, or None
+    """
+    schema_fields = collection_fields(db_schema)
+    collection_name = query_dict.get("collection_name")
+    arguments = query_dict.get("arguments") or {}
+    if collection_name not in schema_fields:
+        return query_dict, None
+
+    if query_dict.get("operation_type") == "find":
+        current_projection = arguments.get("projection")
+        # {"_id": 0} alone still returns every other field
+        if current_projection and set(current_projection) != {"_id"}:
+            return query_dict, None
+        filter_fields = _filter_fields(arguments.get("filter", {}))
+        projection = _build_projection(instruction, schema_fields[collection_name], filter_fields)
+        if projection is None:
+            return query_dict, None
+        new_query = dict(query_dict)
+        new_query["arguments"] = dict(arguments, projection=projection)
+        return new_query, projection
+
+    if query_dict.get("operation_type") == "aggregate":
+        pipeline = arguments.get("pipeline")
+        if not isinstance(pipeline, list):
+            return query_dict, None
+
+        # Follow the pipeline to know which collection the output documents come from
+        output_collection = collection_name
+        aliases = {}
+        filter_fields = set()
+        for stage in pipeline:
+            if not isinstance(stage, dict) or len(stage) != 1:
+                return query_dict, None
+            operator, spec = next(iter(stage.items()))
+            if operator == "$match":
+                filter_fields |= _filter_fields(spec)
+            elif operator == "$lookup" and isinstance(spec, dict):
+                aliases[spec.get("as")] = spec.get("from")
+            elif operator == "$replaceRoot" and isinstance(spec, dict) and isinstance(spec.get("newRoot"), str) \
+                    and spec["newRoot"].lstrip("$") in aliases:
+                output_collection = aliases[spec["newRoot"].lstrip("$")]
+                aliases = {}
+                filter_fields = set()
+            elif operator in ("$sort", "$limit", "$skip", "$unwind", "$addFields", "$set", "$sample"):
+                continue
+            else:
+                # $group, $project, $count, ... already decide the output shape
+                return query_dict, None
+
+        if output_collection not in schema_fields:
+            return query_dict, None
+        projection = _build_projection(instruction, schema_fields[output_collection], filter_fields)
+        if projection is None:
+            return query_dict, None
+        for alias, foreign_collection in aliases.items():
+            alias_fields = mentioned_fields(instruction, schema_fields.get(foreign_collection, []))
+            if alias_fields:
+                projection.update({f"{alias}.{field}": 1 for field in alias_fields})
+            else:
+                projection[alias] = 1
+        for stage in pipeline:
+            # Fields created by $addFields are part of the answer as well
+            operator, spec = next(iter(stage.items()))
+            if operator in ("$addFields", "$set"):
+                projection.update({key.split(".")[0]: 1 for key in spec})
+
+        new_query = dict(query_dict)
+        new_query["arguments"] = dict(arguments, pipeline=pipeline + [{"$project": projection}])
+        return new_query, projection
+
+    return query_dict, None
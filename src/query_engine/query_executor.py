@@ -1,24 +1,40 @@
 import pymongo
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Callable
 import json
+from src.query_engine.projection_injector import inject_projection
 
 class MongoDBQueryExecutor:
-    def __init__(self, db: pymongo.database.Database):
+    # Documents read between two progress callbacks
+    PROGRESS_EVERY = 1000
+    # Database classes accepted by the constructor. Only pymongo in production: tests
+    # add their stand-in explicitly (tests/conftest.py adds mongomock's Database)
+    DATABASE_TYPES = (pymongo.database.Database,)
+
+    def __init__(self, db: pymongo.database.Database, db_schema: Dict[str, Any] = None):
         """Initialize MongoDB query executor.
 
         Args:
-            db: An active pymongo.database.Database instance.
+            db: An active pymongo.database.Database instance (one of DATABASE_TYPES).
+            db_schema: Parsed MongoDB schema, enables projection injection when given.
         """
-        if not isinstance(db, pymongo.database.Database):
+        if not isinstance(db, self.DATABASE_TYPES):
             raise TypeError("db must be a valid pymongo.database.Database instance")
         self.db = db
+        self.db_schema = db_schema
 
-    def execute_query(self, query_dict: Dict[str, Any]) -> Dict[str, Any]:
+    def execute_query(self, query_dict: Dict[str, Any], instruction: str = None, progress: Callable[[int], None] = None,
+                      max_time_ms: int = None, comment: str = None) -> Dict[str, Any]:
         """Execute a MongoDB query string.
 
         Args:
             query_str: MongoDB query string to execute
+            instruction: User request the query answers; with a schema it is used
+                to project away the fields the answer does not need
+            progress: Optional callable receiving the number of documents read so far,
+                called every PROGRESS_EVERY documents; an exception raised by it aborts the query
+            max_time_ms: Server-side time limit of the operation (maxTimeMS)
+            comment: Attached to the operation, to find it in $currentOp (e.g. to kill it)
 
         Returns:
             Dictionary with query results and metadata
@@ -30,10 +46,16 @@ class MongoDBQueryExecutor:
             "error": None,
             "query_executed": json.dumps(query_dict),
             "query_type": None,
-            "affected_count": 0
+            "affected_count": 0,
+            "injected_projection": None
         }
 
         try:
+            if instruction and self.db_schema:
+                query_dict, injected_projection = inject_projection(query_dict, instruction, self.db_schema)
+                if injected_projection:
+                    result['injected_projection'] = injected_projection
+                    result['query_executed'] = json.dumps(query_dict)
 
             collection_name = query_dict.get('collection_name')
             operation_type = query_dict.get('operation_type')
@@ -56,7 +78,12 @@ class MongoDBQueryExecutor:
                     cursor = collection.find(filter_criteria, projection)
                 else:
                     cursor = collection.find(filter_criteria)
-                result_data = list(cursor)
+                # Set through the cursor when supported (mongomock has no comment)
+                if max_time_ms:
+                    cursor = cursor.max_time_ms(max_time_ms)
+                if comment and hasattr(cursor, "comment"):
+                    cursor = cursor.comment(comment)
+                result_data = self._collect(cursor, progress)
                 result['data'] = self._sanitize_data(result_data)
                 result['affected_count'] = len(result_data)
                 result['success'] = True
@@ -70,8 +97,13 @@ class MongoDBQueryExecutor:
                 # Check Datetime
                 pipeline = self._convert_iso_strings_to_datetime(pipeline)
 
-                cursor = collection.aggregate(pipeline)
-                result_data = list(cursor)
+                options = {}
+                if max_time_ms:
+                    options["maxTimeMS"] = max_time_ms
+                if comment:
+                    options["comment"] = comment
+                cursor = collection.aggregate(pipeline, **options)
+                result_data = self._collect(cursor, progress)
                 result['data'] = self._sanitize_data(result_data)
                 result['affected_count'] = len(result_data)
                 result['success'] = True
@@ -86,6 +118,20 @@ class MongoDBQueryExecutor:
 
         return result
 
+    def _collect(self, cursor, progress: Callable[[int], None] = None) -> list:
+        if progress is None:
+            return list(cursor)
+        documents = []
+        try:
+            for document in cursor:
+                documents.append(document)
+                if len(documents) % self.PROGRESS_EVERY == 0:
+                    progress(len(documents))
+        finally:
+            cursor.close()
+        progress(len(documents))
+        return documents
+
     def _sanitize_data(self, data: Any) -> Any:
         """Sanitize MongoDB data for JSON serialization.
 
@@ -154,15 +200,17 @@ class MongoDBQueryExecutor:
             return data
 
 # Helper function for direct execution
-def execute_mongodb_query(db: pymongo.database.Database, query_dict: Dict[str, Any]) -> Dict[str, Any]:
+def execute_mongodb_query(db: pymongo.database.Database, query_dict: Dict[str, Any], instruction: str = None, db_schema: Dict[str, Any] = None) -> Dict[str, Any]:
     """Execute a MongoDB query.
 
     Args:
         db: An active pymongo.database.Database instance
         query_dict: MongoDB query dictionary to execute
+        instruction: Optional user request, used for projection injection
+        db_schema: Optional parsed MongoDB schema, used for projection injection
 
     Returns:
         Dictionary with query results
     """
-    executor = MongoDBQueryExecutor(db)
-    return executor.execute_query(query_dict)
\ No newline at end of file
+    executor = MongoDBQueryExecutor(db, db_schema)
+    return executor.execute_query(query_dict, instruction)
\ No newline at end of file
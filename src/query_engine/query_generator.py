@@ -1,20 +1,26 @@
 import tqdm
-from sentence_transformers import SentenceTransformer
+from typing import TYPE_CHECKING
 import chromadb
 from chromadb.config import Settings
 import google.generativeai as genai
 import json
 import re
+from src.query_engine.query_validator import QueryValidator
+
+if TYPE_CHECKING:
+    # Not imported at runtime: processes using the embedding server do not load torch
+    from sentence_transformers import SentenceTransformer
 
 
 class MongoDBQueryGenerator:
-    def __init__(self, embedding_model: SentenceTransformer, model: genai.GenerativeModel, chroma_client: chromadb.PersistentClient, db_schema, max_retries: int):
+    def __init__(self, embedding_model: "SentenceTransformer", model: genai.GenerativeModel, chroma_client: chromadb.PersistentClient, db_schema, max_retries: int):
         self.model = model
         self.chroma_client = chroma_client
         self.chroma_collection = self.chroma_client.get_collection(name="datasets_documentations")
         self.embedding_model = embedding_model
         self.db_schema = db_schema
         self.max_retries = max_retries
+        self.validator = QueryValidator(db_schema) if isinstance(db_schema, dict) else None
 
     def generate_query(self, user_instruction: str) -> tuple[str | None, str | None, str]:
         """
@@ -128,7 +134,7 @@ class MongoDBQueryGenerator:
         """
 
         retry_prompt_template = f"""<s>
-        Your previous attempt to generate a JSON object for the user's instruction resulted in an error because the output was not valid JSON.
+        Your previous attempt to generate a JSON object for the user's instruction resulted in an error because the output was not valid JSON or did not match the MongoDB Schema.
         Please review your previous output and the error, then try again.
         **Remember, your task is to generate a MongoDB query as a JSON object according to the schema, or the specific error JSON if the request is irrelevant.**
         Ensure your output is a single, valid JSON object string, with correct syntax (quotes, commas, brackets, braces).
@@ -147,7 +153,7 @@ class MongoDBQueryGenerator:
         ---
         {{previous_llm_output}}
         ---
-        The JSON parsing error was:
+        The error was:
         {{json_error}}
         ---
 
@@ -175,10 +181,7 @@ class MongoDBQueryGenerator:
                 llm_output_text = self.clean_llm_json_output(llm_output_text)
 
                 try:
-                    json.loads(llm_output_text)
-                    print(f"Tentativo {attempt + 1} riuscito: JSON valido.")
-                    print(llm_output_text)
-                    return llm_output_text, None, context
+                    parsed_query = json.loads(llm_output_text)
                 except json.JSONDecodeError as e:
                     json_error_for_retry = str(e)
                     if attempt < self.max_retries:
@@ -192,12 +195,32 @@ class MongoDBQueryGenerator:
                         print(error_message)
                         return None, error_message, context
 
+                # Schema check: catches wrong collections/fields before any database round trip
+                validation_errors = self.validator.validate(parsed_query) if self.validator else []
+                if not validation_errors:
+                    print(f"Tentativo {attempt + 1} riuscito: JSON valido.")
+                    print(llm_output_text)
+                    return llm_output_text, None, context
+
+                json_error_for_retry = "The query does not match the MongoDB Schema:\n" + "\n".join(f"- {error}" for error in validation_errors)
+                if attempt < self.max_retries:
+                    print(f"Tentativo {attempt + 1} fallito: query non conforme allo schema. Errore: {json_error_for_retry}")
+                    print(llm_output_text)
+                    continue
+                else:
+                    error_message = (f"La query generata non è conforme allo schema dopo {self.max_retries + 1} tentativi.\n"
+                                     f"Ultimo errore di validazione: {json_error_for_retry}\n"
+                                     f"Ultimo Output LLM:\n---\n{llm_output_text}\n---")
+                    print(error_message)
+                    return None, error_message, context
+
             except Exception as e:
                 error_message = f"Errore durante la generazione della query: {e}"
                 print(error_message)
                 return None, error_message, context
 
     def retrieve_context(self, user_instruction: str, n_results: int = 3) -> str:
+        # embedding_model is a SentenceTransformer or an EmbeddingClient of the shared embedding server
         query_embedding = self.embedding_model.encode(user_instruction)
         results = self.chroma_collection.query(query_embeddings=[query_embedding], n_results=n_results, include=["documents", "metadatas", "distances"])
         documents = results["documents"][0]
@@ -0,0 +1,205 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from src.query_engine.query_executor import execute_mongodb_query
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    user TEXT,
+    source TEXT NOT NULL,
+    instruction TEXT NOT NULL,
+    query_json TEXT,
+    executed_query_json TEXT,
+    context_docs TEXT,
+    latency_ms REAL,
+    row_count INTEGER,
+    success INTEGER NOT NULL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS query_history_created ON query_history (created_at);
+"""
+
+# External-content FTS5 index over the instructions, kept in sync by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS query_history_fts USING fts5(
+    instruction, content='query_history', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS query_history_ai AFTER INSERT ON query_history BEGIN
+    INSERT INTO query_history_fts(rowid, instruction) VALUES (new.id, new.instruction);
+END;
+CREATE TRIGGER IF NOT EXISTS query_history_ad AFTER DELETE ON query_history BEGIN
+    INSERT INTO query_history_fts(query_history_fts, rowid, instruction) VALUES ('delete', old.id, old.instruction);
+END;
+"""
+
+_COLUMNS = ("id", "created_at", "user", "source", "instruction", "query_json", "executed_query_json", "context_docs",
+            "latency_ms", "row_count", "success", "error")
+
+
+class QueryHistory:
+    """SQLite store of the executed queries: instruction, generated JSON, context documents and outcome.
+
+    Instructions are searchable with SQLite FTS5 (prefix match of every word,
+    ranked by bm25), falling back to LIKE when the SQLite build lacks FTS5.
+    Any stored query can be executed again without calling the LLM.
+
+    query_json is the generator's output as returned (None when the generation
+    failed); executed_query_json is the query actually run, after the pipeline
+    optimizer, when it differs.
+    """
+
+    def __init__(self, path: str = "query_history.db"):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(_SCHEMA)
+            migrated = self._migrate()
+            indexed = self._connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'query_history_fts'").fetchone()
+            try:
+                self._connection.executescript(_FTS_SCHEMA)
+                if migrated or not indexed:
+                    # Index the rows stored before the FTS table or its triggers existed
+                    self._connection.execute("INSERT INTO query_history_fts(query_history_fts) VALUES ('rebuild')")
+                self.full_text = True
+            except sqlite3.OperationalError:
+                self.full_text = False
+
+    def _migrate(self) -> bool:
+        columns = {row["name"] for row in self._connection.execute("PRAGMA table_info(query_history)")}
+        if "executed_query_json" in columns:
+            return False
+        # Created when query_json was required and the executed query was not kept: rebuild the
+        # table (SQLite cannot drop a NOT NULL constraint); the caller rebuilds the FTS index
+        old_columns = ", ".join(column for column in _COLUMNS if column != "executed_query_json")
+        self._connection.executescript(f"""
+            DROP TRIGGER IF EXISTS query_history_ai;
+            DROP TRIGGER IF EXISTS query_history_ad;
+            DROP INDEX IF EXISTS query_history_created;
+            ALTER TABLE query_history RENAME TO query_history_old;
+            {_SCHEMA}
+            INSERT INTO query_history ({old_columns}) SELECT {old_columns} FROM query_history_old;
+            DROP TABLE query_history_old;
+        """)
+        return True
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = {column: row[column] for column in _COLUMNS}
+        entry["context_docs"] = json.loads(entry["context_docs"]) if entry["context_docs"] else []
+        entry["success"] = bool(entry["success"])
+        return entry
+
+    def record(self, instruction: str, query_json: str, context_docs: List[str] = None, latency_ms: float = None,
+               row_count: int = None, success: bool = True, error: str = None, user: str = None, source: str = "llm",
+               executed_query_json: str = None) -> int:
+        """Store an interaction and return its id.
+
+        Args:
+            instruction: User request in natural language
+            query_json: Query as generated (JSON string or dict), None if the generation failed
+            context_docs: Names of the RAG documents used to generate it
+            latency_ms: End-to-end time of the interaction
+            row_count: Rows returned by the execution
+            success: Whether the execution succeeded
+            error: Error message of a failed generation or execution
+            user: User who asked, when known
+            source: "llm" for generated queries, "rerun" for re-executions
+            executed_query_json: Query actually executed, when it differs from query_json (e.g. optimized)
+        """
+        if query_json is not None and not isinstance(query_json, str):
+            query_json = json.dumps(query_json, ensure_ascii=False, default=str)
+        if executed_query_json is not None and not isinstance(executed_query_json, str):
+            executed_query_json = json.dumps(executed_query_json, ensure_ascii=False, default=str)
+        if executed_query_json == query_json:
+            executed_query_json = None
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO query_history (created_at, user, source, instruction, query_json, executed_query_json, context_docs, "
+                "latency_ms, row_count, success, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (datetime.now().isoformat(timespec="seconds"), user, source, instruction, query_json, executed_query_json,
+                 json.dumps(context_docs or [], ensure_ascii=False), latency_ms, row_count, int(bool(success)), error)
+            )
+            return cursor.lastrowid
+
+    def get(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(f"SELECT {', '.join(_COLUMNS)} FROM query_history WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def search(self, text: str = None, limit: int = 20, user: str = None, source: str = None,
+               successful_only: bool = False) -> List[Dict[str, Any]]:
+        """Entries whose instruction contains every word of text (most relevant first), or the latest entries without text."""
+        conditions, params = [], []
+        if source:
+            conditions.append("h.source = ?")
+            params.append(source)
+        if user:
+            conditions.append("h.user = ?")
+            params.append(user)
+        if successful_only:
+            conditions.append("h.success = 1")
+        words = re.findall(r"\w+", text or "")
+        columns = ", ".join(f"h.{column}" for column in _COLUMNS)
+
+        if words and self.full_text:
+            match = " ".join(f'"{word}"*' for word in words)
+            sql = (f"SELECT {columns} FROM query_history_fts f JOIN query_history h ON h.id = f.rowid "
+                   f"WHERE query_history_fts MATCH ?{''.join(' AND ' + c for c in conditions)} "
+                   f"ORDER BY bm25(query_history_fts), h.id DESC LIMIT ?")
+            params = [match] + params
+        else:
+            for word in words:
+                conditions.append("h.instruction LIKE ?")
+                params.append(f"%{word}%")
+            where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+            sql = f"SELECT {columns} FROM query_history h {where}ORDER BY h.id DESC LIMIT ?"
+        with self._lock:
+            rows = self._connection.execute(sql, params + [limit]).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def rerun(self, entry_id: int, db, db_schema: Dict[str, Any] = None, user: str = None):
+        """Execute a stored query again, without the LLM, and record the re-execution.
+
+        The query that ran (executed_query_json, or query_json when they match) is executed as is.
+
+        Returns:
+            tuple:
+                - dict: The stored entry, or None if it does not exist
+                - dict: Result of execute_mongodb_query, or None
+        """
+        entry = self.get(entry_id)
+        if entry is None:
+            return None, None
+        started = time.perf_counter()
+        stored_query = entry["executed_query_json"] or entry["query_json"]
+        if stored_query is None:
+            return entry, {"success": False, "data": None, "error": "No query stored: the generation failed", "injected_projection": None}
+        try:
+            query_dict = json.loads(stored_query)
+        except json.JSONDecodeError as e:
+            return entry, {"success": False, "data": None, "error": f"Stored query is not valid JSON: {e}", "injected_projection": None}
+        query_result = execute_mongodb_query(db, query_dict, instruction=entry["instruction"], db_schema=db_schema)
+        self.record(
+            entry["instruction"], entry["query_json"], executed_query_json=entry["executed_query_json"], context_docs=entry["context_docs"],
+            latency_ms=round((time.perf_counter() - started) * 1000, 1),
+            row_count=len(query_result["data"] or []) if query_result["success"] else None,
+            success=query_result["success"], error=query_result["error"], user=user, source="rerun"
+        )
+        return entry, query_result
+
+    def delete(self, entry_id: int):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM query_history WHERE id = ?", (entry_id,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
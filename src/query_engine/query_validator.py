@@ -0,0 +1,360 @@
+from datetime import datetime
+from typing import Dict, Any, List
+
+# Query operators accepted inside a filter document
+_COMPARISON_OPERATORS = {"$eq", "$ne", "$gt", "$gte", "$lt", "$lte"}
+_LIST_OPERATORS = {"$in", "$nin", "$all"}
+_LOGICAL_OPERATORS = {"$and", "$or", "$nor"}
+_OTHER_FIELD_OPERATORS = {"$exists", "$regex", "$options", "$size", "$elemMatch", "$not", "$type", "$mod"}
+
+# Aggregation stages the executor is expected to receive
+_KNOWN_STAGES = {
+    "$match", "$project", "$group", "$sort", "$limit", "$skip", "$lookup", "$unwind",
+    "$addFields", "$set", "$unset", "$count", "$replaceRoot", "$replaceWith", "$facet",
+    "$bucket", "$bucketAuto", "$sample", "$sortByCount",
+}
+
+# Marker for fields whose type is not known statically (computed by the pipeline)
+_ANY = "any"
+
+
+class QueryValidator:
+    def __init__(self, db_schema: Dict[str, Any]):
+        """Initialize the validator from the parsed MongoDB schema (config.DB_SCHEMA).
+
+        Args:
+            db_schema: Schema dictionary with a "collections" list
+        """
+        self.collections = {}
+        for collection in db_schema.get("collections", []):
+            properties = collection.get("document", {}).get("properties", {})
+            self.collections[collection["name"]] = {
+                field: spec.get("bsonType", _ANY) for field, spec in properties.items()
+            }
+
+    def validate(self, query_dict: Dict[str, Any]) -> List[str]:
+        """Check a generated query against the schema without touching the database.
+
+        Args:
+            query_dict: Parsed JSON produced by the LLM
+
+        Returns:
+            List of human readable errors, empty if the query is valid
+        """
+        if not isinstance(query_dict, dict):
+            return ["The query must be a JSON object"]
+        if query_dict.get("error_type") == "irrelevant_request":
+            return []
+
+        errors = []
+        collection_name = query_dict.get("collection_name")
+        operation_type = query_dict.get("operation_type")
+        arguments = query_dict.get("arguments")
+
+        if collection_name not in self.collections:
+            errors.append(f"Unknown collection_name '{collection_name}'. Valid collections: {', '.join(self.collections)}")
+            return errors
+        if not isinstance(arguments, dict):
+            errors.append("'arguments' must be a JSON object")
+            return errors
+
+        fields = dict(self.collections[collection_name])
+
+        if operation_type == "find":
+            unexpected = set(arguments) - {"filter", "projection"}
+            if unexpected:
+                errors.append(f"Unexpected keys in find arguments: {', '.join(sorted(unexpected))} (only 'filter' and 'projection' are allowed)")
+            self._check_filter(arguments.get("filter", {}), fields, "filter", errors)
+            projection = arguments.get("projection")
+            if projection is not None:
+                self._check_projection(projection, fields, "projection", errors)
+        elif operation_type == "aggregate":
+            pipeline = arguments.get("pipeline")
+            if not isinstance(pipeline, list):
+                errors.append("'arguments.pipeline' must be a list of stages")
+            else:
+                self._check_pipeline(pipeline, fields, "pipeline", errors)
+        else:
+            errors.append(f"Unsupported operation_type '{operation_type}' (must be 'find' or 'aggregate')")
+
+        return errors
+
+    # ---- Field paths ----
+    def _check_path(self, path: str, fields, location: str, errors: List[str]):
+        if fields is None or not isinstance(path, str) or not path:
+            return
+        parts = path.split(".")
+        field_type = fields.get(parts[0])
+        if field_type is None:
+            errors.append(f"{location}: field '{parts[0]}' does not exist here. Available fields: {', '.join(sorted(fields))}")
+        elif isinstance(field_type, dict) and len(parts) > 1 and parts[1] not in field_type:
+            errors.append(f"{location}: field '{parts[1]}' does not exist in the joined documents of '{parts[0]}'")
+
+    def _field_type(self, path: str, fields):
+        if fields is None:
+            return _ANY
+        parts = path.split(".")
+        field_type = fields.get(parts[0], _ANY)
+        if isinstance(field_type, dict):
+            return field_type.get(parts[1], _ANY) if len(parts) > 1 else _ANY
+        return field_type if len(parts) == 1 else _ANY
+
+    def _check_expression(self, expr, fields, location: str, errors: List[str]):
+        if isinstance(expr, str):
+            if expr.startswith("$") and not expr.startswith("$$"):
+                self._check_path(expr[1:], fields, location, errors)
+        elif isinstance(expr, dict):
+            for value in expr.values():
+                self._check_expression(value, fields, location, errors)
+        elif isinstance(expr, list):
+            for item in expr:
+                self._check_expression(item, fields, location, errors)
+
+    # ---- Values ----
+    def _check_value_type(self, path: str, value, fields, location: str, errors: List[str]):
+        field_type = self._field_type(path, fields)
+        if value is None or field_type == _ANY or isinstance(value, (dict, list)):
+            return
+        if field_type == "number":
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                errors.append(f"{location}: '{path}' is a number but is compared with {value!r}")
+        elif field_type == "string":
+            if not isinstance(value, str):
+                errors.append(f"{location}: '{path}' is a string but is compared with {value!r}")
+        elif field_type == "date":
+            if not isinstance(value, str) or not _is_iso_date(value):
+                errors.append(f"{location}: '{path}' is a date and must be compared with an ISO date string like '2023-01-01T00:00:00.000+00:00', got {value!r}")
+
+    def _check_operator(self, path: str, operator: str, value, fields, location: str, errors: List[str]):
+        where = f"{location}.{path}.{operator}"
+        if operator in _COMPARISON_OPERATORS:
+            self._check_value_type(path, value, fields, where, errors)
+        elif operator in _LIST_OPERATORS:
+            if not isinstance(value, list):
+                errors.append(f"{where} expects a list of values, got {type(value).__name__}")
+            else:
+                for item in value:
+                    self._check_value_type(path, item, fields, where, errors)
+        elif operator == "$exists":
+            if not isinstance(value, (bool, int)):
+                errors.append(f"{where} expects true or false")
+        elif operator in ("$regex", "$options"):
+            if not isinstance(value, str):
+                errors.append(f"{where} expects a string")
+        elif operator == "$size":
+            if isinstance(value, bool) or not isinstance(value, int):
+                errors.append(f"{where} expects an integer")
+        elif operator == "$elemMatch":
+            if not isinstance(value, dict):
+                errors.append(f"{where} expects a filter document")
+        elif operator == "$not":
+            if isinstance(value, dict):
+                self._check_field_condition(path, value, fields, location, errors)
+        elif operator not in _OTHER_FIELD_OPERATORS:
+            errors.append(f"{where}: unknown query operator '{operator}'")
+
+    def _check_field_condition(self, path: str, condition, fields, location: str, errors: List[str]):
+        if isinstance(condition, dict) and condition and all(k.startswith("$") for k in condition):
+            for operator, value in condition.items():
+                self._check_operator(path, operator, value, fields, location, errors)
+        else:
+            self._check_value_type(path, condition, fields, location, errors)
+
+    # ---- Documents ----
+    def _check_filter(self, filter_doc, fields, location: str, errors: List[str]):
+        if not isinstance(filter_doc, dict):
+            errors.append(f"{location} must be a JSON object")
+            return
+        for key, value in filter_doc.items():
+            if key in _LOGICAL_OPERATORS:
+                if not isinstance(value, list) or not all(isinstance(v, dict) for v in value):
+                    errors.append(f"{location}.{key} expects a list of filter documents")
+                    continue
+                for sub_filter in value:
+                    self._check_filter(sub_filter, fields, f"{location}.{key}", errors)
+            elif key == "$expr":
+                self._check_expression(value, fields, f"{location}.$expr", errors)
+            elif key.startswith("$"):
+                errors.append(f"{location}: operator '{key}' is not allowed at the top level of a filter")
+            else:
+                self._check_path(key, fields, location, errors)
+                self._check_field_condition(key, value, fields, location, errors)
+
+    def _check_projection(self, projection, fields, location: str, errors: List[str]):
+        if not isinstance(projection, dict):
+            errors.append(f"{location} must be a JSON object")
+            return
+        for key, value in projection.items():
+            if value in (0, 1, True, False):
+                if key != "_id":
+                    self._check_path(key, fields, location, errors)
+            else:
+                self._check_expression(value, fields, f"{location}.{key}", errors)
+
+    def _check_pipeline(self, pipeline: List[Any], fields, location: str, errors: List[str]):
+        # `renamed` is True once $group/$project reshaped the documents: the LLM often sorts
+        # on the original name there, which the pipeline optimizer rewrites instead of rejecting
+        renamed = False
+
+        for index, stage in enumerate(pipeline):
+            where = f"{location}[{index}]"
+            if not isinstance(stage, dict) or len(stage) != 1:
+                errors.append(f"{where} must be an object with exactly one stage operator")
+                continue
+            operator, spec = next(iter(stage.items()))
+            if operator not in _KNOWN_STAGES:
+                errors.append(f"{where}: unknown aggregation stage '{operator}'")
+                fields = None
+                continue
+            where = f"{where}.{operator}"
+
+            if operator == "$match":
+                self._check_filter(spec, fields, where, errors)
+
+            elif operator == "$lookup":
+                fields = self._check_lookup(spec, fields, where, errors)
+
+            elif operator == "$unwind":
+                path = spec.get("path") if isinstance(spec, dict) else spec
+                if not isinstance(path, str) or not path.startswith("$"):
+                    errors.append(f"{where} expects a field path starting with '$'")
+                else:
+                    self._check_path(path[1:], fields, where, errors)
+                    if isinstance(spec, dict) and spec.get("includeArrayIndex") and fields is not None:
+                        fields[spec["includeArrayIndex"]] = "number"
+
+            elif operator == "$sort":
+                if not isinstance(spec, dict):
+                    errors.append(f"{where} must be a JSON object")
+                elif not renamed:
+                    for key in spec:
+                        self._check_path(key, fields, where, errors)
+
+            elif operator == "$group":
+                if not isinstance(spec, dict) or "_id" not in spec:
+                    errors.append(f"{where} requires an '_id' key")
+                else:
+                    self._check_expression(spec, fields, where, errors)
+                    fields = {key: _ANY for key in spec}
+                    renamed = True
+
+            elif operator == "$project":
+                if not isinstance(spec, dict):
+                    errors.append(f"{where} must be a JSON object")
+                else:
+                    self._check_projection(spec, fields, where, errors)
+                    fields = self._project_fields(spec, fields)
+                    renamed = True
+
+            elif operator in ("$addFields", "$set"):
+                if not isinstance(spec, dict):
+                    errors.append(f"{where} must be a JSON object")
+                else:
+                    self._check_expression(spec, fields, where, errors)
+                    if fields is not None:
+                        fields.update({key.split(".")[0]: _ANY for key in spec})
+
+            elif operator == "$unset":
+                if fields is not None:
+                    for key in ([spec] if isinstance(spec, str) else spec or []):
+                        fields.pop(str(key).split(".")[0], None)
+
+            elif operator == "$count":
+                fields = {spec: "number"} if isinstance(spec, str) else None
+                renamed = True
+
+            elif operator in ("$replaceRoot", "$replaceWith"):
+                new_root = spec.get("newRoot") if operator == "$replaceRoot" and isinstance(spec, dict) else spec
+                self._check_expression(new_root, fields, where, errors)
+                promoted = None
+                if isinstance(new_root, str) and new_root.startswith("$") and fields is not None:
+                    promoted = fields.get(new_root[1:])
+                fields = dict(promoted) if isinstance(promoted, dict) else None
+
+            elif operator in ("$limit", "$skip"):
+                if isinstance(spec, bool) or not isinstance(spec, int):
+                    errors.append(f"{where} expects an integer")
+
+            else:
+                # $facet, $bucket, ... : check what we can, then stop tracking fields
+                self._check_expression(spec, fields, where, errors)
+                fields = None
+
+    def _check_lookup(self, spec, fields, location: str, errors: List[str]):
+        if not isinstance(spec, dict):
+            errors.append(f"{location} must be a JSON object")
+            return fields
+        foreign_collection = spec.get("from")
+        if foreign_collection not in self.collections:
+            errors.append(f"{location}.from: unknown collection '{foreign_collection}'")
+            foreign_fields = None
+        else:
+            foreign_fields = self.collections[foreign_collection]
+
+        if "localField" in spec:
+            self._check_path(spec["localField"], fields, f"{location}.localField", errors)
+        if "foreignField" in spec:
+            self._check_path(spec["foreignField"], foreign_fields, f"{location}.foreignField", errors)
+        if "let" in spec:
+            self._check_expression(spec["let"], fields, f"{location}.let", errors)
+        if "pipeline" in spec:
+            if not isinstance(spec["pipeline"], list):
+                errors.append(f"{location}.pipeline must be a list of stages")
+            else:
+                self._check_pipeline(spec["pipeline"], dict(foreign_fields) if foreign_fields else None, f"{location}.pipeline", errors)
+
+        alias = spec.get("as")
+        if not isinstance(alias, str) or not alias:
+            errors.append(f"{location}.as is required")
+            return fields
+        if fields is not None:
+            fields = dict(fields)
+            # Sub-pipelines can reshape the joined documents, so only plain joins keep their schema
+            fields[alias.split(".")[0]] = dict(foreign_fields) if foreign_fields and "pipeline" not in spec else _ANY
+        return fields
+
+    def _project_fields(self, projection: Dict[str, Any], fields):
+        included = {k: v for k, v in projection.items() if k != "_id"}
+        is_exclusion = bool(included) and all(v in (0, False) for v in included.values())
+        if is_exclusion:
+            if fields is None:
+                return None
+            remaining = dict(fields)
+            for key in projection:
+                remaining.pop(key, None)
+            return remaining
+
+        new_fields = {}
+        for key, value in projection.items():
+            if key == "_id" and value in (0, False):
+                continue
+            top = key.split(".")[0]
+            if value in (1, True) and fields is not None and "." not in key:
+                new_fields[top] = fields.get(top, _ANY)
+            else:
+                new_fields[top] = _ANY
+        if projection.get("_id", 1) not in (0, False):
+            new_fields.setdefault("_id", "objectId")
+        return new_fields
+
+
+def _is_iso_date(value: str) -> bool:
+    try:
+        datetime.fromisoformat(value)
+        return True
+    except ValueError:
+        return False
+
+
+# Helper function for direct validation
+def validate_query(db_schema: Dict[str, Any], query_dict: Dict[str, Any]) -> List[str]:
+    """Validate a generated query against a MongoDB schema.
+
+    Args:
+        db_schema: Parsed MongoDB schema (config.DB_SCHEMA)
+        query_dict: MongoDB query dictionary to validate
+
+    Returns:
+        List of validation errors, empty if the query is valid
+    """
+    return QueryValidator(db_schema).validate(query_dict)
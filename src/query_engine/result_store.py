@@ -0,0 +1,292 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from src.export.cohort_export import normalize_frame
+
+
+# Operators of the grid filters: (column, operator, value)
+FILTER_OPERATORS = ("contiene", "=", "!=", ">", ">=", "<", "<=")
+_COMPARISONS = {"=": pc.equal, "!=": pc.not_equal, ">": pc.greater, ">=": pc.greater_equal, "<": pc.less, "<=": pc.less_equal}
+
+
+class ResultTooLargeError(ValueError):
+    pass
+
+
+class ResultSession:
+    """Handle of a session in the store, kept in st.session_state.
+
+    When Streamlit discards the session state the handle is garbage collected
+    and its finalizer releases every result of the session.
+    """
+
+    def __init__(self, store: "ResultStore"):
+        self.session_id = uuid.uuid4().hex
+        self._finalizer = weakref.finalize(self, store.release_session, self.session_id)
+
+    def close(self):
+        self._finalizer()
+
+
+class ResultStore:
+    """Process-wide store of the full query results of every session.
+
+    Results smaller than memory_threshold bytes stay in memory as DataFrames;
+    larger ones are written to an uncompressed Arrow IPC file and read back
+    memory-mapped without copies, so they cost page cache rather than heap. Every result counts toward the quota
+    of its session and toward a global quota (in-memory size, or file size when
+    spilled): exceeding one evicts the least recently used results first. The
+    results of a session are released when its ResultSession is collected or
+    after idle_seconds without access.
+    """
+
+    def __init__(self, memory_threshold: int = 8 * 1024 ** 2, session_quota: int = 256 * 1024 ** 2,
+                 global_quota: int = 2 * 1024 ** 3, idle_seconds: float = 3600, spill_dir: str = None):
+        self.memory_threshold = memory_threshold
+        self.session_quota = session_quota
+        self.global_quota = global_quota
+        self.idle_seconds = idle_seconds
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="llm2query_results_")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # Last (sort, filters) row order computed per result, reused while paging
+        self._views: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def open_session(self) -> ResultSession:
+        return ResultSession(self)
+
+    # ---- Writing ----
+    def put(self, session_id: str, df: pd.DataFrame) -> str:
+        """Store a result of a session and return its id.
+
+        Raises:
+            ResultTooLargeError: If the result alone exceeds the session quota
+        """
+        self.expire_idle()
+        result_id = uuid.uuid4().hex
+        size = int(df.memory_usage(deep=True).sum())
+        entry = {"session": session_id, "rows": len(df), "columns": list(map(str, df.columns)),
+                 "data": None, "path": None, "bytes": size, "last_access": time.monotonic()}
+
+        if size > self.memory_threshold:
+            path = os.path.join(self.spill_dir, f"{result_id}.arrow")
+            tmp_path = path + ".tmp"
+            try:
+                df = normalize_frame(df.copy())
+                df.columns = entry["columns"]
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=65536)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            entry["path"], entry["bytes"] = path, os.path.getsize(path)
+        else:
+            entry["data"] = df
+
+        if entry["bytes"] > self.session_quota:
+            self._remove_files(entry)
+            raise ResultTooLargeError(
+                f"Il risultato occupa {entry['bytes'] / 1024 ** 2:.0f} MB, oltre il limite di "
+                f"{self.session_quota / 1024 ** 2:.0f} MB per sessione"
+            )
+
+        with self._lock:
+            self._entries[result_id] = entry
+            self._evict(lambda e: e["session"] == session_id, self.session_quota, keep=result_id)
+            self._evict(lambda e: True, self.global_quota, keep=result_id)
+        return result_id
+
+    # ---- Reading ----
+    def _touch(self, result_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                entry["last_access"] = time.monotonic()
+                self._entries.move_to_end(result_id)
+            return entry
+
+    def info(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """Rows, columns, size and storage of a result, or None if it was evicted."""
+        entry = self._touch(result_id)
+        if entry is None:
+            return None
+        return {"rows": entry["rows"], "columns": entry["columns"], "bytes": entry["bytes"], "spilled": entry["path"] is not None}
+
+    def _read_spilled(self, path: str) -> pa.Table:
+        # Zero-copy: the buffers of the table point into the mapped file
+        return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+    def table(self, result_id: str, columns: List[str] = None) -> Optional[pa.Table]:
+        """The result as an Arrow table (memory-mapped when spilled), or None if it was evicted."""
+        entry = self._touch(result_id)
+        if entry is None:
+            return None
+        if entry["path"] is not None:
+            table = self._read_spilled(entry["path"])
+            return table.select(columns) if columns is not None else table
+        data = entry["data"] if columns is None else entry["data"][columns]
+        return pa.Table.from_pandas(normalize_frame(data.copy()), preserve_index=False)
+
+    def get(self, result_id: str) -> Optional[pd.DataFrame]:
+        """The full result as a DataFrame, or None if it was evicted."""
+        entry = self._touch(result_id)
+        if entry is None:
+            return None
+        if entry["path"] is not None:
+            return self._read_spilled(entry["path"]).to_pandas()
+        return entry["data"]
+
+    def head(self, result_id: str, n: int = 20) -> Optional[pd.DataFrame]:
+        """First n rows of a result, converting only those rows of a spilled file."""
+        entry = self._touch(result_id)
+        if entry is None:
+            return None
+        if entry["path"] is None:
+            return entry["data"].head(n)
+        return self._read_spilled(entry["path"]).slice(0, n).to_pandas()
+
+    # ---- Paging ----
+    def _filter_mask(self, table: pa.Table, column: str, operator: str, value: Any):
+        values = table.column(column)
+        if operator == "contiene":
+            return pc.match_substring(pc.cast(values, pa.string()), str(value), ignore_case=True)
+        if operator not in _COMPARISONS:
+            raise ValueError(f"Operatore di filtro non supportato: {operator}")
+        if pa.types.is_integer(values.type) or pa.types.is_floating(values.type):
+            value = float(value)
+        elif pa.types.is_timestamp(values.type) or pa.types.is_date(values.type):
+            value = pa.scalar(pd.Timestamp(value).to_pydatetime(), type=pa.timestamp("us")).cast(values.type)
+        elif pa.types.is_boolean(values.type):
+            value = str(value).strip().lower() in ("true", "1", "si", "sì", "yes")
+        else:
+            values, value = pc.cast(values, pa.string()), str(value)
+        return _COMPARISONS[operator](values, value)
+
+    def _row_order(self, result_id: str, table: pa.Table, sort_by: str, descending: bool, filters) -> pa.Array:
+        """Row indices of the result after filtering and sorting, cached for the last view of each result."""
+        view_key = (sort_by, descending, tuple(tuple(f) for f in filters or ()))
+        with self._lock:
+            cached = self._views.get(result_id)
+        if cached is not None and cached[0] == view_key:
+            return cached[1]
+
+        indices = pa.array(np.arange(table.num_rows, dtype=np.int64))
+        if filters:
+            mask = None
+            for column, operator, value in filters:
+                condition = pc.fill_null(self._filter_mask(table, column, operator, value), False)
+                mask = condition if mask is None else pc.and_(mask, condition)
+            indices = pc.filter(indices, mask)
+        if sort_by:
+            keys = pc.take(table.column(sort_by), indices)
+            order = pc.array_sort_indices(keys, order="descending" if descending else "ascending", null_placement="at_end")
+            indices = pc.take(indices, order)
+        with self._lock:
+            self._views[result_id] = (view_key, indices)
+        return indices
+
+    def page(self, result_id: str, offset: int = 0, limit: int = 50, sort_by: str = None,
+             descending: bool = False, filters: List[tuple] = None):
+        """One page of a result, filtered and sorted on the stored copy.
+
+        Only the rows of the page are converted to pandas; the row order of the
+        last (sort, filters) combination is kept so moving between pages does
+        not filter and sort again.
+
+        Args:
+            result_id: Id returned by put
+            offset: First row of the page (after filtering and sorting)
+            limit: Rows per page
+            sort_by: Column to sort by, or None for the original order
+            descending: Sort direction
+            filters: (column, operator, value) conditions combined in AND, operator in FILTER_OPERATORS
+
+        Returns:
+            tuple (DataFrame of the page, number of rows matching the filters), or None if the result was evicted
+
+        Raises:
+            ValueError: On an unknown operator or a value not comparable with the column
+        """
+        table = self.table(result_id)
+        if table is None:
+            return None
+        try:
+            indices = self._row_order(result_id, table, sort_by, descending, filters)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, TypeError) as e:
+            raise ValueError(f"Filtro o ordinamento non applicabile: {e}") from e
+        page_indices = indices[offset:offset + limit]
+        return table.take(page_indices).to_pandas(), len(indices)
+
+    # ---- Eviction ----
+    def _remove_files(self, entry: Dict[str, Any]):
+        if entry["path"] and os.path.exists(entry["path"]):
+            os.remove(entry["path"])
+
+    def _evict(self, selector, quota: int, keep: str = None):
+        """Drop the least recently used results selected until they fit the quota (lock held)."""
+        selected = [result_id for result_id, entry in self._entries.items() if selector(entry)]
+        used = sum(self._entries[result_id]["bytes"] for result_id in selected)
+        for result_id in selected:
+            if used <= quota:
+                break
+            if result_id == keep:
+                continue
+            entry = self._entries.pop(result_id)
+            self._views.pop(result_id, None)
+            used -= entry["bytes"]
+            self._remove_files(entry)
+
+    def discard(self, result_id: str):
+        with self._lock:
+            entry = self._entries.pop(result_id, None)
+            self._views.pop(result_id, None)
+        if entry is not None:
+            self._remove_files(entry)
+
+    def release_session(self, session_id: str):
+        """Drop every result of a session."""
+        with self._lock:
+            result_ids = [result_id for result_id, entry in self._entries.items() if entry["session"] == session_id]
+        for result_id in result_ids:
+            self.discard(result_id)
+
+    def expire_idle(self):
+        """Release the sessions whose results were not accessed for idle_seconds."""
+        now = time.monotonic()
+        with self._lock:
+            last_access: Dict[str, float] = {}
+            for entry in self._entries.values():
+                last_access[entry["session"]] = max(last_access.get(entry["session"], 0), entry["last_access"])
+        for session_id, accessed_at in last_access.items():
+            if now - accessed_at > self.idle_seconds:
+                self.release_session(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "results": len(entries),
+            "sessions": len({entry["session"] for entry in entries}),
+            "memory_bytes": sum(entry["bytes"] for entry in entries if entry["path"] is None),
+            "spilled_bytes": sum(entry["bytes"] for entry in entries if entry["path"] is not None),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._views.clear()
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        os.makedirs(self.spill_dir, exist_ok=True)
@@ -0,0 +1,9 @@
+import mongomock
+import pytest
+from src.query_engine.query_executor import MongoDBQueryExecutor
+
+
+@pytest.fixture(autouse=True)
+def accept_mongomock_database(monkeypatch):
+    """Let MongoDBQueryExecutor run on the mongomock databases of the tests."""
+    monkeypatch.setattr(MongoDBQueryExecutor, "DATABASE_TYPES", MongoDBQueryExecutor.DATABASE_TYPES + (mongomock.Database,))
@@ -0,0 +1,114 @@
+import json
+from datetime import datetime
+import mongomock
+import pandas as pd
+from fastapi.testclient import TestClient
+from src.api import server
+from src.api.server import create_app
+
+DB_SCHEMA = {"collections": [
+    {"name": "ANAGRAFICA", "document": {"properties": {
+        "ID_PAZ": {"bsonType": "string"}, "SESSO": {"bsonType": "string"}, "PESO": {"bsonType": "number"}
+    }}},
+    {"name": "LISTA_EVENTI", "document": {"properties": {
+        "ID_PAZ": {"bsonType": "string"}, "TIPO_EVENTO": {"bsonType": "string"}, "DATA": {"bsonType": "date"}
+    }}},
+]}
+
+
+class FakeGenerator:
+    """Returns a fixed query, like MongoDBQueryGenerator.generate_query."""
+
+    def __init__(self, query):
+        self.query = query
+
+    def generate_query(self, instruction):
+        return json.dumps(self.query), None, ["ANAGRAFICA.txt"]
+
+
+def _client(query=None):
+    db = mongomock.MongoClient().get_database("CAMPANIA_SALUTE")
+    db.ANAGRAFICA.insert_many([
+        {"ID_PAZ": "1_1", "SESSO": "M", "PESO": 80.5},
+        {"ID_PAZ": "1_2", "SESSO": "F", "PESO": float("nan")},
+        {"ID_PAZ": "1_3"},
+    ])
+    db.LISTA_EVENTI.insert_many([
+        {"ID_PAZ": "1_1", "TIPO_EVENTO": "ANAMNESI", "DATA": datetime(2024, 1, 10)},
+        {"ID_PAZ": "1_2", "TIPO_EVENTO": "ANAMNESI", "DATA": datetime(2024, 2, 3)},
+        {"ID_PAZ": "1_2", "TIPO_EVENTO": "RICOVERO", "DATA": datetime(2024, 2, 20)},
+    ])
+    query = query or {"collection_name": "ANAGRAFICA", "operation_type": "find",
+                      "arguments": {"filter": {}, "projection": {"_id": 0, "ID_PAZ": 1, "PESO": 1}}}
+    return TestClient(create_app(query_generator=FakeGenerator(query), db=db, db_schema=DB_SCHEMA, optimize=False))
+
+
+def test_ask_returns_valid_json_with_nan_as_null():
+    with _client() as client:
+        response = client.post("/ask", json={"instruction": "Peso dei pazienti"})
+        assert response.status_code == 200
+        body = json.loads(response.text)
+        assert body["rows"] == 3
+        assert {row["ID_PAZ"]: row.get("PESO") for row in body["data"]} == {"1_1": 80.5, "1_2": None, "1_3": None}
+
+
+def test_execute_ndjson_streams_metadata_then_rows():
+    with _client() as client:
+        response = client.post("/execute?format=ndjson", json={
+            "query": {"collection_name": "ANAGRAFICA", "operation_type": "find", "arguments": {"filter": {"SESSO": "M"}}}
+        })
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["success"] and lines[0]["rows"] == 1
+        assert lines[1]["ID_PAZ"] == "1_1"
+
+
+def test_execute_refuses_writes_and_invalid_queries():
+    with _client() as client:
+        for query in (
+            {"collection_name": "ANAGRAFICA", "operation_type": "aggregate", "arguments": {"pipeline": [{"$out": "ANAGRAFICA"}]}},
+            {"collection_name": "ANAGRAFICA", "operation_type": "aggregate", "arguments": {"pipeline": [
+                {"$facet": {"copia": [{"$merge": {"into": "ANAGRAFICA"}}]}}
+            ]}},
+            {"collection_name": "ANAGRAFICA", "operation_type": "delete_many", "arguments": {"filter": {}}},
+            {"collection_name": "ANAGRAFICA", "operation_type": "find", "arguments": {"filter": {"NON_ESISTE": 1}}},
+        ):
+            assert client.post("/execute", json={"query": query}).status_code == 422
+        assert client.post("/execute", json={"query": {"collection_name": "ANAGRAFICA", "operation_type": "find",
+                                                       "arguments": {"filter": {}}}}).status_code == 200
+
+
+def test_ask_refuses_generated_writes():
+    query = {"collection_name": "ANAGRAFICA", "operation_type": "aggregate", "arguments": {"pipeline": [{"$out": "ANAGRAFICA"}]}}
+    with _client(query) as client:
+        assert client.post("/ask", json={"instruction": "Copia i pazienti"}).status_code == 422
+
+
+def test_cached_analytic():
+    with _client() as client:
+        body = client.get("/analytics/distribuzione_sesso").json()
+        assert {row["Sesso"]: row["Numero Pazienti"] for row in body["data"]} == {"M": 1, "F": 1, "N/D": 1}
+        assert client.get("/analytics/non_esiste").status_code == 404
+
+
+def test_trend_passes_series_granularity_and_range(monkeypatch):
+    # mongomock has no $dateTrunc: the rollup reader is replaced, the routing and parsing are tested
+    calls = []
+
+    def fake_trend(db, series, granularity, start=None, end=None):
+        calls.append((series, granularity, start, end))
+        trend = pd.DataFrame({"ANAMNESI": [1, 1]}, index=pd.to_datetime(["2024-01-01", "2024-02-01"]))
+        trend.index.name = "Periodo"
+        return trend, None
+
+    monkeypatch.setattr(server, "get_andamento_temporale", fake_trend)
+    with _client() as client:
+        response = client.get("/analytics/andamento_temporale", params={
+            "series": "eventi", "granularity": "month", "start": "2024-01-01T00:00:00", "end": "2024-03-01T00:00:00"
+        })
+        assert response.status_code == 200
+        assert response.json()["data"] == [
+            {"Periodo": "2024-01-01T00:00:00", "ANAMNESI": 1}, {"Periodo": "2024-02-01T00:00:00", "ANAMNESI": 1}
+        ]
+        assert calls == [("eventi", "month", datetime(2024, 1, 1), datetime(2024, 3, 1))]
+        assert client.get("/analytics/andamento_temporale", params={"series": "sconosciuta"}).status_code == 404
+        assert client.get("/analytics/andamento_temporale", params={"series": "eventi", "granularity": "week"}).status_code == 422
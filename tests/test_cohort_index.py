@@ -0,0 +1,54 @@
+import mongomock
+import pytest
+from src.analytics.cohort_index import CohortIndex, CohortExpressionError
+
+
+def _index():
+    db = mongomock.MongoClient().get_database("CAMPANIA_SALUTE")
+    db.ANAGRAFICA.insert_many([{"ID_PAZ": "1_1"}, {"ID_PAZ": "1_2"}, {"ID_PAZ": "1_3"}])
+    db.ANAMNESI.insert_many([
+        {"ID_PAZ": "1_1", "DIABETE": "YES", "FUMO": "YES (current)"},
+        {"ID_PAZ": "1_2", "DIABETE": "YES", "FUMO": "NO"},
+    ])
+    db.LISTA_EVENTI.insert_many([{"ID_PAZ": "1_2", "TIPO_EVENTO": "RICOVERO"}])
+    attributes = {
+        "DIABETE": {"collection": "ANAMNESI", "match": {"DIABETE": {"$regex": "^YES"}}},
+        "FUMO": {"collection": "ANAMNESI", "match": {"FUMO": {"$regex": "^YES"}}},
+        "DECEDUTO": {"collection": "ANAGRAFICA", "match": {"DATA_DECESSO": {"$ne": None}}},
+    }
+    index = CohortIndex(db, attributes)
+    index.refresh()
+    return db, index
+
+
+def test_expressions():
+    _, index = _index()
+    assert index.patient_ids("DIABETE AND NOT FUMO") == ["1_2"]
+    assert index.count("DIABETE OR \"EVENTO:RICOVERO\"") == 2
+    assert index.count("NOT (DIABETE O DECEDUTO)") == 1
+    with pytest.raises(CohortExpressionError):
+        index.count("DIABETE AND (FUMO")
+    with pytest.raises(CohortExpressionError):
+        index.count("IPERTENSIONE")
+
+
+def test_refresh_adds_inserted_documents():
+    db, index = _index()
+    db.ANAGRAFICA.insert_one({"ID_PAZ": "1_4"})
+    db.ANAMNESI.insert_one({"ID_PAZ": "1_4", "DIABETE": "YES"})
+    index.refresh()
+    assert index.patient_ids("DIABETE") == ["1_1", "1_2", "1_4"]
+
+
+def test_rebuild_picks_up_updates_and_deletions():
+    db, index = _index()
+    db.ANAGRAFICA.update_one({"ID_PAZ": "1_3"}, {"$set": {"DATA_DECESSO": "2024-05-01"}})
+    db.ANAMNESI.delete_one({"ID_PAZ": "1_2"})
+    # Incremental refreshes only read new _ids
+    index.refresh_if_stale(0)
+    assert index.count("DECEDUTO") == 0 and index.count("DIABETE") == 2
+
+    index._rebuilt_at -= 10
+    index.refresh_if_stale(300, rebuild_after_seconds=5)
+    assert index.patient_ids("DECEDUTO") == ["1_3"]
+    assert index.patient_ids("DIABETE") == ["1_1"]
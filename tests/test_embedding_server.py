@@ -0,0 +1,79 @@
+import os
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+import numpy as np
+import pytest
+from src.embedding.embedding_server import EmbeddingServer, EmbeddingClient
+
+AUTHKEY = b"test-secret"
+
+
+class FakeModel:
+    """Embeds each sentence as [len(sentence), 1], like SentenceTransformer.encode."""
+
+    def __init__(self, fail=False, delay=0):
+        self.fail = fail
+        self.delay = delay
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("CUDA out of memory")
+        return np.array([[len(sentence), 1] for sentence in sentences])
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(model, **kwargs):
+        # AF_UNIX paths are limited to ~100 characters: pytest's tmp_path can be longer
+        directory = os.path.join(tempfile.mkdtemp(), "run")
+        server = EmbeddingServer(model, os.path.join(directory, "embedding.sock"), AUTHKEY, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        for _ in range(100):
+            if os.path.exists(server.address):
+                break
+            time.sleep(0.01)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_encode_through_authenticated_socket(serve):
+    server = serve(FakeModel())
+    assert stat.S_IMODE(os.stat(server.address).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(server.address)).st_mode) == 0o700
+    client = EmbeddingClient(server.address, authkey=AUTHKEY)
+    assert client.encode(["ab", "abcd"]).tolist() == [[2, 1], [4, 1]]
+    assert client.encode("abc").tolist() == [3, 1]
+
+
+def test_wrong_authkey_is_refused(serve):
+    server = serve(FakeModel())
+    with pytest.raises(AuthenticationError):
+        EmbeddingClient(server.address, authkey=b"other").encode("abc")
+    # The refused peer does not stop the server
+    assert EmbeddingClient(server.address, authkey=AUTHKEY).encode("abc").tolist() == [3, 1]
+
+
+def test_model_error_is_answered_and_batcher_survives(serve):
+    model = FakeModel(fail=True)
+    server = serve(model)
+    client = EmbeddingClient(server.address, authkey=AUTHKEY)
+    with pytest.raises(RuntimeError, match="CUDA out of memory"):
+        client.encode("abc")
+    model.fail = False
+    assert client.encode("abc").tolist() == [3, 1]
+
+
+def test_slow_batch_times_out(serve):
+    server = serve(FakeModel(delay=1), request_timeout=0.1)
+    with pytest.raises(RuntimeError, match="No embedding within"):
+        EmbeddingClient(server.address, authkey=AUTHKEY).encode("abc")
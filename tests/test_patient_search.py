@@ -0,0 +1,30 @@
+import mongomock
+from src.analytics.patient_search import PatientSearchIndex
+
+
+def _index():
+    db = mongomock.MongoClient().get_database("CAMPANIA_SALUTE")
+    # Many keys sharing the prefix "ROS" sort before ROSSI
+    db.ANAGRAFICA.insert_many([
+        {"ID_PAZ": f"1_{i}", "CODICE_FISCALE": f"RSANNA{i:04d}", "COGNOME": "Rosa", "NOMEPAZ": "Anna"} for i in range(80)
+    ] + [
+        {"ID_PAZ": "2_1", "CODICE_FISCALE": "RSSMRA80A01F839X", "COGNOME": "Rossi", "NOMEPAZ": "Mario"},
+        {"ID_PAZ": "2_2", "CODICE_FISCALE": "BNCLGU75B02F839Y", "COGNOME": "Bianchi", "NOMEPAZ": "Luigi"},
+    ])
+    index = PatientSearchIndex(db)
+    index.load()
+    return index
+
+
+def test_prefix_search():
+    index = _index()
+    assert [patient["ID_PAZ"] for patient in index.search("rssmr")] == ["2_1"]
+    assert [patient["ID_PAZ"] for patient in index.search("rossi mar")] == ["2_1"]
+    assert len(index.search("rosa", limit=10)) == 10
+
+
+def test_fuzzy_search_keeps_every_match_of_a_common_last_prefix():
+    index = _index()
+    # "MARO" is one typo from MARIO; "ROS" is a prefix of 81 keys, ROSSI sorting after all the ROSA
+    assert [patient["ID_PAZ"] for patient in index.search("maro ros")] == ["2_1"]
+    assert [patient["ID_PAZ"] for patient in index.search("biancki")] == ["2_2"]
@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import src.query_engine.query_history as query_history_module
+from src.query_engine.query_history import QueryHistory
+
+
+def _history(tmp_path):
+    history = QueryHistory(str(tmp_path / "history.db"))
+    history.record("Pazienti diabetici fumatori", {"collection_name": "ANAMNESI", "operation_type": "find",
+                                                   "arguments": {"filter": {"DIABETE": "YES", "FUMO": "YES"}}},
+                   context_docs=["ANAMNESI"], latency_ms=120.0, row_count=3)
+    history.record("Numero di eventi per tipo", '{"collection_name": "LISTA_EVENTI"}', row_count=10)
+    history.record("Pazienti diabetici con ictus", None, success=False, error="Quota esaurita")
+    return history
+
+
+def test_search_full_text(tmp_path):
+    history = _history(tmp_path)
+    if not history.full_text:
+        return
+    assert [entry["instruction"] for entry in history.search("diabet fumat")] == ["Pazienti diabetici fumatori"]
+    assert [entry["instruction"] for entry in history.search("diabetici", successful_only=True)] == ["Pazienti diabetici fumatori"]
+    assert len(history.search("diabetici")) == 2
+
+
+def test_search_like_fallback(tmp_path):
+    history = _history(tmp_path)
+    history.full_text = False
+    assert [entry["instruction"] for entry in history.search("eventi")] == ["Numero di eventi per tipo"]
+    assert [entry["instruction"] for entry in history.search("diabetici fumatori")] == ["Pazienti diabetici fumatori"]
+    # Latest first without text
+    assert history.search()[0]["instruction"] == "Pazienti diabetici con ictus"
+
+
+def test_generation_failure_is_recorded(tmp_path):
+    history = _history(tmp_path)
+    failed = history.search("ictus")[0]
+    assert failed["query_json"] is None and not failed["success"] and failed["error"] == "Quota esaurita"
+    entry, result = history.rerun(failed["id"], db=None)
+    assert entry["id"] == failed["id"] and not result["success"]
+
+
+def test_rerun_executes_the_executed_query(tmp_path, monkeypatch):
+    history = QueryHistory(str(tmp_path / "history.db"))
+    generated = {"collection_name": "LISTA_EVENTI", "operation_type": "aggregate", "arguments": {"pipeline": []}}
+    optimized = {"collection_name": "LISTA_EVENTI", "operation_type": "aggregate", "arguments": {"pipeline": [{"$limit": 5}]}}
+    entry_id = history.record("Ultimi eventi", generated, executed_query_json=optimized, row_count=5)
+
+    calls = []
+
+    def fake_execute(db, query_dict, instruction=None, db_schema=None):
+        calls.append(query_dict)
+        return {"success": True, "data": [{"TIPO_EVENTO": "ANAMNESI"}], "error": None, "injected_projection": None}
+
+    monkeypatch.setattr(query_history_module, "execute_mongodb_query", fake_execute)
+    entry, result = history.rerun(entry_id, db=object(), user="analista@example.com")
+
+    assert calls == [optimized]
+    assert json.loads(entry["query_json"]) == generated
+    assert result["success"]
+    rerun_entry = history.search(source="rerun")[0]
+    assert rerun_entry["row_count"] == 1 and rerun_entry["user"] == "analista@example.com"
+    assert json.loads(rerun_entry["executed_query_json"]) == optimized
+
+
+def test_migrates_history_without_executed_query(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE query_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, created_at TEXT NOT NULL, user TEXT, source TEXT NOT NULL,
+            instruction TEXT NOT NULL, query_json TEXT NOT NULL, context_docs TEXT, latency_ms REAL,
+            row_count INTEGER, success INTEGER NOT NULL, error TEXT
+        );
+        INSERT INTO query_history (created_at, source, instruction, query_json, success)
+        VALUES ('2025-01-01T00:00:00', 'llm', 'Pazienti per sesso', '{}', 1);
+    """)
+    connection.close()
+
+    history = QueryHistory(path)
+    history.record("Generazione fallita", None, success=False)
+    assert [entry["instruction"] for entry in history.search("sesso")] == ["Pazienti per sesso"]
+    assert history.search("fallita")[0]["query_json"] is None